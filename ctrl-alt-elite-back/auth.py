@@ -1,10 +1,19 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import FastAPI, APIRouter, HTTPException, Depends
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 from typing import Optional
 from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
 from models import UserSignup, UserLogin
 from database import db
+from leaderboard import leaderboard
+from bucket_list import change_member_count
+from cache import response_cache, user_tags
+from tokens import issue_token, get_current_user, revocation_list, TOKEN_TTL_SECONDS
+from server_timing import timed
 from uuid import uuid4
 
 auth_router = APIRouter()
@@ -12,13 +21,54 @@ auth_router = APIRouter()
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Helper functions
-def get_password_hash(password: str):
+# bcrypt takes ~100-300 ms per call on purpose, so it runs on a bounded worker
+# pool instead of blocking the event loop. Threads are enough (bcrypt releases
+# the GIL); PASSWORD_HASH_POOL=process switches to separate processes.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Hash jobs allowed to be running or queued before new ones get a 429
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+if os.getenv("PASSWORD_HASH_POOL", "thread") == "process":
+    hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+else:
+    hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+pending_hash_jobs = 0
+
+def _hash(password: str):
     return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str):
+def _verify(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def run_hash_job(fn, *args):
+    global pending_hash_jobs
+    # only touched from the event loop thread, so a plain counter is enough
+    if pending_hash_jobs >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many sign-ins in progress, please try again",
+            headers={"Retry-After": "1"}
+        )
+    pending_hash_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with timed("hash"):  # Server-Timing, when profiling is on
+            return await loop.run_in_executor(hash_executor, fn, *args)
+    finally:
+        pending_hash_jobs -= 1
+
+# Helper functions
+async def get_password_hash(password: str):
+    return await run_hash_job(_hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str):
+    return await run_hash_job(_verify, plain_password, hashed_password)
+
+# Access token fields returned by signup and login
+def token_response(db_user):
+    return {"token": issue_token(db_user), "token_type": "bearer", "expires_in": TOKEN_TTL_SECONDS}
+
 # Routes
 @auth_router.post("/signup")
 async def signup(user: UserSignup):
@@ -28,22 +78,35 @@ async def signup(user: UserSignup):
     
     # Create user with hashed password
     user_dict = user.model_dump()
-    user_dict["password"] = get_password_hash(user_dict["password"])
-    result = await db.users.insert_one(user_dict)
+    user_dict["password"] = await get_password_hash(user_dict["password"])
+    try:
+        result = await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # signed up concurrently with the same email (the check above can't catch that)
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await change_member_count(user.mentor_name, 1)
+    await response_cache.invalidate(*user_tags(user_dict))
 
     # Create empty bucket list for mentors
     if user_dict["accountType"] == "Mentor":
         bucket_list = {
             "_id": str(uuid4()),
             "mentor_name": user.fullName,
-            "tasks": []  # Empty tasks array instead of default task
+            "tasks": [],  # Empty tasks array instead of default task
+            "task_count": 0,
+            "completed_count": 0,
+            "completion_ratio": 0,
+            # students may have picked this mentor before they signed up
+            "member_count": await db.users.count_documents({"mentor_name": user.fullName}),
         }
         # Insert the bucket list into the database
         await db.bucket_lists.insert_one(bucket_list)
+        await response_cache.invalidate(f"bucketlist:{user.fullName}")
+        await leaderboard.sync(user.fullName)
 
     db_user = await db.users.find_one({"email": user.email})
     # Return the same user information as login
-    return {"message": "Signup successful", "user": {
+    return {"message": "Signup successful", **token_response(db_user), "user": {
         "id": str(db_user["_id"]),
         "accountType": db_user["accountType"],
         "fullName": db_user["fullName"],
@@ -61,10 +124,10 @@ async def login(user: UserLogin):
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
     # Verify password
-    if not verify_password(user.password, db_user["password"]):
+    if not await verify_password(user.password, db_user["password"]):
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
-    return {"message": "Login successful", "user": {
+    return {"message": "Login successful", **token_response(db_user), "user": {
         "id": str(db_user["_id"]),
         "accountType": db_user["accountType"],
         "fullName": db_user["fullName"],
@@ -72,4 +135,10 @@ async def login(user: UserLogin):
         "mentor_name": db_user["mentor_name"],
         "profile_pic": db_user["profile_pic"] if "profile_pic" in db_user else None,
         "fun_facts": db_user["fun_facts"],
-    }}
\ No newline at end of file
+    }}
+
+# Revoke the caller's token before it expires
+@auth_router.post("/logout")
+async def logout(user: dict = Depends(get_current_user)):
+    await revocation_list.revoke(user)
+    return {"message": "Logout successful"}
@@ -0,0 +1,63 @@
+import asyncio
+from pymongo import UpdateOne
+from database import db
+from migrations import MigrationRunner, runner_arguments
+
+async def members_by_mentor():
+    """How many users point at each mentor_name, counted server-side"""
+    pipeline = [
+        {"$match": {"mentor_name": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$mentor_name", "members": {"$sum": 1}}},
+    ]
+    members = {}
+    async for doc in db.users.aggregate(pipeline):
+        members[doc["_id"]] = doc["members"]
+    return members
+
+def summary_counts(bucket, members):
+    # same numbers the task writes in bucket_list.py keep up to date with $inc
+    tasks = bucket.get("tasks") or []
+    task_count = len(tasks)
+    completed_count = sum(1 for task in tasks if task.get("completed") is True)
+    return {
+        "task_count": task_count,
+        "completed_count": completed_count,
+        "member_count": members.get(bucket.get("mentor_name"), 0),
+        "completion_ratio": completed_count / task_count if task_count else 0,
+    }
+
+async def backfill_bucket_counts(batch_size=500, concurrency=4, dry_run=False, resume=True):
+    """
+    Set task_count, completed_count, member_count and completion_ratio on every
+    bucket list. Only lists whose counters are missing or wrong are written, so
+    it is also the repair tool if the counters ever drift.
+    """
+    print(f"Backfilling bucket list counters{' (dry run)' if dry_run else ''}...")
+    members = await members_by_mentor()
+
+    def fix_counts(bucket):
+        expected = summary_counts(bucket, members)
+        if all(bucket.get(field) == value for field, value in expected.items()):
+            return []
+        if dry_run:
+            print(f"{bucket.get('mentor_name', 'Unknown')}: {expected}")
+        return [UpdateOne({"_id": bucket["_id"]}, {"$set": expected})]
+
+    runner = MigrationRunner(
+        "backfill_bucket_counts",
+        db.bucket_lists,
+        projection={"mentor_name": 1, "tasks.completed": 1, "task_count": 1,
+                    "completed_count": 1, "member_count": 1, "completion_ratio": 1},
+        batch_size=batch_size,
+        concurrency=concurrency,
+        dry_run=dry_run,
+    )
+    result = await runner.run(fix_counts, resume=resume)
+
+    print(f"Backfill complete! {result['written']} of {result['scanned']} bucket lists {'need' if dry_run else 'got'} new counters")
+
+if __name__ == "__main__":
+    args = runner_arguments("Backfill the per-group summary counters on bucket lists").parse_args()
+
+    # Run the async function
+    asyncio.run(backfill_bucket_counts(args.batch_size, args.concurrency, args.dry_run, resume=not args.restart))
@@ -0,0 +1,63 @@
+import asyncio
+from pymongo import UpdateOne
+from database import db
+from image_storage import uploads_collection
+from migrations import MigrationRunner, runner_arguments
+
+def upload_record(doc):
+    # an fs.files document only remembers its first uploader, so that is who gets the record
+    metadata = doc.get("metadata", {})
+    return {
+        "file_id": doc["_id"],
+        "user_id": metadata["user_id"],
+        "filename": doc.get("filename") or metadata.get("filename") or str(doc["_id"]),
+        "content_type": metadata.get("content_type", "image/jpeg"),
+        "is_profile_picture": metadata.get("is_profile_picture", False),
+        # ObjectIds carry their creation time
+        "uploaded_at": doc.get("uploadDate") or doc["_id"].generation_time,
+    }
+
+async def backfill_image_uploads(batch_size=500, concurrency=4, dry_run=False, resume=True):
+    """
+    Give every image stored before upload records existed a record for its
+    uploader, so it shows up in GET /images/user/{user_id} and counts as in use
+    for collect_images. The record takes over the reference the upload already
+    holds, so refcounts don't change. Safe to run twice.
+    """
+    print(f"Backfilling image upload records{' (dry run)' if dry_run else ''}...")
+
+    # images staged for an unfinished upload get their record when the job finishes
+    pending = set(await db.image_ingestion_jobs.distinct("file_id", {"status": {"$in": ["queued", "processing"]}}))
+
+    def add_record(doc):
+        if doc["_id"] in pending:
+            return []
+        record = upload_record(doc)
+        if dry_run:
+            print(f"{record['user_id']}: {record['filename']}")
+        return [UpdateOne(
+            {"file_id": record["file_id"], "user_id": record["user_id"]},
+            {"$setOnInsert": record},
+            upsert=True
+        )]
+
+    runner = MigrationRunner(
+        "backfill_image_uploads",
+        db.fs.files,
+        # originals only: resized copies belong to their original
+        query={"metadata.user_id": {"$exists": True}, "metadata.variant_of": {"$exists": False}},
+        projection={"filename": 1, "uploadDate": 1, "metadata": 1},
+        batch_size=batch_size,
+        concurrency=concurrency,
+        dry_run=dry_run,
+        target=uploads_collection,
+    )
+    result = await runner.run(add_record, resume=resume)
+
+    print(f"Backfill complete! {result['written']} of {result['scanned']} images {'need' if dry_run else 'have'} an upload record")
+
+if __name__ == "__main__":
+    args = runner_arguments("Create upload records for images stored before they existed").parse_args()
+
+    # Run the async function
+    asyncio.run(backfill_image_uploads(args.batch_size, args.concurrency, args.dry_run, resume=not args.restart))
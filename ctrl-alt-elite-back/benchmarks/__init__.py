@@ -0,0 +1,23 @@
+# Load tests for the API, for sizing the backend before each bootcamp cohort.
+#
+# Run from ctrl-alt-elite-back/, against a throwaway MongoDB (never the real one):
+#
+#     pip install -r benchmarks/requirements.txt
+#
+#     # 1. fill the database with a synthetic cohort (writes benchmarks/results/cohort.json)
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks seed --mentors 40 --students-per-mentor 12
+#
+#     # 2. start the API on the same database (after seeding, so nothing is cached stale)
+#     MONGODB_URI=mongodb://localhost:27017 uvicorn main:app --port 8000
+#
+#     # 3. record a baseline (baselines depend on the machine, so none is committed)
+#     python -m benchmarks run --mix cohort --concurrency 50 --duration 60 --save benchmarks/results/baseline.json
+#
+#     # after a change, drive the same mix and compare with the baseline
+#     python -m benchmarks run --mix cohort --concurrency 50 --duration 60 --baseline benchmarks/results/baseline.json
+#
+#     # remove everything the benchmarks created
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks reset
+#
+# Synthetic users have @bench.invalid emails, their groups are "Bench Mentor NNNN" and
+# their images are named bench-*, which is what `reset` deletes.
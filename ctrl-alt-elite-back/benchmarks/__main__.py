@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import sys
+from benchmarks import baseline
+from benchmarks.scenarios import MIXES
+
+DEFAULT_MANIFEST = "benchmarks/results/cohort.json"
+
+def seed_command(args):
+    # imported here so `run` and `compare` work without a database configured
+    from benchmarks.seed import check_target, seed, write_manifest
+
+    check_target(args.allow_remote)
+    print(f"Seeding {args.mentors} groups of {args.students_per_mentor} students...")
+    manifest = asyncio.run(seed(
+        mentors=args.mentors,
+        students_per_mentor=args.students_per_mentor,
+        tasks_per_list=args.tasks_per_list,
+        completed_ratio=args.completed_ratio,
+        images=args.images,
+        image_size=args.image_size,
+        seed=args.seed,
+    ))
+    write_manifest(manifest, args.manifest)
+    print(f"Seeded {len(manifest['mentors'])} mentors, {len(manifest['students'])} students, "
+          f"{len(manifest['images'])} images; manifest in {args.manifest}")
+    print("(Re)start the API before running, so its caches start from this data")
+
+def reset_command(args):
+    from benchmarks.seed import check_target, reset
+
+    check_target(args.allow_remote)
+    removed = asyncio.run(reset())
+    print(f"Removed {removed['users']} users and {removed['images']} images")
+
+def report_comparison(reference, result, threshold, min_samples):
+    for mismatch in baseline.mismatched_settings(reference, result):
+        print(f"warning: run settings differ from the baseline ({mismatch})")
+    regressions, notes = baseline.compare(reference, result, threshold, min_samples)
+    for note in notes:
+        print(f"  note: {note}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions beyond {threshold:.0%}")
+    return 0
+
+def run_command(args):
+    from benchmarks.driver import run_load, format_report
+    from benchmarks.seed import read_manifest
+
+    # before the run, so a missing baseline doesn't cost a whole load test
+    reference = baseline.load(args.baseline) if args.baseline else None
+    result = asyncio.run(run_load(
+        args.base_url,
+        read_manifest(args.manifest),
+        MIXES[args.mix],
+        args.mix,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        warmup=args.warmup,
+        think_time=args.think_time,
+        seed=args.seed,
+    ))
+    print(format_report(result))
+    if args.output:
+        baseline.save(result, args.output)
+    if args.save:
+        baseline.save(result, args.save)
+        print(f"Baseline saved to {args.save}")
+    if reference is not None:
+        return report_comparison(reference, result, args.threshold, args.min_samples)
+    return 0
+
+def compare_command(args):
+    return report_comparison(baseline.load(args.baseline), baseline.load(args.result), args.threshold, args.min_samples)
+
+def add_comparison_options(parser):
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    parser.add_argument("--min-samples", type=int, default=50, help="endpoints with fewer requests aren't compared")
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Seed, load test and compare the API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="replace the synthetic cohort in MongoDB")
+    seed_parser.add_argument("--mentors", type=int, default=20)
+    seed_parser.add_argument("--students-per-mentor", type=int, default=10)
+    seed_parser.add_argument("--tasks-per-list", type=int, default=15)
+    seed_parser.add_argument("--completed-ratio", type=float, default=0.3)
+    seed_parser.add_argument("--images", type=int, default=100, help="users that get a profile picture")
+    seed_parser.add_argument("--image-size", type=int, default=256, help="side of the generated pictures, in px")
+    seed_parser.add_argument("--seed", type=int, default=1)
+    seed_parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    seed_parser.add_argument("--allow-remote", action="store_true", help="allow a MONGODB_URI that isn't local")
+    seed_parser.set_defaults(handler=seed_command)
+
+    reset_parser = commands.add_parser("reset", help="delete everything the benchmarks created")
+    reset_parser.add_argument("--allow-remote", action="store_true")
+    reset_parser.set_defaults(handler=reset_command)
+
+    run_parser = commands.add_parser("run", help="drive a request mix at a running API")
+    run_parser.add_argument("--base-url", default="http://localhost:8000")
+    run_parser.add_argument("--mix", choices=sorted(MIXES), default="cohort")
+    run_parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    run_parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    run_parser.add_argument("--think-time", type=float, default=0, help="mean pause between a user's requests, in seconds")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    run_parser.add_argument("--output", help="write the results as JSON")
+    run_parser.add_argument("--save", help="write the results as the new baseline")
+    run_parser.add_argument("--baseline", help="compare with this baseline, exit 1 on regressions")
+    add_comparison_options(run_parser)
+    run_parser.set_defaults(handler=run_command)
+
+    compare_parser = commands.add_parser("compare", help="compare two saved results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("result")
+    add_comparison_options(compare_parser)
+    compare_parser.set_defaults(handler=compare_command)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args) or 0)
+
+if __name__ == "__main__":
+    main()
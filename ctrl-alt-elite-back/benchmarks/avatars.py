@@ -0,0 +1,78 @@
+# Bytes transferred and latency for the avatars on the groups page: the
+# original images vs the ?w=128 variants. Against a running API and a cohort
+# seeded with realistically sized pictures:
+#
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks seed --images 200 --image-size 1024
+#     MONGODB_URI=mongodb://localhost:27017 uvicorn main:app --port 8000
+#     python -m benchmarks.avatars
+#
+# Avatars are fetched the way a browser would for that page: everything listed
+# by GET /group, at most --connections at a time. The resized pass runs twice;
+# the first one includes generating the variants.
+
+import argparse
+import asyncio
+import re
+import time
+import httpx
+from benchmarks.driver import percentile
+
+IMAGE_PATH = re.compile(r"/images/[0-9a-fA-F]{24}")
+
+def avatar_paths(groups):
+    """Every stored avatar GET /group shows (Cloudinary URLs are skipped)"""
+    paths = []
+    for group in groups:
+        for user in [group["mentor"], *group["students"]]:
+            match = IMAGE_PATH.search(user.get("profile_pic") or "")
+            if match:
+                paths.append(match.group(0))
+    return paths
+
+async def fetch_all(client, paths, params, headers, connections):
+    slots = asyncio.Semaphore(connections)
+    latencies = []
+    sizes = []
+
+    async def fetch(path):
+        async with slots:
+            started = time.perf_counter()
+            response = await client.get(path, params=params, headers=headers)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(response.content))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(path) for path in paths))
+    wall_ms = (time.perf_counter() - started) * 1000
+    latencies.sort()
+    return {"bytes": sum(sizes), "wall_ms": wall_ms, "p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99)}
+
+async def main(base_url, connections):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        response = await client.get("/group")
+        response.raise_for_status()
+        paths = avatar_paths(response.json())
+        if not paths:
+            raise SystemExit("No /images/ avatars on the groups page, seed with --images first")
+        print(f"{len(paths)} avatars on the groups page, {connections} connections")
+
+        webp = {"Accept": "image/webp,image/*"}
+        runs = [
+            ("original", {}, {}),
+            ("?w=128 (first, generates)", {"w": 128}, webp),
+            ("?w=128", {"w": 128}, webp),
+        ]
+        print(f"{'':<28} {'total KB':>9} {'avg KB':>7} {'page ms':>8} {'p50 ms':>7} {'p99 ms':>7}")
+        for label, params, headers in runs:
+            result = await fetch_all(client, paths, params, headers, connections)
+            print(f"{label:<28} {result['bytes'] / 1024:>9.0f} {result['bytes'] / 1024 / len(paths):>7.1f} "
+                  f"{result['wall_ms']:>8.0f} {result['p50_ms']:>7.1f} {result['p99_ms']:>7.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare groups-page avatar bytes and latency, original vs resized")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--connections", type=int, default=6, help="parallel requests, like a browser per host")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.base_url, args.connections))
@@ -0,0 +1,70 @@
+# Comparing a run with a stored baseline. An endpoint regresses when a latency
+# percentile grows, or its throughput or error rate gets worse, by more than the
+# threshold. Endpoints with too few requests in either run are skipped, their
+# percentiles are mostly noise.
+
+import json
+import os
+
+# (field, higher is worse)
+CHECKED_FIELDS = [("p50_ms", True), ("p95_ms", True), ("p99_ms", True), ("throughput", False)]
+
+# Latency changes smaller than this are never called a regression (sub-ms jitter)
+MIN_LATENCY_DELTA_MS = 2.0
+# Error rate may grow by this much (absolute) before it counts
+MAX_ERROR_RATE_INCREASE = 0.01
+
+# Run settings that have to match for the numbers to be comparable
+COMPARABLE_META = ["mix", "concurrency", "duration", "think_time", "cohort"]
+
+def load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(
+            f"No saved results at {path}. Record a baseline first, e.g. "
+            f"`python -m benchmarks run --mix cohort --save {path}`"
+        )
+
+def save(result, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+def mismatched_settings(baseline, current):
+    return [
+        f"{key}: baseline {baseline['meta'].get(key)!r}, now {current['meta'].get(key)!r}"
+        for key in COMPARABLE_META
+        if baseline["meta"].get(key) != current["meta"].get(key)
+    ]
+
+def compare(baseline, current, threshold=0.15, min_samples=50):
+    """Returns (regressions, notes), each a list of human-readable lines"""
+    regressions = []
+    notes = []
+    for label, before in baseline["endpoints"].items():
+        after = current["endpoints"].get(label)
+        if after is None:
+            notes.append(f"{label}: not in this run")
+            continue
+        if before["count"] < min_samples or after["count"] < min_samples:
+            notes.append(f"{label}: skipped, only {min(before['count'], after['count'])} requests")
+            continue
+
+        for field, higher_is_worse in CHECKED_FIELDS:
+            old, new = before[field], after[field]
+            if higher_is_worse:
+                worse = new > old * (1 + threshold) and new - old >= MIN_LATENCY_DELTA_MS
+            else:
+                worse = new < old * (1 - threshold)
+            if worse:
+                change = (new - old) / old if old else float("inf")
+                regressions.append(f"{label}: {field} {old} -> {new} ({change:+.0%})")
+
+        if after["error_rate"] > before["error_rate"] + MAX_ERROR_RATE_INCREASE:
+            regressions.append(f"{label}: error_rate {before['error_rate']:.1%} -> {after['error_rate']:.1%}")
+
+    for label in current["endpoints"].keys() - baseline["endpoints"].keys():
+        notes.append(f"{label}: new, no baseline yet")
+    return regressions, notes
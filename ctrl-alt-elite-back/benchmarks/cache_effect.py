@@ -0,0 +1,62 @@
+# req/s and latency of the browse mix with the response cache on vs off.
+# Needs two API servers on the same MongoDB and seeded cohort, one of them
+# with the cache disabled:
+#
+#     python -m benchmarks seed
+#     MONGODB_URI=mongodb://localhost:27017 uvicorn main:app --port 8000
+#     MONGODB_URI=mongodb://localhost:27017 CACHE_BACKEND=off uvicorn main:app --port 8001
+#     python -m benchmarks.cache_effect
+#
+# The two runs go one after the other, so they don't compete for MongoDB.
+
+import argparse
+import asyncio
+import httpx
+from benchmarks.driver import format_report, run_load
+from benchmarks.scenarios import MIXES
+from benchmarks.seed import read_manifest
+
+async def cache_stats(base_url):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        response = await client.get("/metrics/cache")
+        response.raise_for_status()
+        return response.json()
+
+async def main(cached_url, uncached_url, manifest, concurrency, duration, warmup):
+    cohort = read_manifest(manifest)
+    before = await cache_stats(cached_url)
+    if before["backend"] == "off":
+        raise SystemExit(f"{cached_url} has its response cache off, start it without CACHE_BACKEND=off")
+    if (await cache_stats(uncached_url))["backend"] != "off":
+        raise SystemExit(f"{uncached_url} has its response cache on, start it with CACHE_BACKEND=off")
+
+    results = {}
+    for label, base_url in [("cache on", cached_url), ("cache off", uncached_url)]:
+        results[label] = await run_load(base_url, cohort, MIXES["browse"], "browse", concurrency=concurrency,
+                                        duration=duration, warmup=warmup)
+        print(f"== {label} ({base_url})")
+        print(format_report(results[label]))
+        print()
+
+    after = await cache_stats(cached_url)
+    hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+    if hits + misses:
+        print(f"cache hit rate during the run: {hits / (hits + misses):.1%} ({hits} hits, {misses} misses)")
+    on, off = results["cache on"]["total"], results["cache off"]["total"]
+    print(f"{'':<10} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    for label, total in [("cache on", on), ("cache off", off)]:
+        print(f"{label:<10} {total['throughput']:>8.1f} {total['p50_ms']:>7.1f} {total['p99_ms']:>7.1f}")
+    if off["throughput"]:
+        print(f"cache on serves {on['throughput'] / off['throughput']:.2f}x the requests")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the browse mix with the response cache on and off")
+    parser.add_argument("--cached-url", default="http://localhost:8000")
+    parser.add_argument("--uncached-url", default="http://localhost:8001")
+    parser.add_argument("--manifest", default="benchmarks/results/cohort.json")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.cached_url, args.uncached_url, args.manifest, args.concurrency, args.duration, args.warmup))
@@ -0,0 +1,151 @@
+# Closed-loop load driver: `concurrency` virtual users each send a request, wait
+# for the answer (plus an optional think time) and send the next, for `duration`
+# seconds after a warmup. Latencies are recorded per scenario label.
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+import httpx
+from benchmarks.scenarios import needs_mentor_tokens
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.errors = 0
+        self.statuses = {}
+
+    def record(self, ms, status):
+        self.latencies_ms.append(ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == "error" or status >= 400:
+            self.errors += 1
+
+    def summary(self, seconds):
+        latencies = sorted(self.latencies_ms)
+        count = len(latencies)
+        return {
+            "count": count,
+            "throughput": round(count / seconds, 2) if seconds else 0.0,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+        }
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))  # ceil(n * p / 100)
+    return round(sorted_values[int(rank) - 1], 2)
+
+class VirtualUser:
+    def __init__(self, client, cohort, rng, mentor, token=None):
+        self.client = client
+        self.cohort = cohort
+        self.rng = rng
+        self.mentor = mentor  # the group this user works in (and whose token it holds)
+        self.auth_headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    def random_mentor(self):
+        return self.rng.choice(self.cohort["mentors"])
+
+    def random_student(self):
+        return self.rng.choice(self.cohort["students"])
+
+    def random_image(self):
+        return self.rng.choice(self.cohort["images"])
+
+async def log_in(client, email, password):
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["token"]
+
+async def mentor_tokens(client, cohort, count):
+    """Log in as the first `count` mentors (a few at a time, bcrypt is slow on purpose)"""
+    slots = asyncio.Semaphore(4)
+
+    async def one(mentor):
+        async with slots:
+            return await log_in(client, mentor["email"], cohort["password"])
+
+    return await asyncio.gather(*(one(mentor) for mentor in cohort["mentors"][:count]))
+
+async def run_load(base_url, cohort, mix, mix_name, concurrency=20, duration=30.0, warmup=5.0,
+                   think_time=0.0, seed=1, timeout=30.0):
+    if not cohort["images"]:
+        mix = [(weight, s) for weight, s in mix if "/images/{image_id}" not in s.label]
+    weights = [weight for weight, _ in mix]
+    scenarios = [s for _, s in mix]
+    stats = {s.label: EndpointStats() for s in scenarios}
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        mentors = cohort["mentors"][:concurrency]
+        tokens = await mentor_tokens(client, cohort, len(mentors)) if needs_mentor_tokens(mix) else [None] * len(mentors)
+
+        loop = asyncio.get_running_loop()
+        measure_from = loop.time() + warmup
+        stop_at = measure_from + duration
+
+        async def virtual_user(index):
+            # each user gets its own seeded RNG, so a run's request sequence is repeatable
+            vu = VirtualUser(client, cohort, random.Random(f"{seed}-{index}"), mentors[index % len(mentors)], tokens[index % len(mentors)])
+            while loop.time() < stop_at:
+                s = vu.rng.choices(scenarios, weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await s.send(vu)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = "error"
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if loop.time() >= measure_from:
+                    stats[s.label].record(elapsed_ms, status)
+                if think_time:
+                    await asyncio.sleep(vu.rng.expovariate(1 / think_time))
+
+        started_at = datetime.now(timezone.utc)
+        await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+
+    endpoints = {label: s.summary(duration) for label, s in sorted(stats.items()) if s.latencies_ms}
+    everything = EndpointStats()
+    for s in stats.values():
+        everything.latencies_ms.extend(s.latencies_ms)
+        everything.errors += s.errors
+    total = everything.summary(duration)
+    total.pop("statuses")
+
+    return {
+        "meta": {
+            "mix": mix_name,
+            "base_url": base_url,
+            "concurrency": concurrency,
+            "duration": duration,
+            "warmup": warmup,
+            "think_time": think_time,
+            "seed": seed,
+            "cohort": cohort["params"],
+            "started_at": started_at.isoformat(timespec="seconds"),
+        },
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+def format_report(result):
+    meta = result["meta"]
+    lines = [
+        f"mix={meta['mix']} concurrency={meta['concurrency']} duration={meta['duration']}s "
+        f"cohort={meta['cohort']['mentors']}x{meta['cohort']['students_per_mentor']}",
+        f"{'endpoint':<62} {'count':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}",
+    ]
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for label, s in rows:
+        lines.append(
+            f"{label:<62} {s['count']:>7} {s['throughput']:>8.1f} {s['p50_ms']:>8.1f} "
+            f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['error_rate']:>7.1%}"
+        )
+    return "\n".join(lines)
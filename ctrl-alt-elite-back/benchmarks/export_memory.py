@@ -0,0 +1,84 @@
+# Server memory and time to first byte of the big list endpoints as one JSON
+# array vs ?format=ndjson, at 10k and 100k documents. Reseeds the synthetic
+# cohort for every size (one mentor and one bucket list per document), so the
+# API runs with its response cache off, as a single worker on this machine:
+#
+#     MONGODB_URI=mongodb://localhost:27017 CACHE_BACKEND=off uvicorn main:app --port 8000 &
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.export_memory --server-pid $! --sizes 10000 100000
+#
+# Memory is the server's resident set (VmRSS in /proc/<pid>/status), polled
+# while the response downloads; "peak +MB" is its growth over the value just
+# before the request. Python rarely hands freed memory back to the OS, so the
+# NDJSON runs go first.
+
+import argparse
+import asyncio
+import time
+import httpx
+from benchmarks.seed import check_target, seed
+
+ENDPOINTS = ["/bucketlist/bucket_lists", "/profile/role/Mentor"]
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    raise SystemExit(f"No VmRSS for process {pid}")
+
+async def poll_peak(pid, peak, interval=0.005):
+    while True:
+        peak[0] = max(peak[0], rss_mb(pid))
+        await asyncio.sleep(interval)
+
+async def download(client, path, params, pid):
+    """Time to first byte and total (ms), body size and peak RSS growth (MB)"""
+    start_rss = rss_mb(pid)
+    peak = [start_rss]
+    poller = asyncio.create_task(poll_peak(pid, peak))
+    size = 0
+    first_byte = None
+    started = time.perf_counter()
+    try:
+        async with client.stream("GET", path, params=params) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter()
+                size += len(chunk)
+    finally:
+        poller.cancel()
+    finished = time.perf_counter()
+    return {
+        "ttfb_ms": ((first_byte or finished) - started) * 1000,
+        "total_ms": (finished - started) * 1000,
+        "mb": size / 1024 / 1024,
+        "peak_mb": peak[0] - start_rss,
+    }
+
+async def main(base_url, pid, sizes):
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        backend = (await client.get("/metrics/cache")).json().get("backend")
+        if backend != "off":
+            print(f"warning: the API's response cache is '{backend}', restart it with CACHE_BACKEND=off for fair numbers")
+
+        print(f"{'docs':>7} {'endpoint':<26} {'format':<7} {'body MB':>8} {'TTFB ms':>8} {'total ms':>9} {'peak +MB':>9}")
+        for docs in sizes:
+            await seed(mentors=docs, students_per_mentor=0, images=0)
+            for path in ENDPOINTS:
+                await client.get(path, params={"format": "ndjson"})  # warm up MongoDB's cache
+                for label, params in [("ndjson", {"format": "ndjson"}), ("json", {})]:
+                    result = await download(client, path, params, pid)
+                    print(f"{docs:>7} {path:<26} {label:<7} {result['mb']:>8.1f} {result['ttfb_ms']:>8.0f} "
+                          f"{result['total_ms']:>9.0f} {result['peak_mb']:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare server memory and TTFB of JSON and NDJSON list responses")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--server-pid", type=int, required=True, help="pid of the uvicorn worker serving --base-url")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    check_target(args.allow_remote)
+    asyncio.run(main(args.base_url, args.server_pid, args.sizes))
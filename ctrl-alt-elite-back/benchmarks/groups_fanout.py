@@ -0,0 +1,66 @@
+# Request count and wall time of loading the groups page as the frontend used
+# to (GET /profile/role/Mentor, then GET /group/{mentor_name} for each mentor,
+# one after the other) vs a single GET /group, at growing mentor counts.
+#
+# Reseeds the synthetic cohort for every mentor count, so the API has to run
+# with its response cache off, against a local MongoDB:
+#
+#     MONGODB_URI=mongodb://localhost:27017 CACHE_BACKEND=off uvicorn main:app --port 8000
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.groups_fanout --mentors 10 50 200
+
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from benchmarks.seed import check_target, seed
+
+async def per_mentor(client):
+    # what GroupsPage.tsx did before /group existed
+    response = await client.get("/profile/role/Mentor")
+    response.raise_for_status()
+    mentors = response.json()
+    for mentor in mentors:
+        response = await client.get(f"/group/{mentor['fullName']}")
+        response.raise_for_status()
+    return 1 + len(mentors)
+
+async def aggregated(client):
+    response = await client.get("/group")
+    response.raise_for_status()
+    return 1
+
+async def measure(client, load, repeats):
+    """Requests per page load and the median wall time in ms"""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        requests = await load(client)
+        times.append((time.perf_counter() - started) * 1000)
+    return requests, statistics.median(times)
+
+async def main(base_url, mentor_counts, students_per_mentor, repeats):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        backend = (await client.get("/metrics/cache")).json().get("backend")
+        if backend != "off":
+            print(f"warning: the API's response cache is '{backend}', restart it with CACHE_BACKEND=off for fair numbers")
+
+        print(f"{'mentors':>8} {'N+1 requests':>13} {'N+1 ms':>10} {'/group requests':>16} {'/group ms':>10}")
+        for mentors in mentor_counts:
+            await seed(mentors=mentors, students_per_mentor=students_per_mentor, images=0)
+            await aggregated(client)  # warm up the connection and MongoDB's cache
+            fanout_requests, fanout_ms = await measure(client, per_mentor, repeats)
+            group_requests, group_ms = await measure(client, aggregated, repeats)
+            print(f"{mentors:>8} {fanout_requests:>13} {fanout_ms:>10.1f} {group_requests:>16} {group_ms:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the per-mentor fan-out with the aggregated /group endpoint")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--mentors", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--students-per-mentor", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    check_target(args.allow_remote)
+    asyncio.run(main(args.base_url, args.mentors, args.students_per_mentor, args.repeats))
@@ -0,0 +1,89 @@
+# Peak Python memory while storing and serving 1, 20 and 100 MB images through
+# GridFS, against a local MongoDB (no API server needed):
+#
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.image_memory --sizes 1 20 100
+#
+# "streamed" is what the API does now: save_upload copies the UploadFile chunk
+# by chunk and get_image serves iter_chunks. "buffered" reads the whole file
+# into one bytes object first, as the handlers did before chunked storage.
+# Peaks are measured with tracemalloc, so they count Python allocations only.
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from starlette.datastructures import Headers, UploadFile
+from benchmarks.seed import check_target
+from benchmarks.synthetic import IMAGE_PREFIX
+from database import db
+from image_storage import CHUNK_SIZE, delete_file, iter_chunks, save_upload
+
+MB = 1024 * 1024
+
+def upload_of(size_mb):
+    """An UploadFile backed by a temp file, like Starlette hands large bodies over"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=MB)
+    for _ in range(size_mb):
+        spooled.write(os.urandom(MB))
+    spooled.seek(0)
+    return UploadFile(spooled, size=size_mb * MB, filename=f"{IMAGE_PREFIX}memory-{size_mb}mb.jpg",
+                      headers=Headers({"content-type": "image/jpeg"}))
+
+async def peak_mb(job):
+    """Peak traced memory while job runs (MB), its result and the seconds it took"""
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    result = await job()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    return (peak - baseline) / MB, result, elapsed
+
+async def streamed_download(file_doc):
+    total = 0
+    async for piece in iter_chunks(file_doc):
+        total += len(piece)  # sent and dropped, as StreamingResponse does
+    return total
+
+async def buffered_download(file_doc):
+    return len(b"".join([piece async for piece in iter_chunks(file_doc)]))
+
+async def measure(size_mb):
+    rows = []
+    upload = upload_of(size_mb)
+    metadata = {"filename": upload.filename, "content_type": "image/jpeg"}
+
+    memory, file_id, seconds = await peak_mb(lambda: save_upload(upload, upload.filename, metadata))
+    rows.append(("upload, streamed", memory, seconds))
+    await upload.seek(0)
+    memory, _, seconds = await peak_mb(upload.read)
+    rows.append(("upload, buffered (read())", memory, seconds))
+    await upload.close()
+
+    file_doc = await db.fs.files.find_one({"_id": file_id})
+    memory, _, seconds = await peak_mb(lambda: streamed_download(file_doc))
+    rows.append(("download, streamed", memory, seconds))
+    memory, _, seconds = await peak_mb(lambda: buffered_download(file_doc))
+    rows.append(("download, buffered", memory, seconds))
+
+    await delete_file(file_id)
+    return rows
+
+async def main(sizes):
+    tracemalloc.start()
+    print(f"GridFS chunk size {CHUNK_SIZE // 1024} KB")
+    print(f"{'size':>6}  {'':<26} {'peak MB':>8} {'seconds':>8}")
+    for size_mb in sizes:
+        for label, memory, seconds in await measure(size_mb):
+            print(f"{size_mb:>4}MB  {label:<26} {memory:>8.1f} {seconds:>8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of storing and serving large images")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 20, 100], help="image sizes in MB")
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    check_target(args.allow_remote)
+    asyncio.run(main(args.sizes))
@@ -0,0 +1,107 @@
+# Toggle throughput with the old per-task prints vs the queued logging pipeline
+# (logging_config.py), for a bucket of 200 tasks. No server or MongoDB needed:
+#
+#     python -m benchmarks.logging_overhead --tasks 200 --toggles 2000
+#
+# Each simulated toggle runs on the event loop and only does what the handler
+# logs: the old code printed every task twice plus a few lines per click, the
+# new one logs a single DEBUG record. Output goes to a real file (--output), as
+# it would to a container's log pipe; pass --output - to write to stdout.
+#
+# toggles/s and us/toggle count the time the event loop was busy, which is what
+# other requests wait on; "drained" is when the last line was actually written.
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import time
+from uuid import uuid4
+import logging_config
+
+def make_bucket(tasks):
+    return {
+        "mentor_name": "Bench Mentor 0000",
+        "tasks": [{"id": str(uuid4()), "description": f"Task {n}", "completed": n % 3 == 0} for n in range(tasks)],
+    }
+
+def toggle_with_prints(bucket, task_id):
+    # what toggle_task_completion printed before the logging change
+    print(f"Toggle task: mentor={bucket['mentor_name']}, task_id={task_id}, user=bench@bench.invalid, completed=True")
+    print("User role: Mentor")
+    print(f"Bucket found: {bucket['mentor_name']}, task count: {len(bucket['tasks'])}")
+    print(f"Looking for task ID: {task_id}")
+    for i, task in enumerate(bucket["tasks"]):
+        print(f"Task {i}: {task}")
+    print(f"Available task IDs: {[task['id'] for task in bucket['tasks']]}")
+    for task in bucket["tasks"]:
+        print(f"Checking task: {task['id']} == {task_id}?")
+        if task["id"] == task_id:
+            print(f"Task found and updated: {task}")
+            break
+
+logger = logging.getLogger("bucket_list")
+
+def toggle_with_logging(bucket, task_id):
+    logger.debug(
+        "Toggle task",
+        extra={"mentor_name": bucket["mentor_name"], "task_id": task_id, "user": "bench@bench.invalid", "role": "Mentor", "completed": True}
+    )
+
+async def run_toggles(toggle, bucket, count):
+    started = time.perf_counter()
+    for n in range(count):
+        toggle(bucket, bucket["tasks"][n % len(bucket["tasks"])]["id"])
+        await asyncio.sleep(0)  # let other tasks run, as between real requests
+    return time.perf_counter() - started
+
+def measure(label, toggle, bucket, count, drain):
+    started = time.perf_counter()
+    loop_seconds = asyncio.run(run_toggles(toggle, bucket, count))
+    drain()
+    drained_seconds = time.perf_counter() - started
+    print(f"{label:<34} {count / loop_seconds:>12.0f} {loop_seconds / count * 1e6:>10.1f} {drained_seconds:>10.2f}s", file=sys.stderr)
+
+def set_debug(level, sample_rate):
+    logger.setLevel(level)
+    for handler in logging.getLogger().handlers:
+        for log_filter in handler.filters:
+            if isinstance(log_filter, logging_config.SamplingFilter):
+                log_filter.rate = sample_rate
+
+def main(tasks, toggles, output):
+    bucket = make_bucket(tasks)
+    target = sys.stdout if output == "-" else open(output, "w")
+    print(f"{tasks} tasks per bucket, {toggles} toggles, writing to {'stdout' if output == '-' else output}", file=sys.stderr)
+    print(f"{'':<34} {'toggles/s':>12} {'us/toggle':>10} {'drained':>11}", file=sys.stderr)
+
+    with contextlib.redirect_stdout(target):
+        measure("print (before)", toggle_with_prints, bucket, toggles, target.flush)
+
+        # configure_logging() writes to whatever sys.stdout is when it's called
+        logging_config.configure_logging()
+        # drained once the listener thread has written everything queued so far
+        drain = lambda: (logging_config.shutdown_logging(), logging_config.configure_logging())
+        for label, level, rate in [
+            ("queued logging, INFO", logging.INFO, 1.0),
+            ("queued logging, DEBUG sampled 1%", logging.DEBUG, 0.01),
+            ("queued logging, DEBUG", logging.DEBUG, 1.0),
+        ]:
+            set_debug(level, rate)
+            measure(label, toggle_with_logging, bucket, toggles, drain)
+        logging_config.shutdown_logging()
+
+    if target is not sys.stdout:
+        target.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare toggle throughput with prints and with the queued logging pipeline")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--toggles", type=int, default=2000)
+    parser.add_argument("--output", default=os.path.join(tempfile.gettempdir(), "logging_overhead.log"))
+    args = parser.parse_args()
+
+    main(args.tasks, args.toggles, args.output)
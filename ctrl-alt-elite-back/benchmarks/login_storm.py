@@ -0,0 +1,56 @@
+# p50/p99 of unrelated endpoints (leaderboard, group, images) while a storm of
+# logins runs bcrypt, against a running API and a seeded cohort:
+#
+#     python -m benchmarks seed
+#     MONGODB_URI=mongodb://localhost:27017 uvicorn main:app --port 8000
+#     python -m benchmarks.login_storm --logins 50 --duration 30
+#
+# Runs the probe mix alone first, then again with --logins virtual users
+# logging in back to back. Run it on a build from before the hashing pool to
+# get the "before" numbers; there every login blocked the event loop.
+
+import argparse
+import asyncio
+from benchmarks.driver import format_report, run_load
+from benchmarks.scenarios import get_image, get_leaderboard, get_members, get_rank, login
+from benchmarks.seed import read_manifest
+
+PROBES = [(30, get_leaderboard), (20, get_rank), (25, get_members), (25, get_image)]
+STORM = [(1, login)]
+
+def probe_summary(result):
+    total = result["total"]
+    return f"p50 {total['p50_ms']:.1f} ms, p99 {total['p99_ms']:.1f} ms, {total['throughput']:.1f} req/s, {total['error_rate']:.1%} errors"
+
+async def main(base_url, manifest, probes, logins, duration, warmup):
+    cohort = read_manifest(manifest)
+    settings = {"duration": duration, "warmup": warmup}
+
+    quiet = await run_load(base_url, cohort, PROBES, "probes", concurrency=probes, **settings)
+    print("== probes alone")
+    print(format_report(quiet))
+
+    stormy, storm = await asyncio.gather(
+        run_load(base_url, cohort, PROBES, "probes", concurrency=probes, **settings),
+        run_load(base_url, cohort, STORM, "login storm", concurrency=logins, seed=2, **settings),
+    )
+    print(f"\n== probes during a storm of {logins} concurrent logins")
+    print(format_report(stormy))
+    logins_stats = storm["endpoints"].get("POST /auth/login", {})
+    print(f"\nlogins: {logins_stats.get('throughput', 0):.1f}/s, p99 {logins_stats.get('p99_ms', 0):.0f} ms, "
+          f"statuses {logins_stats.get('statuses', {})} (429 = hashing pool saturated)")
+
+    print(f"\nprobes alone:        {probe_summary(quiet)}")
+    print(f"probes during storm: {probe_summary(stormy)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of unrelated endpoints during a login storm")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default="benchmarks/results/cohort.json")
+    parser.add_argument("--probes", type=int, default=10, help="virtual users on the probe endpoints")
+    parser.add_argument("--logins", type=int, default=50, help="virtual users logging in")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.base_url, args.manifest, args.probes, args.logins, args.duration, args.warmup))
@@ -0,0 +1,95 @@
+# Timing of the points maintenance jobs on a synthetic cohort (local MongoDB only):
+#
+#     MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.points_jobs --users 100000
+#
+# Replaces the synthetic cohort, gives everyone wrong points, then times
+# recalculate_points: a first run that has to fix every user and a second one
+# that only has to confirm nothing changed.
+#
+# Then snapshots the points ledger, appends --tail-events awards and compares a
+# ledger rebuild (snapshot + tail) with the full recalculation. Both run as dry
+# runs there, so they do the same work apart from how expected points are found.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from datetime import datetime, timezone
+from pymongo import UpdateMany
+from benchmarks.seed import check_target, seed
+from benchmarks.synthetic import MENTOR_PREFIX
+from database import db
+from points_ledger import events_collection, group_recipients_query, initialize_snapshot, rebuild
+from recalculate_points import recalculate_all_points
+
+async def timed_run(label, job):
+    started = time.perf_counter()
+    await job()
+    elapsed = time.perf_counter() - started
+    print(f"== {label}: {elapsed:.2f}s")
+    return elapsed
+
+async def quietly(job):
+    # dry runs print a line per changed user
+    with contextlib.redirect_stdout(io.StringIO()):
+        await job()
+
+async def append_tail(count, batch_size=1000):
+    """Awards to random groups, written like award_group_points: ledger entry, then $inc"""
+    rng = random.Random(1)
+    groups = await db.users.distinct("fullName", {"accountType": "Mentor", "fullName": {"$regex": f"^{MENTOR_PREFIX}"}})
+    recipients = {name: await db.users.distinct("_id", group_recipients_query(name)) for name in groups}
+    for start in range(0, count, batch_size):
+        events, incs = [], []
+        for _ in range(min(batch_size, count - start)):
+            name = rng.choice(groups)
+            delta = rng.choice([10, -10])
+            events.append({
+                "mentor_name": name, "delta": delta, "scope": "group", "recipients": recipients[name],
+                "reason": "benchmark", "created_at": datetime.now(timezone.utc),
+            })
+            incs.append(UpdateMany({"_id": {"$in": recipients[name]}}, {"$inc": {"points": delta}}))
+        await events_collection.insert_many(events)
+        await db.users.bulk_write(incs, ordered=False)
+
+async def main(users, students_per_mentor, batch_size, concurrency, tail_events):
+    mentors = max(1, users // (students_per_mentor + 1))
+    print(f"Seeding {mentors} groups of {students_per_mentor} students...")
+    await seed(mentors=mentors, students_per_mentor=students_per_mentor, images=0)
+    total_users = await db.users.count_documents({})
+
+    results = {}
+    recalculate = lambda: recalculate_all_points(batch_size, concurrency, resume=False)
+    results["recalculate, every user wrong"] = await timed_run("recalculate_points (cold)", recalculate)
+    results["recalculate, nothing to fix"] = await timed_run("recalculate_points (no changes)", recalculate)
+
+    await initialize_snapshot()
+    await append_tail(tail_events)
+    results["recalculate, dry run"] = await timed_run(
+        "recalculate_points --dry-run",
+        lambda: quietly(lambda: recalculate_all_points(batch_size, concurrency, dry_run=True, resume=False))
+    )
+    results[f"ledger rebuild, {tail_events} tail events, dry run"] = await timed_run(
+        "points_ledger rebuild --dry-run",
+        lambda: quietly(lambda: rebuild(dry_run=True, batch_size=batch_size, concurrency=concurrency))
+    )
+    await events_collection.delete_many({"reason": "benchmark"})
+
+    print(f"\n{total_users} users in the database")
+    for label, elapsed in results.items():
+        print(f"{label:<50} {elapsed:>8.2f}s {total_users / elapsed:>10.0f} users/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the points maintenance jobs on a synthetic cohort")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--students-per-mentor", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tail-events", type=int, default=10_000, help="ledger events after the snapshot")
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    check_target(args.allow_remote)
+    asyncio.run(main(args.users, args.students_per_mentor, args.batch_size, args.concurrency, args.tail_events))
@@ -0,0 +1,77 @@
+# Per-request cost of ProfilingMiddleware, measured in-process (no server, no MongoDB):
+#
+#     python -m benchmarks.profiling_overhead --requests 20000
+#
+# Drives a small ASGI app that records a few db phases (like a typical endpoint)
+# straight through the middleware, three ways: without it, with it and no
+# capture (Server-Timing only, what every request pays), and with every request
+# captured by cProfile (the report is rendered but not stored).
+#
+# For the end-to-end number, run the load test against a server started with
+# and without PROFILING_ENABLED=1 and compare the two results:
+#
+#     python -m benchmarks run --mix browse --output benchmarks/results/profiling-off.json
+#     python -m benchmarks run --mix browse --output benchmarks/results/profiling-on.json
+#     python -m benchmarks compare benchmarks/results/profiling-off.json benchmarks/results/profiling-on.json
+
+import argparse
+import asyncio
+import statistics
+import time
+import orjson
+import profiling
+from server_timing import timed
+
+DB_CALLS_PER_REQUEST = 3
+BODY = orjson.dumps({"items": list(range(50))})
+
+async def endpoint(scope, receive, send):
+    for _ in range(DB_CALLS_PER_REQUEST):
+        with timed("db"):
+            pass
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": BODY})
+
+def request_scope(path="/group"):
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [(b"accept", b"*/*")]}
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+async def send(message):
+    pass
+
+async def per_request_us(app, requests, rounds):
+    """Median over rounds of the mean time per request, in microseconds"""
+    results = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(requests):
+            await app(request_scope(), receive, send)
+        results.append((time.perf_counter() - started) / requests * 1_000_000)
+    return statistics.median(results)
+
+async def main(requests, rounds):
+    # keep captures off MongoDB: render the report (the CPU part) and drop it
+    profiling.store_report_in_background = lambda scope, profiler, *rest: profiling.render_profile(profiler)
+    middleware = profiling.ProfilingMiddleware(endpoint)
+
+    results = {}
+    results["no middleware"] = await per_request_us(endpoint, requests, rounds)
+    profiling.SAMPLE_RATE = 0.0
+    results["Server-Timing only"] = await per_request_us(middleware, requests, rounds)
+    profiling.SAMPLE_RATE = 1.0
+    results["every request captured"] = await per_request_us(middleware, max(1, requests // 20), rounds)
+
+    base = results["no middleware"]
+    print(f"{'':<26} {'us/request':>11} {'overhead':>10}")
+    for label, us in results.items():
+        print(f"{label:<26} {us:>11.1f} {us - base:>+9.1f}us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure ProfilingMiddleware's per-request overhead")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.rounds))
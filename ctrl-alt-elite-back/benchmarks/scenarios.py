@@ -0,0 +1,182 @@
+# Request mixes. Each scenario sends one request and is reported under its label
+# (method + route template, so every mentor's GET counts as the same endpoint).
+#
+# A mix is a list of (weight, scenario); virtual users pick from it at random in
+# proportion to the weights.
+
+import io
+from uuid import uuid4
+from benchmarks.synthetic import BENCH_DOMAIN, IMAGE_PREFIX, synthetic_image
+
+class Scenario:
+    def __init__(self, label, send):
+        self.label = label
+        self.send = send
+
+    def __repr__(self):
+        return f"Scenario({self.label!r})"
+
+def scenario(label):
+    def wrap(send):
+        return Scenario(label, send)
+    return wrap
+
+# --- auth ---
+
+@scenario("POST /auth/login")
+async def login(vu):
+    return await vu.client.post("/auth/login", json={"email": vu.random_student(), "password": vu.cohort["password"]})
+
+@scenario("POST /auth/signup")
+async def signup(vu):
+    return await vu.client.post("/auth/signup", json={
+        "accountType": "Student",
+        "fullName": f"Bench Signup {uuid4().hex[:12]}",
+        "email": f"bench-signup-{uuid4().hex}@{BENCH_DOMAIN}",
+        "password": vu.cohort["password"],
+        "mentor_name": vu.random_mentor()["name"],
+        "fun_facts": "Signed up during a load test",
+    })
+
+# --- profile ---
+
+@scenario("GET /profile")
+async def get_profile(vu):
+    return await vu.client.get("/profile", params={"email": vu.random_student()})
+
+@scenario("PUT /profile")
+async def update_profile(vu):
+    return await vu.client.put("/profile", params={"email": vu.random_student()}, json={"fun_facts": f"Updated {vu.rng.random():.6f}"})
+
+@scenario("GET /profile/role/{account_type}")
+async def get_role(vu):
+    return await vu.client.get(f"/profile/role/{vu.rng.choice(['Mentor', 'Student'])}")
+
+# --- group ---
+
+@scenario("GET /group/{mentor_name}")
+async def get_members(vu):
+    return await vu.client.get(f"/group/{vu.random_mentor()['name']}")
+
+@scenario("GET /group")
+async def get_all_groups(vu):
+    return await vu.client.get("/group")
+
+# --- bucket lists ---
+
+@scenario("GET /bucketlist/{mentor_name}/bucket_lists")
+async def get_bucketlist(vu):
+    return await vu.client.get(f"/bucketlist/{vu.random_mentor()['name']}/bucket_lists")
+
+@scenario("GET /bucketlist/bucket_lists/{mentor_name}")
+async def get_tasks(vu):
+    return await vu.client.get(f"/bucketlist/bucket_lists/{vu.random_mentor()['name']}")
+
+@scenario("GET /bucketlist/bucket_lists")
+async def get_all_bucketlists(vu):
+    return await vu.client.get("/bucketlist/bucket_lists")
+
+@scenario("GET /bucketlist/batch")
+async def get_batch(vu):
+    return await vu.client.get("/bucketlist/batch", params={"view": "progress", "limit": 50})
+
+@scenario("GET /bucketlist/by-completion")
+async def get_by_completion(vu):
+    return await vu.client.get("/bucketlist/by-completion", params={"limit": 20})
+
+@scenario("PUT /bucketlist/{mentor_name}/bucket_lists/toggle/{task_id}")
+async def toggle_task(vu):
+    # mentors toggle their own group's tasks, with their own token
+    mentor = vu.mentor
+    return await vu.client.put(
+        f"/bucketlist/{mentor['name']}/bucket_lists/toggle/{vu.rng.choice(mentor['task_ids'])}",
+        json={"completed": vu.rng.random() < 0.5},
+        headers=vu.auth_headers
+    )
+
+@scenario("POST /bucketlist/{mentor_name}/bucket_lists")
+async def add_task(vu):
+    return await vu.client.post(
+        f"/bucketlist/{vu.mentor['name']}/bucket_lists",
+        json={"description": f"Load test task {uuid4().hex[:8]}"},
+        headers=vu.auth_headers
+    )
+
+# --- leaderboard ---
+
+@scenario("GET /leaderboard")
+async def get_leaderboard(vu):
+    return await vu.client.get("/leaderboard", params={"limit": 10})
+
+@scenario("GET /leaderboard/rank/{mentor_name}")
+async def get_rank(vu):
+    return await vu.client.get(f"/leaderboard/rank/{vu.random_mentor()['name']}")
+
+# --- images ---
+
+@scenario("GET /images/{image_id}")
+async def get_image(vu):
+    return await vu.client.get(f"/images/{vu.random_image()}")
+
+@scenario("GET /images/{image_id}?w=")
+async def get_avatar(vu):
+    return await vu.client.get(f"/images/{vu.random_image()}", params={"w": 128}, headers={"Accept": "image/webp"})
+
+@scenario("POST /images/upload")
+async def upload_image(vu):
+    data = synthetic_image(vu.rng, 128)
+    return await vu.client.post(
+        "/images/upload",
+        files={"file": (f"{IMAGE_PREFIX}upload-{uuid4().hex}.jpg", io.BytesIO(data), "image/jpeg")}
+    )
+
+MIXES = {
+    # a normal day: people looking at their group, list, leaderboard and avatars
+    "browse": [
+        (20, get_profile),
+        (15, get_members),
+        (15, get_tasks),
+        (10, get_bucketlist),
+        (5, get_batch),
+        (5, get_by_completion),
+        (10, get_leaderboard),
+        (5, get_rank),
+        (5, get_image),
+        (10, get_avatar),
+    ],
+    # mentors working through their bucket lists, everyone watching the points move
+    "tasks": [
+        (40, toggle_task),
+        (5, add_task),
+        (25, get_bucketlist),
+        (15, get_leaderboard),
+        (15, get_members),
+    ],
+    # first day of a cohort: sign-ups, logins and profile pictures
+    "onboarding": [
+        (15, signup),
+        (25, login),
+        (20, get_profile),
+        (15, update_profile),
+        (10, upload_image),
+        (15, get_role),
+    ],
+    # admin dashboards reading every group at once
+    "admin": [
+        (20, get_all_groups),
+        (20, get_all_bucketlists),
+        (30, get_role),
+        (30, get_batch),
+    ],
+}
+
+# everything together, weighted roughly like a week of a running cohort
+MIXES["cohort"] = (
+    [(weight * 6, s) for weight, s in MIXES["browse"]]
+    + [(weight * 3, s) for weight, s in MIXES["tasks"]]
+    + [(weight * 1, s) for weight, s in MIXES["onboarding"]]
+    + [(weight * 1, s) for weight, s in MIXES["admin"]]
+)
+
+def needs_mentor_tokens(mix):
+    return any(s in (toggle_task, add_task) for _, s in mix)
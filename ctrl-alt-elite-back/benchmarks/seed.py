@@ -0,0 +1,151 @@
+# Synthetic cohorts for the load tests: mentors with their bucket lists, students
+# spread over the groups, and profile pictures in GridFS.
+#
+# Documents are written straight to MongoDB in bulk (signing up thousands of
+# users through the API would spend minutes in bcrypt), but in the same shape
+# the API writes them, counters included. What the driver needs to know about
+# the cohort (names, emails, task and image ids) goes in a manifest file.
+
+import json
+import os
+import random
+from urllib.parse import urlparse
+from uuid import UUID
+from database import db, MONGODB_URI
+from auth import pwd_context
+from backfill_bucket_counts import summary_counts
+from image_storage import save_bytes
+from benchmarks.synthetic import (
+    BENCH_DOMAIN, MENTOR_PREFIX, IMAGE_PREFIX, BENCH_PASSWORD, mentor_name, task_descriptions, synthetic_image
+)
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "mongo", "mongodb"}
+
+def check_target(allow_remote=False):
+    """Refuse to seed anything but a local database unless asked to"""
+    hosts = [urlparse(f"mongodb://{host}").hostname for host in urlparse(MONGODB_URI or "").netloc.split("@")[-1].split(",")]
+    if not allow_remote and not all(host in LOCAL_HOSTS for host in hosts):
+        raise SystemExit(
+            f"MONGODB_URI points at {', '.join(map(str, hosts))}; benchmarks write thousands of documents. "
+            "Use a local throwaway database, or pass --allow-remote if you really mean it."
+        )
+
+def build_cohort(mentors, students_per_mentor, tasks_per_list, completed_ratio, seed):
+    """Users and bucket lists as they would be stored (passwords not hashed yet)"""
+    rng = random.Random(seed)
+    users = []
+    bucket_lists = []
+    for m in range(mentors):
+        name = mentor_name(m)
+        users.append({
+            "accountType": "Mentor",
+            "fullName": name,
+            "email": f"bench-mentor-{m:04d}@{BENCH_DOMAIN}",
+            "mentor_name": None,
+            "fun_facts": "Mentoring a synthetic cohort",
+            "points": rng.randint(0, 50) * 10,
+            "profile_pic": None,
+        })
+        for s in range(students_per_mentor):
+            users.append({
+                "accountType": "Student",
+                "fullName": f"Bench Student {m:04d}-{s:03d}",
+                "email": f"bench-student-{m:04d}-{s:03d}@{BENCH_DOMAIN}",
+                "mentor_name": name,
+                "fun_facts": f"Student {s} of group {m}",
+                "points": rng.randint(0, 50) * 10,
+                "profile_pic": None,
+            })
+        tasks = [
+            {"id": str(UUID(int=rng.getrandbits(128), version=4)), "description": description, "completed": rng.random() < completed_ratio}
+            for description in task_descriptions(rng, tasks_per_list)
+        ]
+        bucket = {"_id": str(UUID(int=rng.getrandbits(128), version=4)), "mentor_name": name, "tasks": tasks}
+        bucket.update(summary_counts(bucket, {name: students_per_mentor}))
+        bucket_lists.append(bucket)
+    users.append({
+        "accountType": "Admin",
+        "fullName": "Bench Admin",
+        "email": f"bench-admin@{BENCH_DOMAIN}",
+        "mentor_name": None,
+        "fun_facts": "",
+        "points": 0,
+        "profile_pic": None,
+    })
+    return users, bucket_lists
+
+async def reset():
+    """Delete everything the benchmarks created (seeded or via the API)"""
+    bench_users = {"email": {"$regex": f"@{BENCH_DOMAIN.replace('.', '[.]')}$"}}
+    bench_groups = {"$regex": f"^{MENTOR_PREFIX}"}
+    users = await db.users.delete_many(bench_users)
+    await db.bucket_lists.delete_many({"mentor_name": bench_groups})
+    await db.points_events.delete_many({"mentor_name": bench_groups})
+    await db.image_ingestion_jobs.delete_many(bench_users)
+    # (resized copies are named after their original, so they match too)
+    file_ids = await db.fs.files.distinct("_id", {"filename": {"$regex": f"^{IMAGE_PREFIX}"}})
+    await db.fs.files.delete_many({"_id": {"$in": file_ids}})
+    await db.fs.chunks.delete_many({"files_id": {"$in": file_ids}})
+    await db.image_uploads.delete_many({"file_id": {"$in": file_ids}})
+    return {"users": users.deleted_count, "images": len(file_ids)}
+
+async def seed(mentors=20, students_per_mentor=10, tasks_per_list=15, completed_ratio=0.3,
+               images=100, image_size=256, seed=1, batch_size=1000):
+    """Replace any previous synthetic cohort with a new one and return its manifest"""
+    await reset()
+    rng = random.Random(seed)
+    users, bucket_lists = build_cohort(mentors, students_per_mentor, tasks_per_list, completed_ratio, seed)
+
+    # hashed once: every synthetic user shares the password
+    password = pwd_context.hash(BENCH_PASSWORD)
+    for user in users:
+        user["password"] = password
+
+    for start in range(0, len(users), batch_size):
+        await db.users.insert_many(users[start:start + batch_size], ordered=False)
+    for start in range(0, len(bucket_lists), batch_size):
+        await db.bucket_lists.insert_many(bucket_lists[start:start + batch_size], ordered=False)
+
+    # profile pictures for the first `images` users
+    image_ids = []
+    for user in users[:images]:
+        file_id = await save_bytes(
+            synthetic_image(rng, image_size),
+            f"{IMAGE_PREFIX}{user['_id']}.jpg",
+            {"filename": f"{IMAGE_PREFIX}{user['_id']}.jpg", "content_type": "image/jpeg", "user_id": str(user["_id"])},
+            dedupe=True
+        )
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"profile_pic": f"/images/{file_id}"}})
+        image_ids.append(str(file_id))
+
+    return {
+        "params": {
+            "mentors": mentors,
+            "students_per_mentor": students_per_mentor,
+            "tasks_per_list": tasks_per_list,
+            "completed_ratio": completed_ratio,
+            "images": len(image_ids),
+            "image_size": image_size,
+            "seed": seed,
+        },
+        "password": BENCH_PASSWORD,
+        "admin": f"bench-admin@{BENCH_DOMAIN}",
+        "mentors": [
+            {"name": bucket["mentor_name"], "email": f"bench-mentor-{m:04d}@{BENCH_DOMAIN}", "task_ids": [task["id"] for task in bucket["tasks"]]}
+            for m, bucket in enumerate(bucket_lists)
+        ],
+        "students": [user["email"] for user in users if user["accountType"] == "Student"],
+        "images": image_ids,
+    }
+
+def write_manifest(manifest, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def read_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f"No cohort manifest at {path}, run `python -m benchmarks seed` first")
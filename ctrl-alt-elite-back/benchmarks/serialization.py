@@ -0,0 +1,80 @@
+# Cost of turning a list of profiles into a response body, the way the list
+# endpoints (get_by_role, get_members) used to do it vs FastJSONResponse.
+# No server or MongoDB needed:
+#
+#     python -m benchmarks.serialization --sizes 1000 10000
+#
+# before: every field fetched (password included), each document copied to
+#         stringify _id, validated into List[ProfileOut] by the response_model,
+#         dumped back to JSON-able dicts and rendered by JSONResponse
+# after:  projected documents rendered by orjson, ObjectIds encoded in place
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from models import ProfileOut
+from responses import FastJSONResponse, PROFILE_PROJECTION
+
+profiles_adapter = TypeAdapter(List[ProfileOut])
+
+def make_profiles(count, rng):
+    profiles = []
+    for n in range(count):
+        profiles.append({
+            "_id": ObjectId(),
+            "accountType": "Mentor" if n % 10 == 0 else "Student",
+            "fullName": f"Bench User {n:06d}",
+            "email": f"bench-user-{n:06d}@bench.invalid",
+            "password": "$2b$12$" + "x" * 53,  # a bcrypt hash, which the old path fetched and dropped
+            "mentor_name": f"Bench Mentor {n // 10:04d}",
+            "fun_facts": " ".join(rng.choice(["likes", "hiking", "coffee", "python", "bootcamp", "cats"]) for _ in range(12)),
+            "points": rng.randrange(0, 500),
+            "profile_pic": f"/images/{ObjectId()}" if n % 2 else None,
+        })
+    return profiles
+
+def before(profiles):
+    users = []
+    for doc in profiles:
+        doc = dict(doc)
+        doc["_id"] = str(doc["_id"])
+        users.append(doc)
+    validated = profiles_adapter.validate_python(users)
+    return JSONResponse(profiles_adapter.dump_python(validated, mode="json", by_alias=True)).body
+
+def after(projected):
+    return FastJSONResponse(projected).body
+
+def timed(fn, arg, rounds):
+    """Median seconds per call, and the body of the last call"""
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = fn(arg)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), body
+
+def main(sizes, rounds):
+    rng = random.Random(1)
+    print(f"{'profiles':>9} {'before ms':>10} {'after ms':>10} {'speedup':>8} {'before KB':>10} {'after KB':>9}")
+    for size in sizes:
+        profiles = make_profiles(size, rng)
+        # what the PROFILE_PROJECTION find returns
+        projected = [{key: doc[key] for key in doc if key == "_id" or key in PROFILE_PROJECTION} for doc in profiles]
+        before_s, before_body = timed(before, profiles, rounds)
+        after_s, after_body = timed(after, projected, rounds)
+        print(f"{size:>9} {before_s * 1000:>10.2f} {after_s * 1000:>10.2f} {before_s / after_s:>7.1f}x "
+              f"{len(before_body) / 1024:>10.0f} {len(after_body) / 1024:>9.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare list serialization through response_model and through orjson")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    main(args.sizes, args.rounds)
@@ -0,0 +1,114 @@
+# Delivery latency and missed events for many SSE subscribers on
+# /events/stream, against a running API (one worker, the broker is
+# in-process) and a seeded cohort:
+#
+#     python -m benchmarks seed
+#     MONGODB_URI=mongodb://localhost:27017 uvicorn main:app --port 8000
+#     python -m benchmarks.sse_fanout --subscribers 100 1000 --toggles 200
+#
+# Every subscriber watches all groups. One mentor toggles tasks of their own
+# list back and forth, one toggle at a time; latency is from sending the PUT to
+# a subscriber reading the matching task_toggled event. Events a subscriber
+# never saw (dropped for a resync, or still queued at the end) count as missed.
+
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from benchmarks.driver import log_in, percentile
+from benchmarks.seed import read_manifest
+
+class Listener:
+    def __init__(self):
+        self.latencies_ms = []
+        self.resyncs = 0
+        self.connected = asyncio.Event()
+
+async def listen(client, listener, sent):
+    async with client.stream("GET", "/events/stream") as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("retry:"):
+                listener.connected.set()
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "task_toggled":
+                data = json.loads(line[5:])
+                started = sent.get((data["task_id"], data["completed"]))
+                if started is not None:
+                    listener.latencies_ms.append((time.perf_counter() - started) * 1000)
+            elif line.startswith("data:") and event == "resync":
+                listener.resyncs += 1
+            elif not line:
+                event = None
+
+async def toggle(client, mentor, token, toggles, interval, sent):
+    """Flip the mentor's tasks, noting when each one was sent; returns how many published an event"""
+    headers = {"Authorization": f"Bearer {token}"}
+    published = 0
+    for n in range(toggles):
+        task_id = mentor["task_ids"][n % len(mentor["task_ids"])]
+        completed = (n // len(mentor["task_ids"])) % 2 == 0
+        sent[(task_id, completed)] = time.perf_counter()
+        response = await client.put(f"/bucketlist/{mentor['name']}/bucket_lists/toggle/{task_id}",
+                                    json={"completed": completed}, headers=headers)
+        response.raise_for_status()
+        if response.json()["message"].startswith("Task already"):
+            del sent[(task_id, completed)]  # nothing was published
+        else:
+            published += 1
+        await asyncio.sleep(interval)
+    return published
+
+async def measure(base_url, mentor, token, subscribers, toggles, interval):
+    sent = {}
+    listeners = [Listener() for _ in range(subscribers)]
+    limits = httpx.Limits(max_connections=subscribers, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as streams, \
+               httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        tasks = [asyncio.create_task(listen(streams, listener, sent)) for listener in listeners]
+        await asyncio.wait_for(asyncio.gather(*(listener.connected.wait() for listener in listeners)), 120)
+        connected = (await client.get("/metrics/live-updates")).json()["subscribers"]
+
+        published = await toggle(client, mentor, token, toggles, interval, sent)
+        await asyncio.sleep(2)  # let the last events drain
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = sorted(ms for listener in listeners for ms in listener.latencies_ms)
+    return {
+        "connected": connected,
+        "published": published,
+        "missed": published * subscribers - len(latencies),
+        "resyncs": sum(listener.resyncs for listener in listeners),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+async def main(base_url, manifest, subscriber_counts, toggles, interval):
+    cohort = read_manifest(manifest)
+    mentor = cohort["mentors"][0]
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        token = await log_in(client, mentor["email"], cohort["password"])
+
+    print(f"{toggles} toggles by {mentor['name']}, {interval * 1000:.0f} ms apart")
+    print(f"{'subscribers':>11} {'connected':>10} {'published':>10} {'missed':>7} {'resyncs':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    for subscribers in subscriber_counts:
+        result = await measure(base_url, mentor, token, subscribers, toggles, interval)
+        print(f"{subscribers:>11} {result['connected']:>10} {result['published']:>10} {result['missed']:>7} "
+              f"{result['resyncs']:>8} {result['p50_ms']:>7.1f} {result['p99_ms']:>7.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delivery latency and missed events for many SSE subscribers")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default="benchmarks/results/cohort.json")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--toggles", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02, help="seconds between toggles")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.base_url, args.manifest, args.subscribers, args.toggles, args.interval))
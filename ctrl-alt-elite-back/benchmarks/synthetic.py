@@ -0,0 +1,25 @@
+# Names and generated content shared by the seeding and the request mixes.
+# Everything synthetic is recognisable by these names, which is what reset() deletes by.
+
+import io
+from PIL import Image
+
+BENCH_DOMAIN = "bench.invalid"
+MENTOR_PREFIX = "Bench Mentor "
+IMAGE_PREFIX = "bench-"
+BENCH_PASSWORD = "bench-password"
+
+def mentor_name(index):
+    return f"{MENTOR_PREFIX}{index:04d}"
+
+def task_descriptions(rng, count):
+    verbs = ["Visit", "Cook", "Present", "Pair on", "Review", "Sketch", "Demo", "Write up", "Try", "Teach"]
+    things = ["a museum", "a team dinner", "the capstone", "a kata", "a PR", "a wireframe", "a side project", "a blog post", "a new language", "a lightning talk"]
+    return [f"{rng.choice(verbs)} {rng.choice(things)} #{i + 1}" for i in range(count)]
+
+def synthetic_image(rng, size):
+    # random pixels, so no two images dedupe into one GridFS file
+    image = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
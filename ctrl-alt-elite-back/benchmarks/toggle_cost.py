@@ -0,0 +1,86 @@
+# Latency of PUT /bucketlist/.../toggle and the MongoDB commands each toggle
+# costs, from the deltas of /metrics/db around the run. Against a running API
+# and a seeded cohort:
+#
+#     python -m benchmarks seed
+#     MONGODB_URI=mongodb://localhost:27017 uvicorn main:app --port 8000
+#     python -m benchmarks.toggle_cost --mentors 1 10 --toggles 200
+#
+# Each of --mentors mentors flips the tasks of their own list back and forth,
+# one toggle at a time, so every toggle changes a task. Nothing else should be
+# talking to the API meanwhile, its commands would be counted too.
+
+import argparse
+import asyncio
+import time
+import httpx
+from benchmarks.driver import mentor_tokens, percentile
+from benchmarks.seed import read_manifest
+
+async def command_counts(client):
+    """{(collection, command): count} and the total command time in ms so far"""
+    response = await client.get("/metrics/db")
+    response.raise_for_status()
+    counts = {}
+    total_ms = 0.0
+    for row in response.json()["commands"]:
+        counts[(row["collection"], row["command"])] = row["count"]
+        total_ms += row["count"] * row["avg_ms"]
+    return counts, total_ms
+
+async def toggle(client, mentor, token, task_id, completed):
+    response = await client.put(f"/bucketlist/{mentor['name']}/bucket_lists/toggle/{task_id}",
+                                json={"completed": completed}, headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+
+async def toggle_many(client, mentor, token, toggles, state, latencies):
+    for n in range(toggles):
+        task_id = mentor["task_ids"][n % len(mentor["task_ids"])]
+        state[task_id] = not state[task_id]
+        started = time.perf_counter()
+        await toggle(client, mentor, token, task_id, state[task_id])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+async def main(base_url, manifest, mentor_counts, toggles):
+    cohort = read_manifest(manifest)
+    limits = httpx.Limits(max_connections=max(mentor_counts) + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        tokens = await mentor_tokens(client, cohort, max(mentor_counts))
+        # start from a known state, so every measured toggle flips its task
+        state = {}
+        for mentor, token in zip(cohort["mentors"], tokens):
+            for task_id in mentor["task_ids"]:
+                await toggle(client, mentor, token, task_id, False)
+                state[task_id] = False
+
+        for count in mentor_counts:
+            mentors = cohort["mentors"][:count]
+            latencies = []
+            before, before_ms = await command_counts(client)
+            started = time.perf_counter()
+            await asyncio.gather(*(toggle_many(client, mentor, token, toggles, state, latencies)
+                                   for mentor, token in zip(mentors, tokens)))
+            seconds = time.perf_counter() - started
+            after, after_ms = await command_counts(client)
+
+            done = len(latencies)
+            latencies.sort()
+            # the /metrics/db call itself issues no commands, so the delta is the toggles'
+            deltas = {key: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key, 0)}
+            print(f"== {count} mentor(s), {done} toggles in {seconds:.1f} s ({done / seconds:.0f}/s)")
+            print(f"latency p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms; "
+                  f"MongoDB time {(after_ms - before_ms) / done:.2f} ms per toggle")
+            print(f"{sum(deltas.values()) / done:.2f} commands per toggle:")
+            for (collection, command), delta in sorted(deltas.items(), key=lambda item: -item[1]):
+                print(f"    {collection + '.' + command:<32} {delta / done:>6.2f}")
+            print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Toggle latency and MongoDB commands per toggle")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default="benchmarks/results/cohort.json")
+    parser.add_argument("--mentors", type=int, nargs="+", default=[1, 10], help="mentors toggling at the same time")
+    parser.add_argument("--toggles", type=int, default=200, help="toggles per mentor")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.base_url, args.manifest, args.mentors, args.toggles))
@@ -1,29 +1,159 @@
-from fastapi import APIRouter, HTTPException, Body
+import base64
+import binascii
+import logging
+from bson import json_util
+from fastapi import APIRouter, HTTPException, Body, Query, Request, Depends
 from uuid import uuid4
 from models import Task, BucketList
-from typing import List
+from typing import List, Optional
+from pymongo import ReturnDocument
 from database import db
+from leaderboard import leaderboard
+from points_ledger import record_points_event, group_recipients_query
+from live_updates import broker
+from cache import response_cache
+from responses import FastJSONResponse, wants_ndjson, ndjson_response
+from tokens import get_current_user
 
 bucketlist_router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Collections
 users_collection = db["users"]
 bucketlist_collection = db["bucket_lists"]
 
-# Helper function to get user and their role
-async def get_user_role(email: str):
-    user = await users_collection.find_one({"email": email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user.get("accountType", "student")
+# Older tasks store their identifier under "task_id" instead of "id"
+def task_id_query(task_id: str, prefix: str = ""):
+    return {"$or": [{f"{prefix}id": task_id}, {f"{prefix}task_id": task_id}]}
+
+# Recompute completion_ratio from the counters. Only reads scalar fields, so it
+# costs the same however many tasks the list has. Runs after every counter
+# change; the last one to run always sees every $inc before it.
+COMPLETION_RATIO = [
+    {"$set": {"completion_ratio": {"$cond": [
+        {"$gt": ["$task_count", 0]},
+        {"$divide": ["$completed_count", "$task_count"]},
+        0,
+    ]}}},
+]
+
+async def refresh_completion_ratio(mentor_name: str):
+    await bucketlist_collection.update_one({"mentor_name": mentor_name}, COMPLETION_RATIO)
+
+# Conditionally flip one task's "completed" flag in place.
+# Only matches when the task exists and is not already in the requested state,
+# so concurrent toggles can't both succeed (and both award points).
+# Returns the task's toggle number (which keys its points award), or None if
+# nothing changed.
+async def set_task_completed(mentor_name: str, task_id: str, completed: bool):
+    current_state = {"$ne": True} if completed else True
+    bucket = await bucketlist_collection.find_one_and_update(
+        {
+            "mentor_name": mentor_name,
+            "tasks": {"$elemMatch": {**task_id_query(task_id), "completed": current_state}}
+        },
+        {
+            "$set": {"tasks.$[t].completed": completed},
+            "$inc": {"tasks.$[t].toggles": 1, "completed_count": 1 if completed else -1},
+        },
+        array_filters=[{**task_id_query(task_id, "t."), "t.completed": current_state}],
+        projection={"_id": 0, "tasks": {"$elemMatch": task_id_query(task_id)}},
+        return_document=ReturnDocument.AFTER
+    )
+    if bucket is None:
+        return None
+    await refresh_completion_ratio(mentor_name)
+    return bucket["tasks"][0]["toggles"]
+
+# Students joining or leaving a group. Never upserts: a mentor's bucket list is
+# created at mentor signup, which counts the members that are already there.
+async def change_member_count(mentor_name: str, delta: int):
+    if not mentor_name:
+        return
+    await bucketlist_collection.update_one(
+        {"mentor_name": mentor_name},
+        {"$inc": {"member_count": delta}}
+    )
+
+# Admins can change any bucket list, mentors only their own group's (a
+# mentor's group is named after them). Role and name come from the signed
+# token, no user lookup needed.
+def require_list_owner(user: dict, mentor_name: str, action: str):
+    if user["role"] == "Admin":
+        return
+    if user["role"] != "Mentor" or user.get("name") != mentor_name:
+        raise HTTPException(status_code=403, detail=f"Not authorized to {action}")
+
+# Explain why set_task_completed didn't write: raises 404s, otherwise returns
+# the task, which was already in the requested state
+async def check_task_exists(mentor_name: str, task_id: str):
+    bucket = await bucketlist_collection.find_one(
+        {"mentor_name": mentor_name},
+        {"tasks": {"$elemMatch": task_id_query(task_id)}}
+    )
+    if not bucket:
+        raise HTTPException(status_code=404, detail="Bucket list not found")
+    if not bucket.get("tasks"):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return bucket["tasks"][0]
+
+# Update points for both the mentor and everyone in their group.
+# With a key, an award that was already recorded is skipped.
+async def award_group_points(mentor_name: str, points_delta: int, reason: str, task_id: str = None, key: str = None):
+    # The mentor (by fullName) and the mentees in the group, resolved once so
+    # the ledger entry and the $inc go to exactly the same users
+    recipients = await users_collection.distinct("_id", group_recipients_query(mentor_name))
+
+    # The ledger entry comes first: it's what balances are rebuilt from
+    if not await record_points_event(mentor_name, points_delta, reason, recipients, task_id=task_id, key=key):
+        return
+    if recipients:
+        await users_collection.update_many(
+            {"_id": {"$in": recipients}},
+            {"$inc": {"points": points_delta}}
+        )
+    points = await leaderboard.sync(mentor_name)
+    await response_cache.invalidate(f"group:{mentor_name}", "roles")
+    # the group's new leaderboard score, so open leaderboards can patch it in place
+    broker.publish("points_changed", {"mentor_name": mentor_name, "delta": points_delta, "points": points}, mentor_name)
+
+# Points for the toggle that left the task in state `completed`. Keyed on the
+# task and its toggle number, so running it again for the same toggle (a retry
+# after a crash between the toggle and the points) awards nothing twice. Once
+# the points are in, the task remembers it and retries stop here.
+async def award_task_points(mentor_name: str, task_id: str, completed: bool, toggle: int):
+    await award_group_points(
+        mentor_name,
+        10 if completed else -10,
+        "task_completed" if completed else "task_reopened",
+        task_id,
+        key=f"task:{mentor_name}:{task_id}:{toggle}"
+    )
+    await bucketlist_collection.update_one(
+        {"mentor_name": mentor_name},
+        {"$set": {"tasks.$[t].points_toggle": toggle}},
+        array_filters=[{**task_id_query(task_id, "t."), "t.toggles": toggle}]
+    )
+
+# A toggle that changed nothing may be the retry of one whose points never
+# landed: finish that award. Tasks never toggled since toggles were counted
+# have nothing pending.
+async def finish_pending_award(mentor_name: str, task: dict):
+    toggle = task.get("toggles")
+    if toggle and task.get("points_toggle") != toggle:
+        await award_task_points(mentor_name, task.get("id") or task.get("task_id"), task["completed"], toggle)
 
 # Get bucket list for mentor group
 @bucketlist_router.get("/{mentor_name}/bucket_lists", response_model=BucketList)
 async def get_bucketlist(mentor_name: str):
-    bucket = await bucketlist_collection.find_one({"mentor_name": mentor_name})
-    if not bucket:
-        raise HTTPException(status_code=404, detail="Bucket list not found")
-    return bucket
+    async def load():
+        bucket = await bucketlist_collection.find_one({"mentor_name": mentor_name}, {"mentor_name": 1, "tasks": 1})
+        if not bucket:
+            raise HTTPException(status_code=404, detail="Bucket list not found")
+        bucket["_id"] = str(bucket["_id"])
+        return bucket
+
+    return await response_cache.get_or_load(f"bucketlist:{mentor_name}", [f"bucketlist:{mentor_name}"], load)
 
 # Get all tasks in a bucket list
 @bucketlist_router.get("/bucket_lists/{mentor_name}", response_model=List[Task])
@@ -34,19 +164,121 @@ async def get_bucketlist_tasks(mentor_name: str):
     return bucketlist.get("tasks", [])
 
 # Admin can view all bucketlists
-@bucketlist_router.get("/bucket_lists", response_model=List[dict])
-async def get_all_bucketlists():
-    bucketlists = []
-    async for doc in bucketlist_collection.find():
+# ?format=ndjson (or Accept: application/x-ndjson) streams them one per line instead
+@bucketlist_router.get("/bucket_lists", response_model=List[dict], response_class=FastJSONResponse)
+async def get_all_bucketlists(
+    request: Request,
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$"),
+):
+    if wants_ndjson(request, response_format):
+        return ndjson_response(bucketlist_collection.find())
+
+    # documents go straight to orjson, ObjectIds included
+    bucketlists = await bucketlist_collection.find().to_list(length=None)
+    return FastJSONResponse(bucketlists)
+
+# What each batch view returns per bucket list (the counters are maintained on write)
+BATCH_VIEWS = {
+    "counts": {"mentor_name": 1, "task_count": 1, "member_count": 1},
+    "progress": {
+        "mentor_name": 1,
+        "task_count": 1,
+        "completed_count": 1,
+        "member_count": 1,
+        "completion_ratio": 1,
+    },
+    "full": {
+        "mentor_name": 1,
+        "tasks": 1,
+        "task_count": 1,
+        "completed_count": 1,
+        "member_count": 1,
+        "completion_ratio": 1,
+    },
+}
+
+# Batch page cursors: the (mentor_name, _id) of the last item, opaque to clients.
+# mentor_name alone isn't unique, so paging on it would skip duplicates at page edges.
+def encode_batch_cursor(doc):
+    return base64.urlsafe_b64encode(json_util.dumps([doc["mentor_name"], doc["_id"]]).encode()).decode()
+
+def decode_batch_cursor(cursor: str):
+    try:
+        mentor_name, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return mentor_name, last_id
+
+# MANY BUCKET LISTS IN ONE REQUEST
+# (replaces fetching all mentors and then calling /{mentor_name}/bucket_lists once per mentor)
+# ?mentor_name=A&mentor_name=B limits it to those groups, otherwise every group is returned,
+# a page at a time ordered by (mentor_name, _id); pass next_cursor back as ?after= for the next page
+@bucketlist_router.get("/batch", response_class=FastJSONResponse)
+async def get_bucketlists_batch(
+    mentor_name: Optional[List[str]] = Query(None),
+    view: str = Query("progress", pattern="^(counts|progress|full)$"),
+    include_profile: bool = True,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = None,
+):
+    match = {}
+    if mentor_name:
+        match["mentor_name"] = {"$in": mentor_name}
+    if after is not None:
+        last_name, last_id = decode_batch_cursor(after)
+        match["$or"] = [
+            {"mentor_name": {"$gt": last_name}},
+            {"mentor_name": last_name, "_id": {"$gt": last_id}},
+        ]
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"mentor_name": 1, "_id": 1}},
+        {"$limit": limit + 1},  # one extra to know whether there's another page
+        {"$project": BATCH_VIEWS[view]},
+    ]
+    if include_profile:
+        pipeline += [
+            {"$lookup": {
+                "from": "users",
+                "localField": "mentor_name",
+                "foreignField": "fullName",
+                "as": "mentor_profile",
+            }},
+            {"$addFields": {"mentor_profile": {"$arrayElemAt": ["$mentor_profile", 0]}}},
+            {"$project": {"mentor_profile.password": 0}},
+        ]
+
+    items = await bucketlist_collection.aggregate(pipeline).to_list(length=None)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_batch_cursor(items[-1])
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
+
+# GROUPS RANKED BY BUCKET-LIST COMPLETION
+# served from the completion_ratio index, no task arrays are read
+@bucketlist_router.get("/by-completion")
+async def get_bucketlists_by_completion(
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    cursor = bucketlist_collection.find(
+        {},
+        {"mentor_name": 1, "task_count": 1, "completed_count": 1, "member_count": 1, "completion_ratio": 1}
+    ).sort([("completion_ratio", -1), ("mentor_name", 1)]).skip(offset).limit(limit)
+
+    groups = []
+    async for doc in cursor:
         doc["_id"] = str(doc["_id"])
-        bucketlists.append(doc)
-    return bucketlists
+        groups.append(doc)
+    return groups
 
-# Add tasks (Admins & Mentors only)
+# Add tasks (Admins & the group's Mentor only)
 @bucketlist_router.post("/{mentor_name}/bucket_lists")
-async def add_task(mentor_name: str, task: Task, user_email: str):
-    role = await get_user_role(user_email)
-
+async def add_task(mentor_name: str, task: Task, user: dict = Depends(get_current_user)):
+    require_list_owner(user, mentor_name, "add tasks")
     task.id = str(uuid4())  # Ensure task has a UUID
 
     task_data = {
@@ -57,179 +289,82 @@ async def add_task(mentor_name: str, task: Task, user_email: str):
 
     result = await bucketlist_collection.update_one(
         {"mentor_name": mentor_name},
-        {"$push": {"tasks": task_data}},
+        {
+            "$push": {"tasks": task_data},
+            "$inc": {"task_count": 1},
+            "$setOnInsert": {"completed_count": 0, "member_count": 0},
+        },
         upsert=True
     )
+    await refresh_completion_ratio(mentor_name)
+    await response_cache.invalidate(f"bucketlist:{mentor_name}")
+    broker.publish("task_added", {"mentor_name": mentor_name, "task": task_data}, mentor_name)
     return {"message": "Task added"}
 
-# Mark task complete and add points (Mentors & Admins only)
+# Mark task complete and add points (Admins & the group's Mentor only)
 @bucketlist_router.put("/{mentor_name}/bucket_lists/complete/{task_id}")
-async def complete_task(mentor_name: str, task_id: str, user_email: str):
-    role = await get_user_role(user_email)
-    if role not in ["Mentor", "Admin"]:
-        raise HTTPException(status_code=403, detail="Not authorized to complete tasks")
-
-    bucket = await bucketlist_collection.find_one({"mentor_name": mentor_name})
-    if not bucket:
-        raise HTTPException(status_code=404, detail="Bucket list not found")
+async def complete_task(mentor_name: str, task_id: str, user: dict = Depends(get_current_user)):
+    require_list_owner(user, mentor_name, "complete tasks")
 
-    tasks = bucket["tasks"]
-    found = False
-    for task in tasks:
-        if task["_id"] == task_id:
-            if task["completed"]:
-                return {"message": "Task already completed"}
-            task["completed"] = True
-            found = True
-            break
-
-    if not found:
-        raise HTTPException(status_code=404, detail="Task not found")
+    toggle = await set_task_completed(mentor_name, task_id, True)
+    if toggle is None:
+        await finish_pending_award(mentor_name, await check_task_exists(mentor_name, task_id))
+        return {"message": "Task already completed"}
 
-    # Update the task list
-    await bucketlist_collection.update_one(
-        {"mentor_name": mentor_name},
-        {"$set": {"tasks": tasks}}
-    )
-
-    # Update points for both the mentor and everyone in their group
-    
-    # Update points for the mentor (by fullName)
-    await users_collection.update_one(
-        {"fullName": mentor_name},
-        {"$inc": {"points": 10}}
-    )
-    
-    # Add 10 points to every member in the group
-    await users_collection.update_many(
-        {"mentor_name": mentor_name},
-        {"$inc": {"points": 10}}
-    )
+    await response_cache.invalidate(f"bucketlist:{mentor_name}")
+    broker.publish("task_toggled", {"mentor_name": mentor_name, "task_id": task_id, "completed": True}, mentor_name)
+    await award_task_points(mentor_name, task_id, True, toggle)
 
     return {"message": "Task marked complete and points awarded"}
 
-# Toggle task completion and update points (Mentors & Admins only)
+# Toggle task completion and update points (Admins & the group's Mentor only)
 @bucketlist_router.put("/{mentor_name}/bucket_lists/toggle/{task_id}")
 async def toggle_task_completion(
     mentor_name: str,
     task_id: str,
-    user_email: str,
-    completed: bool = Body(..., embed=True)
+    completed: bool = Body(..., embed=True),
+    user: dict = Depends(get_current_user)
 ):
-    # Print debug info
-    print(f"Toggle task: mentor={mentor_name}, task_id={task_id}, user={user_email}, completed={completed}")
-    
-    role = await get_user_role(user_email)
-    print(f"User role: {role}")
-    
-    if role not in ["Mentor", "Admin"]:
-        raise HTTPException(status_code=403, detail="Not authorized to toggle tasks")
-
-    bucket = await bucketlist_collection.find_one({"mentor_name": mentor_name})
-    if not bucket:
-        raise HTTPException(status_code=404, detail="Bucket list not found")
-
-    print(f"Bucket found: {bucket['mentor_name']}, task count: {len(bucket.get('tasks', []))}")
-    
-    tasks = bucket.get("tasks", [])
-    print(f"Looking for task ID: {task_id}")
-    
-    # Debug the actual task structures to see all fields
-    for i, task in enumerate(tasks):
-        print(f"Task {i}: {task}")
-    
-    all_ids = []
-    for task in tasks:
-        # Check both id and task_id fields
-        task_id_value = None
-        if "id" in task:
-            task_id_value = task["id"]
-        elif "task_id" in task:
-            task_id_value = task["task_id"]
-        all_ids.append(task_id_value)
-    print(f"Available task IDs: {all_ids}")
-    
-    found = False
-    for task in tasks:
-        # Check for ID in both 'id' and 'task_id' fields
-        task_id_value = None
-        if "id" in task:
-            task_id_value = task["id"]
-        elif "task_id" in task:
-            task_id_value = task["task_id"]
-            
-        print(f"Checking task: {task_id_value} == {task_id}?")
-        
-        if task_id_value == task_id:
-            if task.get("completed", False) == completed:
-                return {"message": f"Task already {'completed' if completed else 'incomplete'}"}
-            task["completed"] = completed
-            found = True
-            print(f"Task found and updated: {task}")
-            break
+    logger.debug(
+        "Toggle task",
+        extra={"mentor_name": mentor_name, "task_id": task_id, "user": user["email"], "role": user["role"], "completed": completed}
+    )
 
-    if not found:
-        raise HTTPException(status_code=404, detail="Task not found")
+    require_list_owner(user, mentor_name, "toggle tasks")
 
-    # Update the task list
-    await bucketlist_collection.update_one(
-        {"mentor_name": mentor_name},
-        {"$set": {"tasks": tasks}}
-    )
+    # Only the request that actually flips the flag gets to change points
+    toggle = await set_task_completed(mentor_name, task_id, completed)
+    if toggle is None:
+        await finish_pending_award(mentor_name, await check_task_exists(mentor_name, task_id))
+        return {"message": f"Task already {'completed' if completed else 'incomplete'}"}
 
-    # Update points for both the mentor and everyone in their group
-    points_delta = 10 if completed else -10
-    
-    # Update points for the mentor (by fullName)
-    await users_collection.update_one(
-        {"fullName": mentor_name},
-        {"$inc": {"points": points_delta}}
-    )
-    
-    # Update points for mentees in the group
-    await users_collection.update_many(
-        {"mentor_name": mentor_name},
-        {"$inc": {"points": points_delta}}
-    )
+    await response_cache.invalidate(f"bucketlist:{mentor_name}")
+    broker.publish("task_toggled", {"mentor_name": mentor_name, "task_id": task_id, "completed": completed}, mentor_name)
+    await award_task_points(mentor_name, task_id, completed, toggle)
 
     return {"message": f"Task marked {'complete' if completed else 'incomplete'} and points {'awarded' if completed else 'removed'}"}
 
-# Delete task (Mentors & Admins only)
+# Delete task (Admins & the group's Mentor only)
 @bucketlist_router.delete("/{mentor_name}/bucket_lists/task/{task_id}")
-async def delete_task(mentor_name: str, task_id: str, user_email: str):
-    role = await get_user_role(user_email)
-    if role not in ["Mentor", "Admin"]:
-        raise HTTPException(status_code=403, detail="Not authorized to delete tasks")
+async def delete_task(mentor_name: str, task_id: str, user: dict = Depends(get_current_user)):
+    require_list_owner(user, mentor_name, "delete tasks")
     
-    bucket = await bucketlist_collection.find_one({"mentor_name": mentor_name})
-    if not bucket:
-        raise HTTPException(status_code=404, detail="Bucket list not found")
-    
-    # Filter out the task to be deleted, checking both 'id' and 'task_id' fields
-    tasks = bucket.get("tasks", [])
-    original_count = len(tasks)
-    
-    # Create a new list without the task to delete
-    new_tasks = []
-    for task in tasks:
-        # Check for ID in both 'id' and 'task_id' fields
-        task_id_value = None
-        if "id" in task:
-            task_id_value = task["id"]
-        elif "task_id" in task:
-            task_id_value = task["task_id"]
-            
-        if task_id_value != task_id:
-            new_tasks.append(task)
-    
-    # Check if any task was removed
-    if len(new_tasks) == original_count:
+    # Remove just the matching task, checking both 'id' and 'task_id' fields.
+    # One conditional $pull per completed state, so the counters drop in the
+    # same write as the task.
+    for completed, completed_delta in [(True, -1), ({"$ne": True}, 0)]:
+        task = {**task_id_query(task_id), "completed": completed}
+        result = await bucketlist_collection.update_one(
+            {"mentor_name": mentor_name, "tasks": {"$elemMatch": task}},
+            {"$pull": {"tasks": task}, "$inc": {"task_count": -1, "completed_count": completed_delta}}
+        )
+        if result.modified_count:
+            break
+    else:
+        await check_task_exists(mentor_name, task_id)  # 404 for a missing list or task
         raise HTTPException(status_code=404, detail="Task not found")
+    await refresh_completion_ratio(mentor_name)
     
-    # Update the task list
-    await bucketlist_collection.update_one(
-        {"mentor_name": mentor_name},
-        {"$set": {"tasks": new_tasks}}
-    )
-    
+    await response_cache.invalidate(f"bucketlist:{mentor_name}")
+    broker.publish("task_deleted", {"mentor_name": mentor_name, "task_id": task_id}, mentor_name)
     return {"message": f"Task deleted successfully"}
@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from collections import OrderedDict
+import orjson
+from responses import bson_default
+
+# Seconds a cached response may be served for, even if an invalidation was missed
+# (e.g. points repaired by recalculate_points.py from another process)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# "memory" (default), "redis" (needs CACHE_REDIS_URL and the redis package) or "off"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+
+class MemoryBackend:
+    """
+    In-process TTL + LRU store. Each worker process has its own copy.
+    Values are kept as JSON (like in Redis), so every read gets its own copy
+    and a handler changing it can't change what later requests see.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, JSON bytes, tags)
+        self._tags = {}                # tag -> set of keys
+        self._generation = 0           # bumped by every invalidation
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return orjson.loads(entry[1])
+
+    async def generation(self):
+        return self._generation
+
+    async def set(self, key, value, tags, ttl, generation):
+        """Store value, unless an invalidation happened since `generation` was read"""
+        if generation != self._generation:
+            return False
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, orjson.dumps(value, default=bson_default), tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))  # least recently used
+        return True
+
+    async def invalidate(self, tags):
+        self._generation += 1
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def entries(self):
+        return len(self._entries)
+
+class RedisBackend:
+    """
+    Shared store for running several workers. Works with any client that speaks
+    the redis.asyncio API, so fakeredis.aioredis.FakeRedis can stand in locally.
+    Tags are Redis sets holding the keys cached under them. The invalidation
+    generation is a Redis counter too, so a fill in one worker is dropped when
+    any worker invalidated meanwhile.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, prefix="cache:"):
+        self.client = client
+        self.prefix = prefix
+        self.generation_key = f"{prefix}generation"
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def generation(self):
+        return int(await self.client.get(self.generation_key) or 0)
+
+    async def set(self, key, value, tags, ttl, generation):
+        """Store value, unless an invalidation happened since `generation` was read"""
+        from redis.exceptions import WatchError  # optional dependency, like in create_backend
+        ttl = max(1, int(ttl))
+        async with self.client.pipeline() as pipe:
+            try:
+                # the write only goes through if nobody bumped the generation since the check
+                await pipe.watch(self.generation_key)
+                if int(await pipe.get(self.generation_key) or 0) != generation:
+                    return False
+                pipe.multi()
+                pipe.set(self.prefix + key, json.dumps(value, default=str), ex=ttl)
+                for tag in tags:
+                    tag_key = f"{self.prefix}tag:{tag}"
+                    pipe.sadd(tag_key, key)
+                    pipe.expire(tag_key, ttl)
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    async def invalidate(self, tags):
+        await self.client.incr(self.generation_key)
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = await self.client.smembers(tag_key)
+            names = [self.prefix + (key.decode() if isinstance(key, bytes) else key) for key in keys]
+            await self.client.delete(tag_key, *names)
+
+    def entries(self):
+        return None  # not tracked locally
+
+class ResponseCache:
+    """
+    Read-through cache for endpoint responses, invalidated by tags.
+
+    Reads are cached under tags such as "user:<email>" or "group:<mentor_name>",
+    and writes call invalidate() with the tags they affect (see user_tags).
+    A response loaded while an invalidation was happening (in any worker
+    sharing the backend) is returned but not stored, so a slow read can't put
+    stale data back right after a write.
+    """
+
+    def __init__(self, backend=None, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key, tags, loader):
+        """tags is a list, or a function of the loaded value returning one"""
+        if self.backend is None:
+            return await loader()
+
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        generation = await self.backend.generation()
+        value = await loader()
+        await self.backend.set(key, value, tags(value) if callable(tags) else tags, self.ttl, generation)
+        return value
+
+    async def invalidate(self, *tags):
+        tags = [tag for tag in tags if tag]
+        if self.backend is None or not tags:
+            return
+        self.invalidations += 1
+        await self.backend.invalidate(tags)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "off",
+            "entries": self.backend.entries() if self.backend is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+def user_tags(user):
+    """Every cached read that shows this user's profile"""
+    tags = [f"user:{user.get('email')}", f"role:{user.get('accountType')}"]
+    if user.get("mentor_name"):
+        tags.append(f"group:{user['mentor_name']}")
+    if user.get("fullName"):
+        tags.append(f"group:{user['fullName']}")  # mentors are tagged with their own group
+    return tags
+
+def create_backend():
+    if CACHE_BACKEND == "off":
+        return None
+    if CACHE_BACKEND == "redis":
+        import redis.asyncio as redis  # optional dependency, only needed for this backend
+        return RedisBackend(redis.from_url(os.environ["CACHE_REDIS_URL"]))
+    return MemoryBackend()
+
+response_cache = ResponseCache(create_backend())
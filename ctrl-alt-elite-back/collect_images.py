@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from database import db
+from image_storage import image_id_from_url, uploads_collection
+
+async def referenced_image_ids():
+    """Every image id some user's profile_pic / profile_picture, upload record or pending upload still points at"""
+    referenced = set()
+    cursor = db.users.find({}, {"profile_pic": 1, "profile_picture": 1})
+    async for user in cursor:
+        image_id = image_id_from_url(user.get("profile_pic"))
+        if image_id:
+            referenced.add(image_id)
+        picture = user.get("profile_picture")
+        if picture and ObjectId.is_valid(picture):
+            referenced.add(ObjectId(picture))
+    # uploads, including generic ones sharing a stored copy with a profile picture
+    async for upload in uploads_collection.find({}, {"file_id": 1, "_id": 0}):
+        referenced.add(upload["file_id"])
+    # images staged for an upload that hasn't finished yet
+    async for job in db.image_ingestion_jobs.find({"status": {"$in": ["queued", "processing"]}}, {"file_id": 1}):
+        referenced.add(job["file_id"])
+    return referenced
+
+async def delete_batch(file_ids, dry_run):
+    """Delete unreferenced files (and their resized copies). Returns how many went."""
+    if dry_run:
+        return len(file_ids)
+
+    # still conditional on the refcount: an upload may have started reusing one of them
+    await db.fs.files.delete_many({
+        "_id": {"$in": file_ids},
+        "$or": [{"metadata.refcount": {"$lte": 0}}, {"metadata.refcount": {"$exists": False}}]
+    })
+    remaining = {doc["_id"] async for doc in db.fs.files.find({"_id": {"$in": file_ids}}, {"_id": 1})}
+    deleted = [file_id for file_id in file_ids if file_id not in remaining]
+    if not deleted:
+        return 0
+
+    variant_ids = [doc["_id"] async for doc in db.fs.files.find({"metadata.variant_of": {"$in": deleted}}, {"_id": 1})]
+    await db.fs.files.delete_many({"_id": {"$in": variant_ids}})
+    await db.fs.chunks.delete_many({"files_id": {"$in": deleted + variant_ids}})
+    return len(deleted)
+
+async def collect_profile_pictures(cutoff_id, batch_size, dry_run):
+    referenced = await referenced_image_ids()
+    print(f"Found {len(referenced)} images referenced by users and uploads")
+
+    marked = 0
+    deleted = 0
+    batch = []
+    cursor = db.fs.files.find(
+        {"metadata.is_profile_picture": True, "_id": {"$lt": cutoff_id}},
+        {"metadata.refcount": 1}
+    )
+    async for doc in cursor:
+        if doc["_id"] in referenced:
+            continue
+        refcount = doc.get("metadata", {}).get("refcount")
+        if refcount is not None and refcount > 0:
+            # Mark now, sweep on the next run. An upload that re-references this
+            # copy in the meantime bumps the refcount again and keeps it alive.
+            if not dry_run:
+                await db.fs.files.update_one(
+                    {"_id": doc["_id"], "metadata.refcount": refcount},
+                    {"$set": {"metadata.refcount": 0}}
+                )
+            marked += 1
+            continue
+        batch.append(doc["_id"])
+        if len(batch) >= batch_size:
+            deleted += await delete_batch(batch, dry_run)
+            batch = []
+    if batch:
+        deleted += await delete_batch(batch, dry_run)
+
+    print(f"Marked {marked} unreferenced images for the next run")
+    print(f"{'Would delete' if dry_run else 'Deleted'} {deleted} unreferenced images")
+
+async def collect_orphan_chunks(cutoff_id, batch_size, dry_run):
+    """Chunks whose fs.files document is gone (e.g. interrupted uploads or deletes)"""
+    pipeline = [
+        # GridFS writes chunks before the files document, so skip recent uploads
+        {"$match": {"files_id": {"$lt": cutoff_id}}},
+        {"$group": {"_id": "$files_id"}},
+        {"$lookup": {"from": "fs.files", "localField": "_id", "foreignField": "_id", "as": "file"}},
+        {"$match": {"file": {"$size": 0}}},
+    ]
+    removed = 0
+    batch = []
+    async for doc in db.fs.chunks.aggregate(pipeline, allowDiskUse=True):
+        batch.append(doc["_id"])
+        if len(batch) >= batch_size:
+            removed += await delete_orphans(batch, dry_run)
+            batch = []
+    if batch:
+        removed += await delete_orphans(batch, dry_run)
+    print(f"{'Would delete' if dry_run else 'Deleted'} {removed} orphaned chunks")
+
+async def delete_orphans(files_ids, dry_run):
+    if dry_run:
+        return await db.fs.chunks.count_documents({"files_id": {"$in": files_ids}})
+    result = await db.fs.chunks.delete_many({"files_id": {"$in": files_ids}})
+    return result.deleted_count
+
+async def collect_images(batch_size=500, grace_minutes=60, dry_run=False):
+    """Delete stored profile pictures no user references any more, in batches."""
+    print(f"Starting image garbage collection{' (dry run)' if dry_run else ''}...")
+
+    # leave recent uploads alone: their user may not point at them yet
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=grace_minutes)
+    cutoff_id = ObjectId.from_datetime(cutoff)
+
+    await collect_profile_pictures(cutoff_id, batch_size, dry_run)
+    await collect_orphan_chunks(cutoff_id, batch_size, dry_run)
+    print("Image garbage collection complete!")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete stored images no user references any more")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--grace-minutes", type=int, default=60, help="skip images uploaded more recently than this")
+    args = parser.parse_args()
+
+    asyncio.run(collect_images(args.batch_size, args.grace_minutes, args.dry_run))
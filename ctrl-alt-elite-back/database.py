@@ -3,19 +3,67 @@ from pydantic import BaseModel, Field
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Dict, List
 from bson import ObjectId
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
+from db_monitoring import command_listener, pool_listener
+from server_timing import timing_listeners
 from models import Profile, ProfileOut, UpdateProfile
 from pymongo import ReturnDocument
 
 # Load environment variables from .env file
 load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI")
+logger = logging.getLogger(__name__)
+
+# Connection pool settings (unset = pymongo's defaults)
+def pool_options():
+    options = {}
+    for env_name, option in [
+        ("MONGODB_MAX_POOL_SIZE", "maxPoolSize"),            # default 100
+        ("MONGODB_MIN_POOL_SIZE", "minPoolSize"),            # default 0
+        ("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "waitQueueTimeoutMS"),  # default: wait forever
+    ]:
+        value = os.getenv(env_name)
+        if value:
+            options[option] = int(value)
+    compressors = os.getenv("MONGODB_COMPRESSORS")  # e.g. "zstd,snappy,zlib"
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+POOL_OPTIONS = pool_options()
 
 # MongoDB connection
-client = AsyncIOMotorClient(MONGODB_URI, tlsAllowInvalidCertificates=True)
+# (Motor connects lazily; main.py's lifespan checks it on startup and closes it on shutdown)
+client = AsyncIOMotorClient(
+    MONGODB_URI,
+    tlsAllowInvalidCertificates=True,
+    event_listeners=[command_listener, pool_listener, *timing_listeners()],
+    **POOL_OPTIONS
+)
 db = client["bootcamp"]
 
+async def ping_database(timeout=2.0):
+    """True if MongoDB answers a ping within timeout seconds"""
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout)
+        return True
+    except Exception as e:
+        logger.warning("MongoDB ping failed: %r", e)
+        return False
+
+def close_database():
+    client.close()
+
+def db_metrics():
+    return {
+        "pool_options": POOL_OPTIONS,
+        "pool": pool_listener.snapshot(),
+        "commands": command_listener.snapshot(),
+    }
+
 async def check_storage_metrics():
     try:
         # Get database stats
@@ -44,6 +92,6 @@ async def check_storage_metrics():
                 "size": fs_chunks_stats["size"]
             }
         }
-    except Exception as e:
-        print(f"Error checking storage metrics: {e}")
+    except Exception:
+        logger.exception("Error checking storage metrics")
         return None
\ No newline at end of file
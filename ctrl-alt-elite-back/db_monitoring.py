@@ -0,0 +1,167 @@
+# pymongo event listeners behind /metrics/db. Motor runs pymongo in executor
+# threads, so the callbacks happen off the event loop and take a lock.
+
+import threading
+import time
+from pymongo import monitoring
+
+# Upper bounds (ms) of the latency histogram buckets; anything slower lands in "+Inf"
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Commands whose first value isn't a collection name
+NO_COLLECTION_COMMANDS = {"ping", "hello", "ismaster", "isMaster", "buildInfo", "endSessions", "dbStats"}
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        index = 0
+        while index < len(BUCKETS_MS) and ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self):
+        buckets = {str(bound): count for bound, count in zip(BUCKETS_MS, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": buckets,
+        }
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """Latency histogram per (collection, command), plus failure counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}  # (connection_id, request_id) -> (collection, command)
+        self.latency = {}
+        self.failures = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name in NO_COLLECTION_COMMANDS:
+            collection = "-"
+        elif name == "getMore":
+            collection = event.command.get("collection", "-")
+        else:
+            collection = event.command.get(name, "-")
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._in_flight[(event.connection_id, event.request_id)] = (collection, name)
+
+    def _finish(self, event):
+        with self._lock:
+            return self._in_flight.pop((event.connection_id, event.request_id), ("-", event.command_name))
+
+    def succeeded(self, event):
+        key = self._finish(event)
+        with self._lock:
+            self.latency.setdefault(key, Histogram()).observe(event.duration_micros / 1000)
+
+    def failed(self, event):
+        key = self._finish(event)
+        with self._lock:
+            self.latency.setdefault(key, Histogram()).observe(event.duration_micros / 1000)
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {
+                    "collection": collection,
+                    "command": command,
+                    "failures": self.failures.get((collection, command), 0),
+                    **histogram.snapshot(),
+                }
+                for (collection, command), histogram in sorted(self.latency.items())
+            ]
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Connection checkout wait times and pool occupancy, for sizing maxPoolSize"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()  # a checkout starts and ends on the same thread
+        self.checkout_wait = Histogram()
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.open_connections = 0
+        self.checkout_failures = {}
+        self.pool_clears = 0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return None if started is None else (time.perf_counter() - started) * 1000
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            if waited is not None:
+                self.checkout_wait.observe(waited)
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            if waited is not None:
+                self.checkout_wait.observe(waited)
+            reason = str(event.reason)  # e.g. "timeout" when waitQueueTimeoutMS is hit
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # the rest of the interface isn't needed for these numbers
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "open_connections": self.open_connections,
+                "checkout_wait": self.checkout_wait.snapshot(),
+                "checkout_failures": dict(self.checkout_failures),
+                "pool_clears": self.pool_clears,
+            }
+
+command_listener = CommandLatencyListener()
+pool_listener = PoolListener()
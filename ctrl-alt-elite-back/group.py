@@ -1,6 +1,11 @@
 from fastapi import FastAPI, APIRouter, HTTPException
-from models import ProfileOut
+from models import ProfileOut, GroupOut
 from database import db
+from leaderboard import leaderboard
+from points_ledger import record_points_event, group_recipients_query, SCOPE_MEMBERS
+from live_updates import broker
+from cache import response_cache
+from responses import FastJSONResponse, PROFILE_PROJECTION
 from typing import List
 
 group_router = APIRouter()
@@ -8,38 +13,63 @@ group_router = APIRouter()
 users_collection = db["users"]
 
 
+# GET EVERY MENTOR WITH THEIR STUDENTS IN ONE ROUND TRIP
+# (replaces fetching all mentors and then calling /group/{mentor_name} once per mentor)
+@group_router.get("", response_model=List[GroupOut])
+async def get_all_groups():
+    pipeline = [
+        {"$match": {"accountType": "Mentor"}},
+        # join each mentor with the users whose mentor_name points at them
+        {"$lookup": {
+            "from": "users",
+            "localField": "fullName",
+            "foreignField": "mentor_name",
+            "as": "students",
+        }},
+        {"$project": {"password": 0, "students.password": 0}},  # hashes are never returned
+        {"$sort": {"fullName": 1}},
+    ]
+
+    groups = []
+    async for mentor in users_collection.aggregate(pipeline):
+        students = mentor.pop("students")
+        mentor["_id"] = str(mentor["_id"]) # convert ObjectId to string for response
+        for student in students:
+            student["_id"] = str(student["_id"])
+        groups.append({"mentor": mentor, "students": students})
+    return groups
+
 # GET LIST OF USERS FOR SAME MENTOR
-@group_router.get("/{mentor_name}", response_model=List[ProfileOut])
+@group_router.get("/{mentor_name}", response_model=List[ProfileOut], response_class=FastJSONResponse)
 async def get_members(mentor_name:str):
-    cursor = users_collection.find({"mentor_name": mentor_name})
-    
-    if not cursor:
-        raise HTTPException(status_code=404, detail="Mentor not found")
-    
-    members = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"]) # convert ObjectId to string for response
-        members.append(doc)
-    return members
+    async def load():
+        # projected to ProfileOut's fields, so the documents can be returned as they are
+        cursor = users_collection.find({"mentor_name": mentor_name}, PROFILE_PROJECTION)
+
+        if not cursor:
+            raise HTTPException(status_code=404, detail="Mentor not found")
+
+        return await cursor.to_list(length=None)
+
+    members = await response_cache.get_or_load(f"members:{mentor_name}", [f"group:{mentor_name}"], load)
+    return FastJSONResponse(members)
 
 # UPDATE POINT TOTALS FOR GROUP
 # change the URL thing after bucketlist backend is complete
 @group_router.put("/{mentor_name}/bucketlist/complete")
 async def update_points(mentor_name:str, points_added:int):
-    members = users_collection.find({"mentor_name": mentor_name})
-    updated = 0
-
-    # use async for loop since cursor returned by .find is async
-    async for member in members:
-        result = await users_collection.update_one(
-            {"_id": member["_id"]},
-            {"$inc": {"points": points_added}}
-        )
-
-        # increment updated var if number of docs modified > 0
-        if result.modified_count > 0:
-            updated += 1
-    
-    if updated == 0:
+    # only members get these points, not the mentor
+    members = await users_collection.distinct("_id", group_recipients_query(mentor_name, SCOPE_MEMBERS))
+    if not members:
         raise HTTPException(status_code=404, detail="No members updated")
+
+    # record it in the points ledger first, with the members it goes to
+    await record_points_event(mentor_name, points_added, "group_award", members, scope=SCOPE_MEMBERS)
+    await users_collection.update_many(
+        {"_id": {"$in": members}},
+        {"$inc": {"points": points_added}}
+    )
+    points = await leaderboard.sync(mentor_name)
+    await response_cache.invalidate(f"group:{mentor_name}", "roles")
+    broker.publish("points_changed", {"mentor_name": mentor_name, "delta": points_added, "points": points}, mentor_name)
     return {"message": "Updated group points"}
\ No newline at end of file
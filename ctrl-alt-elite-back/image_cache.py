@@ -0,0 +1,119 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# Total bytes of image data kept in memory, and the largest single image worth
+# caching (bigger ones are streamed from GridFS every time instead)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_CACHE_MAX_ITEM_BYTES = int(os.getenv("IMAGE_CACHE_MAX_ITEM_BYTES", str(2 * 1024 * 1024)))
+# What an entry without image bytes (just its fs.files document) counts for
+METADATA_ENTRY_BYTES = 1024
+
+class CachedImage(NamedTuple):
+    file_data: dict          # the fs.files document
+    data: Optional[bytes]    # full image bytes, or None if too big to cache
+
+    def cost(self):
+        return METADATA_ENTRY_BYTES if self.data is None else len(self.data)
+
+class ImageCache:
+    """
+    In-memory LRU of images keyed by image ID, bounded by total bytes rather
+    than entry count.
+
+    Concurrent misses for the same key share one load (single flight), so a page
+    full of identical avatars only hits MongoDB once. Everything runs on the
+    event loop, so no locking is needed between awaits.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries = OrderedDict()  # key -> CachedImage, least recently used first
+        self._size = 0
+        self._inflight = {}            # key -> Future shared by concurrent misses
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """The cached entry, or None (without loading it or counting a miss)"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    async def get_or_load(self, key: str, loader):
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this request itself was cancelled
+                # the request doing the load went away, so load it here instead
+                return await loader()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody else was waiting
+            else:
+                future.cancel()
+            raise
+
+        # invalidate() may have dropped this load while it was running
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            self._put(key, value)
+        future.set_result(value)
+        return value
+
+    def _put(self, key: str, value: Optional[CachedImage]):
+        if value is None:
+            return
+        if value.data is not None and len(value.data) > self.max_item_bytes:
+            value = CachedImage(value.file_data, None)  # too big: keep only the metadata
+        self._entries[key] = value
+        self._size += value.cost()
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.cost()
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.cost()
+        self._inflight.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "max_item_bytes": self.max_item_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_ITEM_BYTES)
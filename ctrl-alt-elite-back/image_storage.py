@@ -0,0 +1,191 @@
+import hashlib
+import os
+import re
+from datetime import datetime, timezone
+from bson import ObjectId
+from fastapi import UploadFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import db
+
+# Size of each fs.chunks document. GridFS' default (255 KB) keeps every chunk well
+# under MongoDB's 16 MB document limit, so image size is no longer capped by it.
+CHUNK_SIZE = int(os.getenv("IMAGE_CHUNK_SIZE", str(255 * 1024)))
+
+# How many chunks the download cursor fetches per round trip
+STREAM_BATCH_CHUNKS = 4
+
+fs_bucket = AsyncIOMotorGridFSBucket(db, chunk_size_bytes=CHUNK_SIZE)
+
+# One record per upload: who uploaded which stored copy. Identical uploads share
+# a single fs.files copy (whose metadata only knows the first uploader), so
+# ownership lives here, and each record holds one reference to its copy.
+uploads_collection = db["image_uploads"]
+
+# Image URLs stored on users look like "/images/<ObjectId>" (optionally with a host)
+IMAGE_URL_PATTERN = re.compile(r"/images/([0-9a-fA-F]{24})")
+
+def image_id_from_url(url):
+    match = IMAGE_URL_PATTERN.search(url or "")
+    return ObjectId(match.group(1)) if match else None
+
+async def add_reference(content_key: str):
+    """Point one more user/upload at an already-stored copy. Returns its id, or None if there isn't one."""
+    doc = await db.fs.files.find_one_and_update(
+        {"metadata.content_key": content_key},
+        {"$inc": {"metadata.refcount": 1}},
+        projection={"_id": 1}
+    )
+    return doc["_id"] if doc else None
+
+async def record_upload(file_id, user_id, filename: str, content_type: str, is_profile_picture: bool = False, job_id=None):
+    """
+    Take over the reference an upload got from save_upload/save_bytes. Returns the record's id.
+    With a job_id, a job that runs again records nothing new (it holds one reference, not two).
+    """
+    record = {
+        "file_id": file_id,
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "is_profile_picture": is_profile_picture,
+        "uploaded_at": datetime.now(timezone.utc),
+    }
+    if job_id is None:
+        result = await uploads_collection.insert_one(record)
+        return result.inserted_id
+    doc = await uploads_collection.find_one_and_update(
+        {"job_id": job_id},
+        {"$setOnInsert": record},
+        upsert=True,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["_id"]
+
+async def delete_file(file_id):
+    await db.fs.files.delete_one({"_id": file_id})
+    await db.fs.chunks.delete_many({"files_id": file_id})
+
+async def claim_content(file_id, content_key: str):
+    """
+    Make a freshly written file the stored copy of its content, or, if identical
+    bytes are already stored, drop it and reference that copy instead.
+    Returns the id callers should use.
+    """
+    while True:
+        try:
+            # unique index on metadata.content_key: only one copy can claim it
+            await db.fs.files.update_one(
+                {"_id": file_id},
+                {"$set": {"metadata.content_key": content_key, "metadata.refcount": 1}}
+            )
+            return file_id
+        except DuplicateKeyError:
+            existing_id = await add_reference(content_key)
+            if existing_id is not None:
+                await delete_file(file_id)
+                return existing_id
+            # the existing copy was garbage collected in between: try again
+
+async def release_image(file_id):
+    """
+    Drop one reference to a stored image and delete it once nothing references it.
+    Files stored before deduplication have no refcount and are deleted straight away.
+    Returns True if the file was deleted.
+    """
+    await db.fs.files.update_one(
+        {"_id": file_id, "metadata.refcount": {"$gt": 0}},
+        {"$inc": {"metadata.refcount": -1}}
+    )
+    # conditional, so a concurrent add_reference() either wins (and keeps the file) or sees it gone
+    result = await db.fs.files.delete_one({
+        "_id": file_id,
+        "$or": [{"metadata.refcount": {"$lte": 0}}, {"metadata.refcount": {"$exists": False}}]
+    })
+    if result.deleted_count == 0:
+        return False
+    await db.fs.chunks.delete_many({"files_id": file_id})
+    return True
+
+async def save_upload(file: UploadFile, filename: str, metadata: dict, dedupe: bool = False):
+    """
+    Copy an upload into GridFS one chunk at a time, so the whole body is never
+    held in memory. Returns the stored file's ObjectId (with dedupe=True, the id
+    of an existing identical copy if there is one).
+    """
+    grid_in = fs_bucket.open_upload_stream(filename, metadata=metadata)
+    digest = hashlib.sha256()
+    try:
+        while True:
+            piece = await file.read(CHUNK_SIZE)
+            if not piece:
+                break
+            digest.update(piece)
+            await grid_in.write(piece)
+    except Exception:
+        await grid_in.abort()  # remove the chunks written so far
+        raise
+    await grid_in.close()
+
+    # The content hash is only known once every chunk has been read.
+    # It is used as the ETag, so serving never has to touch chunk data to validate.
+    content_hash = digest.hexdigest()
+    await db.fs.files.update_one(
+        {"_id": grid_in._id},
+        {"$set": {"metadata.sha256": content_hash}}
+    )
+    if dedupe:
+        return await claim_content(grid_in._id, content_hash)
+    return grid_in._id
+
+async def save_bytes(data: bytes, filename: str, metadata: dict, file_id=None, dedupe: bool = False):
+    """Store data that is already in memory (e.g. a decoded base64 image)."""
+    content_hash = hashlib.sha256(data).hexdigest()
+    metadata = {**metadata, "sha256": content_hash}
+
+    if dedupe:
+        # the hash is known up front, so identical bytes never get written twice
+        existing_id = await add_reference(content_hash)
+        if existing_id is not None:
+            return existing_id
+        metadata["content_key"] = content_hash
+        metadata["refcount"] = 1
+
+    file_id = file_id or ObjectId()
+    try:
+        await fs_bucket.upload_from_stream_with_id(file_id, filename, data, metadata=metadata)
+    except DuplicateKeyError:
+        # unique index (content_key, or variant for thumbnails): remove our chunks
+        await db.fs.chunks.delete_many({"files_id": file_id})
+        if not dedupe:
+            raise
+        return await save_bytes(data, filename, metadata, dedupe=True)
+    return file_id
+
+async def iter_chunks(file_doc, start: int = 0, end: int = None):
+    """
+    Yield bytes start..end (inclusive) of a stored file, chunk by chunk, in order.
+    Only the chunks overlapping the range are read. Also works for the older
+    single-chunk files written before GridFS chunking (they have no chunkSize).
+    """
+    length = file_doc.get("length", 0)
+    if end is None:
+        end = length - 1
+    if length == 0 or start > end:
+        return
+
+    chunk_size = file_doc.get("chunkSize") or length
+    first_n = start // chunk_size
+    last_n = end // chunk_size
+
+    cursor = db.fs.chunks.find(
+        {"files_id": file_doc["_id"], "n": {"$gte": first_n, "$lte": last_n}},
+        {"data": 1, "n": 1}
+    ).sort("n", 1)
+    async for chunk in cursor.batch_size(STREAM_BATCH_CHUNKS):
+        data = chunk["data"]
+        chunk_start = chunk["n"] * chunk_size
+        # trim the first and last chunk to the requested range
+        yield data[max(start - chunk_start, 0):end - chunk_start + 1]
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
-from fastapi.responses import StreamingResponse
+import logging
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, Query
+from fastapi.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
-import io
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from database import db
-from typing import List
+from image_storage import save_upload, iter_chunks, release_image, record_upload, uploads_collection
+from image_cache import image_cache, CachedImage
+from cache import response_cache, user_tags
+from thumbnails import load_variant, delete_variants, pick_size, pick_format, variant_key
+from typing import List, Optional
 
 router = APIRouter(prefix="/images", tags=["images"])
+logger = logging.getLogger(__name__)
 
 # Models to help us keep track of image data
 class ImageResponse(dict):
@@ -14,23 +21,44 @@ class ImageResponse(dict):
     filename: str
     content_type: str
 
+async def release_image_reference(obj_id: ObjectId):
+    """
+    Drop one reference to a stored image. Once nothing references it the file,
+    its resized copies and any cached bytes are removed.
+    """
+    if not await release_image(obj_id):
+        return False
+    # Resized copies go with the original
+    for key in await delete_variants(obj_id):
+        image_cache.invalidate(key)
+    image_cache.invalidate(str(obj_id))
+    return True
+
+async def release_replaced_picture(user_id, old_id: ObjectId, current_upload_id=None):
+    """
+    A user's profile picture was replaced: drop the reference the old one held.
+    That is its upload record, or for pictures set before upload records existed,
+    the user field itself. Released even when the new upload is the same stored
+    copy, since the new upload brought its own reference.
+    """
+    await uploads_collection.delete_one({
+        "user_id": user_id,
+        "file_id": old_id,
+        "is_profile_picture": True,
+        "_id": {"$ne": current_upload_id},
+    })
+    return await release_image_reference(old_id)
+
 @router.post("/upload", status_code=201)
 async def upload_image(file: UploadFile = File(...), user_id: str = None, is_profile_picture: bool = False):
     """
     Uploading an image file and linking it to a user if needed
     """
-    print(f"Starting image upload for user_id: {user_id}, is_profile_picture: {is_profile_picture}")
-    
     # Making sure we're only accepting image files
     content_type = file.content_type
-    print(f"File content type: {content_type}")
     if not content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Reading the file contents
-    contents = await file.read()
-    print(f"File size: {len(contents)} bytes")
-    
     # Creating some helpful metadata to keep track of the image
     metadata = {"filename": file.filename, "content_type": content_type}
     if user_id:
@@ -38,39 +66,27 @@ async def upload_image(file: UploadFile = File(...), user_id: str = None, is_pro
         if is_profile_picture:
             metadata["is_profile_picture"] = True
     
-    print(f"Metadata: {metadata}")
-    
     try:
-        # Saving the file info to MongoDB - Using the motor async client directly
-        # First, create a file entry
-        file_doc = {
-            "filename": file.filename,
-            "metadata": metadata,
-            "length": len(contents)
-        }
-        print("Attempting to insert file document...")
-        result = await db.fs.files.insert_one(file_doc)
-        file_id = result.inserted_id
-        print(f"File document inserted with ID: {file_id}")
-        
-        # Then store the file data
-        chunk_doc = {
-            "files_id": file_id,
-            "n": 0,  # Chunk number
-            "data": contents
-        }
-        print("Attempting to insert chunk document...")
-        await db.fs.chunks.insert_one(chunk_doc)
-        print("Chunk document inserted successfully")
+        # Streaming the upload into GridFS chunk by chunk (fs.files + fs.chunks)
+        # (identical bytes already stored are reused instead of stored again)
+        file_id = await save_upload(file, file.filename, metadata, dedupe=True)
+        upload_id = await record_upload(file_id, user_id, file.filename, content_type, bool(user_id and is_profile_picture))
+        logger.info("Image stored", extra={"image_id": str(file_id), "user_id": user_id, "content_type": content_type})
         
         # If this is a profile picture, update the user's profile
         if user_id and is_profile_picture:
-            print(f"Updating user profile with image ID: {file_id}")
-            await db.users.update_one(
+            previous = await db.users.find_one_and_update(
                 {"_id": ObjectId(user_id)},
-                {"$set": {"profile_picture": str(file_id)}}
+                {"$set": {"profile_picture": str(file_id)}},
+                projection={"profile_picture": 1, "email": 1, "accountType": 1, "mentor_name": 1, "fullName": 1}
             )
-            print("User profile updated successfully")
+
+            # The old picture is no longer used by this user
+            old_id = previous.get("profile_picture") if previous else None
+            if old_id and ObjectId.is_valid(old_id):
+                await release_replaced_picture(user_id, ObjectId(old_id), upload_id)
+            if previous:
+                await response_cache.invalidate(*user_tags(previous))
         
         return {
             "image_id": str(file_id),
@@ -78,7 +94,7 @@ async def upload_image(file: UploadFile = File(...), user_id: str = None, is_pro
             "content_type": content_type
         }
     except Exception as e:
-        print(f"Error during image upload: {str(e)}")
+        logger.exception("Image upload failed", extra={"user_id": user_id})
         raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
 
 @router.post("/profile-picture/{user_id}")
@@ -96,81 +112,219 @@ async def get_user_images(user_id: str):
     Finding all images that belong to a specific user
     """
     try:
-        # Looking for all images linked to this user
-        cursor = db.fs.files.find({"metadata.user_id": user_id})
+        # Looking for all uploads by this user (identical images share one
+        # stored copy, so fs.files metadata only names whoever uploaded it first)
+        cursor = uploads_collection.find({"user_id": user_id}).sort("uploaded_at", 1)
         
         # Building a list of all the images we find
         images = []
         async for doc in cursor:
             images.append({
-                "image_id": str(doc["_id"]),
+                "image_id": str(doc["file_id"]),
                 "filename": doc["filename"],
-                "content_type": doc.get("metadata", {}).get("content_type", "image/jpeg")
+                "content_type": doc.get("content_type") or "image/jpeg"
             })
         
         return images
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing images: {str(e)}")
 
+# Image IDs are never reused and stored images are never modified, so browsers
+# can keep them forever and revalidate with just an fs.files lookup
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def cache_headers(file_data):
+    """Validators built from the fs.files document alone (no chunk reads)"""
+    content_hash = file_data.get("metadata", {}).get("sha256")
+    # older uploads have no stored hash; their immutable id works as a validator too
+    etag = f'"{content_hash or file_data["_id"]}"'
+    uploaded_at = file_data.get("uploadDate") or file_data["_id"].generation_time
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(uploaded_at.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+# All cache_headers() needs from an fs.files document
+VALIDATOR_FIELDS = {"metadata.sha256": 1, "uploadDate": 1}
+
+def is_conditional(request: Request):
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def is_not_modified(request: Request, headers):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(range_header: str, length: int):
+    """
+    Parse a single "bytes=start-end" range into inclusive (start, end).
+    Returns None when the whole file should be sent (multi-range requests are
+    allowed to be answered that way) and raises 416 when it can't be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            # suffix range: the last N bytes
+            start, end = max(length - int(last), 0), length - 1
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None  # e.g. bytes=5-3 is invalid, not unsatisfiable: ignore the header
+            end = min(int(last), length - 1) if last else length - 1
+    except ValueError:
+        return None
+    if start >= length or start > end or length == 0:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, end
+
+async def load_image(obj_id: ObjectId):
+    """Cache loader: the fs.files document, plus the bytes if the image is small enough to keep"""
+    file_data = await db.fs.files.find_one({"_id": obj_id})
+    if not file_data:
+        return None
+    if file_data.get("length", 0) > image_cache.max_item_bytes:
+        return CachedImage(file_data, None)
+    data = b"".join([chunk async for chunk in iter_chunks(file_data)])
+    return CachedImage(file_data, data)
+
 @router.get("/{image_id}")
-async def get_image(image_id: str):
+async def get_image(image_id: str, request: Request, w: Optional[int] = Query(None, ge=1)):
     """
-    Grabbing an image by its ID so we can display it
+    Grabbing an image by its ID so we can display it.
+    Pass ?w= to get a resized copy (e.g. ?w=128 for avatars) instead of the original.
     """
-    print(f"Attempting to retrieve image with ID: {image_id}")
+    logger.debug("Image requested", extra={"image_id": image_id, "width": w})
     try:
         # Convert the string ID to ObjectId
         obj_id = ObjectId(image_id)
-        print(f"Valid ObjectId: {obj_id}")
         
-        # Looking up the file info using Motor's async methods
-        file_data = await db.fs.files.find_one({"_id": obj_id})
-        print(f"File data found: {file_data is not None}")
+        if w is None:
+            cache_key = str(obj_id)
+            loader = lambda: load_image(obj_id)
+            file_query = {"_id": obj_id}
+        else:
+            # resized variants are generated once, on first request, then stored
+            size = pick_size(w)
+            fmt = pick_format(request.headers.get("accept"))
+            cache_key = variant_key(str(obj_id), size, fmt)
+            loader = lambda: load_variant(obj_id, size, fmt)
+            file_query = {"metadata.variant_of": obj_id, "metadata.size": size, "metadata.format": fmt}
+
+        image = image_cache.get(cache_key)
+        if image is None and is_conditional(request):
+            # Not cached: check the browser's copy against the fs.files document
+            # before any chunks are read, most revalidations end here with a 304
+            file_data = await db.fs.files.find_one(file_query, VALIDATOR_FIELDS)
+            if file_data is not None:
+                headers = cache_headers(file_data)
+                if w is not None:
+                    headers["Vary"] = "Accept"
+                if is_not_modified(request, headers):
+                    return Response(status_code=304, headers=headers)
+
+        # Looking up the file info (and the bytes, for small images) through the cache
+        if image is None:
+            image = await image_cache.get_or_load(cache_key, loader)
         
-        if not file_data:
-            print(f"No file found with ID: {image_id}")
+        if image is None:
             raise HTTPException(status_code=404, detail="Image not found")
+        file_data = image.file_data
         
-        # Getting the actual image data
-        chunk = await db.fs.chunks.find_one({"files_id": obj_id})
-        print(f"Chunk data found: {chunk is not None}")
-        
-        if not chunk:
-            print(f"No chunk found for file ID: {image_id}")
-            raise HTTPException(status_code=404, detail="Image data not found")
+        # The browser already has this exact image
+        headers = cache_headers(file_data)
+        if w is not None:
+            headers["Vary"] = "Accept"  # WebP or JPEG depending on the browser
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
         
         # Figuring out what type of image it is
         content_type = file_data.get("metadata", {}).get("content_type", "image/jpeg")
-        print(f"Content type: {content_type}")
         
-        # Sending the image back as a stream
+        # Byte-range request (only honoured if the If-Range validator still matches)
+        length = file_data.get("length", 0)
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        byte_range = None
+        if range_header and (if_range is None or if_range == headers["ETag"]):
+            byte_range = parse_range(range_header, length)
+
+        status_code = 200
+        start, end = 0, length - 1
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+
+        # Cached images are answered straight from memory
+        if image.data is not None:
+            return Response(
+                content=image.data[start:end + 1],
+                status_code=status_code,
+                media_type=content_type,
+                headers=headers
+            )
+
+        # Sending the image back chunk by chunk as it's read from MongoDB
+        headers["Content-Length"] = str(max(end - start + 1, 0))
         return StreamingResponse(
-            io.BytesIO(chunk["data"]),
-            media_type=content_type
+            iter_chunks(file_data, start, end),
+            status_code=status_code,
+            media_type=content_type,
+            headers=headers
         )
+    except HTTPException:
+        raise
     except ValueError as e:
-        print(f"Invalid ObjectId format: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid image ID format: {str(e)}")
     except Exception as e:
-        print(f"Error retrieving image: {str(e)}")
+        logger.exception("Error retrieving image", extra={"image_id": image_id})
         raise HTTPException(status_code=500, detail=f"Error retrieving image: {str(e)}")
 
 @router.delete("/{image_id}")
-async def delete_image(image_id: str):
+async def delete_image(image_id: str, user_id: Optional[str] = None):
     """
-    Getting rid of an image we don't need anymore
+    Getting rid of an image we don't need anymore.
+    Identical uploads share one stored copy, so this removes one upload of it
+    (user_id's, if given) and only removes the data once nothing else references it.
     """
     try:
         # Converting string ID to ObjectId
         obj_id = ObjectId(image_id)
         
-        # Cleaning up both the file info and the actual data
-        delete_file_result = await db.fs.files.delete_one({"_id": obj_id})
-        delete_chunks_result = await db.fs.chunks.delete_many({"files_id": obj_id})
-        
-        if delete_file_result.deleted_count == 0:
+        if not await db.fs.files.find_one({"_id": obj_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Image not found")
+
+        upload_query = {"file_id": obj_id}
+        if user_id is not None:
+            upload_query["user_id"] = user_id
+        removed = await uploads_collection.find_one_and_delete(upload_query, projection={"_id": 1})
+        # images stored before upload records existed have none to remove;
+        # if there are records but none of them is user_id's, it isn't theirs to delete
+        if removed is None and await uploads_collection.find_one({"file_id": obj_id}, {"_id": 1}):
             raise HTTPException(status_code=404, detail="Image not found")
+
+        await release_image_reference(obj_id)
             
         return {"message": "Image deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting image: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error deleting image: {str(e)}")
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import sys
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from database import db
+
+logger = logging.getLogger(__name__)
+# Every index the app relies on, by collection
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),  # login/signup, get_profile
+        IndexModel([("mentor_name", ASCENDING)], name="mentor_name"),          # group members, point updates
+        IndexModel([("fullName", ASCENDING)], name="fullName"),                # mentor point updates
+        IndexModel([("accountType", ASCENDING), ("points", DESCENDING)], name="accountType_points"),  # get_by_role, leaderboard
+    ],
+    "bucket_lists": [
+        IndexModel([("mentor_name", ASCENDING)], name="mentor_name"),
+        IndexModel([("mentor_name", ASCENDING), ("_id", ASCENDING)], name="mentor_name_id"),  # batch pages
+        IndexModel([("completion_ratio", DESCENDING), ("mentor_name", ASCENDING)], name="completion_ratio_mentor_name"),  # by-completion
+    ],
+    "revoked_tokens": [
+        # drop revocations once the token would have expired anyway
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    "profile_reports": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),  # newest reports first
+    ],
+    "image_ingestion_jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),  # workers claiming jobs
+    ],
+    "points_events": [
+        # one award per task toggle, so a retried toggle can't award twice
+        IndexModel([("key", ASCENDING)], unique=True, partialFilterExpression={"key": {"$exists": True}}, name="key_unique"),
+    ],
+    "points_snapshots": [
+        IndexModel([("as_of", ASCENDING), ("user_id", ASCENDING)], unique=True, name="as_of_user_id"),
+    ],
+    "image_uploads": [
+        IndexModel([("user_id", ASCENDING), ("uploaded_at", ASCENDING)], name="user_id_uploaded_at"),  # get_user_images
+        IndexModel([("file_id", ASCENDING)], name="file_id"),  # deletes, replaced profile pictures
+        # one record per ingestion job, however often the job runs
+        IndexModel([("job_id", ASCENDING)], unique=True, partialFilterExpression={"job_id": {"$exists": True}}, name="job_id_unique"),
+    ],
+    "fs.files": [
+        IndexModel([("metadata.user_id", ASCENDING)], name="metadata_user_id"),
+        # content-addressed uploads: one stored copy per SHA-256
+        IndexModel(
+            [("metadata.content_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"metadata.content_key": {"$exists": True}},
+            name="metadata_content_key",
+        ),
+        # one stored copy per resized variant of an image
+        IndexModel(
+            [("metadata.variant_of", ASCENDING), ("metadata.size", ASCENDING), ("metadata.format", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"metadata.variant_of": {"$exists": True}},
+            name="metadata_variant",
+        ),
+    ],
+    "fs.chunks": [
+        IndexModel([("files_id", ASCENDING), ("n", ASCENDING)], unique=True, name="files_id_n"),
+    ],
+}
+
+# The hot-path queries that should always be served by an index.
+# (collection, filter, sort, where it's used)
+REGISTERED_QUERIES = [
+    ("users", {"email": "someone@example.com"}, None, "auth login/signup, get_profile"),
+    ("users", {"mentor_name": "Mentor"}, None, "group members, point updates"),
+    ("users", {"fullName": "Mentor"}, None, "mentor point updates"),
+    ("users", {"accountType": "Mentor"}, None, "get_by_role, leaderboard"),
+    ("bucket_lists", {"mentor_name": "Mentor"}, None, "bucket list reads and task updates"),
+    ("bucket_lists", {"$or": [{"mentor_name": {"$gt": "Mentor"}}, {"mentor_name": "Mentor", "_id": {"$gt": ""}}]},
+     [("mentor_name", ASCENDING), ("_id", ASCENDING)], "bucket list batch pages"),
+    ("bucket_lists", {}, [("completion_ratio", DESCENDING), ("mentor_name", ASCENDING)], "bucket lists by completion"),
+    ("image_ingestion_jobs", {"status": {"$in": ["queued", "processing"]}, "run_at": {"$lte": datetime.now(timezone.utc)}}, [("run_at", ASCENDING)], "image ingestion workers"),
+    ("image_uploads", {"user_id": "user"}, [("uploaded_at", ASCENDING)], "get_user_images"),
+    ("image_uploads", {"file_id": ObjectId()}, None, "image deletes, replaced profile pictures"),
+    ("image_uploads", {"job_id": ObjectId()}, None, "image ingestion upload records"),
+    ("points_events", {"key": "task:Mentor:id:1"}, None, "task point awards"),
+    ("fs.chunks", {"files_id": ObjectId()}, [("n", ASCENDING)], "get_image"),
+    ("fs.files", {"metadata.content_key": "0" * 64}, None, "upload deduplication"),
+    ("fs.files", {"metadata.variant_of": ObjectId(), "metadata.size": 128, "metadata.format": "webp"}, None, "resized image variants"),
+]
+
+async def ensure_indexes():
+    """
+    Create any missing indexes. Safe to run on every startup.
+    Returns the names of the ones that could not be created.
+    """
+    failed = []
+    for collection_name, models in INDEXES.items():
+        # one at a time, so a failing index doesn't hold back the others
+        for model in models:
+            try:
+                await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # e.g. duplicate emails already in the data block the unique index;
+                # keep starting up but make it loud
+                name = model.document["name"]
+                logger.error("Could not create index %s on %s: %s", name, collection_name, e)
+                failed.append(f"{collection_name}.{name}")
+    return failed
+
+def _plan_stages(plan):
+    # walk an explain() plan tree and yield every stage name in it
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+async def find_collection_scans():
+    """Explain every registered query and return the ones that still do a COLLSCAN."""
+    problems = []
+    for collection_name, query, sort, used_by in REGISTERED_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in set(_plan_stages(winning_plan)):
+            problems.append({
+                "collection": collection_name,
+                "filter": str(query),
+                "used_by": used_by,
+            })
+    return problems
+
+async def main():
+    if "--check-only" not in sys.argv:
+        failed = await ensure_indexes()
+        if failed:
+            print(f"Could not create {len(failed)} indexes: {', '.join(failed)}")
+
+    problems = await find_collection_scans()
+    if not problems:
+        print(f"All {len(REGISTERED_QUERIES)} registered queries use an index")
+        return 0
+
+    print(f"{len(problems)} registered queries still do a COLLSCAN:")
+    for problem in problems:
+        print(f"  {problem['collection']} {problem['filter']}  ({problem['used_by']})")
+    return 1
+
+if __name__ == "__main__":
+    # Usage: python indexes.py [--check-only]
+    sys.exit(asyncio.run(main()))
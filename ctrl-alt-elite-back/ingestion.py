@@ -0,0 +1,360 @@
+# Background upload of profile pictures sent to PUT /profile/image. The handler
+# stages the image in GridFS and queues a job in image_ingestion_jobs; workers
+# push it to IMAGE_UPLOADER ("cloudinary", "local" or "fake") with retries and a
+# circuit breaker. If the remote upload keeps failing, the staged copy becomes
+# the picture (/images/<id>).
+
+import asyncio
+import io
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from database import db
+from image_storage import fs_bucket, image_id_from_url, record_upload
+from images import release_image_reference, release_replaced_picture
+from cache import response_cache, user_tags
+from cloudinary_config import cloudinary
+import cloudinary.uploader
+
+jobs_collection = db["image_ingestion_jobs"]
+
+logger = logging.getLogger(__name__)
+INGEST_WORKERS = int(os.getenv("IMAGE_INGEST_WORKERS", "2"))
+UPLOAD_TIMEOUT_SECONDS = float(os.getenv("IMAGE_UPLOAD_TIMEOUT_SECONDS", "30"))
+MAX_ATTEMPTS = int(os.getenv("IMAGE_INGEST_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("IMAGE_INGEST_BACKOFF_SECONDS", "2"))
+BACKOFF_MAX_SECONDS = 300
+# A job being processed is reclaimed by another worker after this long
+LEASE_SECONDS = UPLOAD_TIMEOUT_SECONDS + 30
+# How often idle workers look for jobs queued by other processes
+POLL_SECONDS = 1.0
+
+# Circuit breaker: after this many failures in a row stop calling the uploader
+# for BREAKER_RESET_SECONDS, then let one trial upload through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("IMAGE_UPLOAD_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("IMAGE_UPLOAD_BREAKER_RESET_SECONDS", "30"))
+
+# Job statuses
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+def local_url(file_id):
+    return f"/images/{file_id}"
+
+class CloudinaryUploader:
+    name = "cloudinary"
+
+    def __init__(self):
+        # the SDK is blocking, so it gets its own small thread pool
+        self._executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="cloudinary")
+
+    async def upload(self, file_id, data: bytes, content_type: str):
+        loop = asyncio.get_running_loop()
+        # (a timed-out upload keeps its thread until the SDK gives up on its own)
+        result = await loop.run_in_executor(
+            self._executor,
+            lambda: cloudinary.uploader.upload(io.BytesIO(data), resource_type="auto")
+        )
+        return result["secure_url"]
+
+class LocalUploader:
+    """No remote copy: the GridFS staging file is the picture"""
+    name = "local"
+
+    async def upload(self, file_id, data: bytes, content_type: str):
+        return local_url(file_id)
+
+class FakeUploader:
+    """Stand-in for the remote service with configurable latency and failure rate"""
+    name = "fake"
+
+    def __init__(self, latency=None, failure_rate=None):
+        self.latency = latency if latency is not None else float(os.getenv("IMAGE_FAKE_UPLOAD_LATENCY_SECONDS", "0.2"))
+        self.failure_rate = failure_rate if failure_rate is not None else float(os.getenv("IMAGE_FAKE_UPLOAD_FAILURE_RATE", "0"))
+
+    async def upload(self, file_id, data: bytes, content_type: str):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("fake upload failed")
+        return f"https://images.example.invalid/{file_id}"
+
+def cloudinary_configured():
+    config = cloudinary.config()
+    return bool(config.cloud_name and config.api_key and config.api_secret and config.cloud_name != "your_cloud_name")
+
+def create_uploader():
+    choice = os.getenv("IMAGE_UPLOADER") or ("cloudinary" if cloudinary_configured() else "local")
+    if choice == "fake":
+        return FakeUploader()
+    if choice == "cloudinary":
+        return CloudinaryUploader()
+    return LocalUploader()
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def retry_after(self):
+        """Seconds until calls are allowed again (0 if they are now)"""
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True  # exactly one trial call while half-open
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()  # (re)open
+        self._trial_running = False
+
+def backoff_seconds(attempts):
+    # exponential with jitter, so retries from many jobs don't line up
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+class IngestionQueue:
+    def __init__(self, uploader=None, workers=INGEST_WORKERS):
+        self.uploader = uploader or create_uploader()
+        self.workers = workers
+        self.breaker = CircuitBreaker()
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self.processed = 0
+        self.failed_attempts = 0
+        self.fallbacks = 0
+
+    async def enqueue(self, email: str, file_id, content_type: str, filename: str = None):
+        now = datetime.now(timezone.utc)
+        result = await jobs_collection.insert_one({
+            "email": email,
+            "file_id": file_id,
+            "content_type": content_type,
+            "filename": filename,
+            "status": QUEUED,
+            "attempts": 0,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+        })
+        self._wakeup.set()
+        return result.inserted_id
+
+    async def _claim(self):
+        now = datetime.now(timezone.utc)
+        return await jobs_collection.find_one_and_update(
+            # for a PROCESSING job run_at is the lease: past it, the worker died mid-job
+            {"status": {"$in": [QUEUED, PROCESSING]}, "run_at": {"$lte": now}},
+            {"$set": {"status": PROCESSING, "run_at": now + timedelta(seconds=LEASE_SECONDS), "updated_at": now}},
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _claim_step(self, job, step):
+        # True only the first time: a job run again after a crash skips the step
+        # (a crash right after claiming leaks a reference instead of freeing one twice)
+        result = await jobs_collection.update_one(
+            {"_id": job["_id"], "steps": {"$ne": step}},
+            {"$addToSet": {"steps": step}}
+        )
+        return result.modified_count > 0
+
+    async def _finish(self, job, url, fallback=False):
+        """
+        Point the user at the new picture and close the job. A job whose lease
+        ran out mid-finish runs this again, so every step is safe to repeat.
+        """
+        projection = {"email": 1, "accountType": 1, "mentor_name": 1, "fullName": 1, "profile_pic": 1}
+        # only the run that actually swaps the picture gets the old one back
+        previous = await db.users.find_one_and_update(
+            {"email": job["email"], "profile_pic": {"$ne": url}},
+            {"$set": {"profile_pic": url}},
+            projection=projection
+        )
+        user = previous or await db.users.find_one({"email": job["email"]}, projection)
+
+        # Until now the pending job held the staging copy's reference
+        if user is not None and image_id_from_url(url) == job["file_id"]:
+            # the staging copy is the picture: an upload record (one per job) takes the reference over
+            upload_id = await record_upload(
+                job["file_id"], job["email"], job.get("filename") or str(job["file_id"]), job["content_type"],
+                is_profile_picture=True, job_id=job["_id"]
+            )
+        else:
+            # the remote copy replaces the staging copy (or there's no user to keep it for)
+            upload_id = None
+            if await self._claim_step(job, "staging_released"):
+                await release_image_reference(job["file_id"])
+
+        if previous is not None:
+            # the old picture is no longer used by this user (even if it is the same stored copy,
+            # the new upload brought its own reference)
+            old_id = image_id_from_url(previous.get("profile_pic"))
+            if old_id:
+                await release_replaced_picture(job["email"], old_id, upload_id)
+        if user is not None:
+            await response_cache.invalidate(*user_tags(user))
+
+        await jobs_collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {
+                "status": DONE if user is not None else FAILED,
+                "profile_pic": url,
+                "fallback": fallback,
+                "error": None if user is not None else "User not found",
+                "updated_at": datetime.now(timezone.utc),
+            }}
+        )
+        self.processed += 1
+
+    async def _retry(self, job, error, attempts, delay):
+        await jobs_collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {
+                "status": QUEUED,
+                "attempts": attempts,
+                "error": error,
+                "run_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+                "updated_at": datetime.now(timezone.utc),
+            }}
+        )
+
+    async def _wait_for_breaker(self, job):
+        # uploader is known to be down: requeue for when the breaker lets calls
+        # through again, without using up an attempt
+        await self._retry(job, job.get("error"), job["attempts"], self.breaker.retry_after() + 1)
+
+    async def process(self, job):
+        if self.breaker.state == "open":
+            await self._wait_for_breaker(job)
+            return
+
+        attempts = job["attempts"] + 1
+        try:
+            stream = await fs_bucket.open_download_stream(job["file_id"])
+            data = await stream.read()
+        except NoFile:
+            # nothing left to upload, retrying won't help
+            await jobs_collection.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": FAILED, "attempts": attempts, "error": "Staged image is gone", "updated_at": datetime.now(timezone.utc)}}
+            )
+            return
+
+        if not self.breaker.allow():
+            await self._wait_for_breaker(job)
+            return
+
+        try:
+            url = await asyncio.wait_for(
+                self.uploader.upload(job["file_id"], data, job["content_type"]),
+                UPLOAD_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            self.breaker.record_failure()
+            self.failed_attempts += 1
+            error = "Upload timed out" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            logger.warning(
+                "Image upload attempt failed",
+                extra={"job_id": str(job["_id"]), "attempt": attempts, "error": error, "breaker": self.breaker.state}
+            )
+            if attempts >= MAX_ATTEMPTS:
+                # give up on the remote copy, the staged one becomes the picture
+                self.fallbacks += 1
+                await self._finish(job, local_url(job["file_id"]), fallback=True)
+            else:
+                await self._retry(job, error, attempts, backoff_seconds(attempts))
+            return
+
+        self.breaker.record_success()
+        await jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"attempts": attempts}})
+        await self._finish(job, url)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.warning("Image ingestion worker could not claim a job: %r", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(job)
+            except Exception:
+                # leave it to the lease to hand the job out again
+                logger.exception("Image ingestion job crashed", extra={"job_id": str(job["_id"])})
+
+    def start(self):
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {
+            "uploader": self.uploader.name,
+            "workers": len(self._tasks),
+            "breaker": self.breaker.state,
+            "processed": self.processed,
+            "failed_attempts": self.failed_attempts,
+            "fallbacks": self.fallbacks,
+        }
+
+async def job_status(job_id):
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await jobs_collection.find_one({"_id": ObjectId(job_id)})
+    if job is None:
+        return None
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "profile_pic": job.get("profile_pic"),
+        "fallback": job.get("fallback", False),
+        "error": job.get("error"),
+    }
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,151 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import defaultdict
+from fastapi import APIRouter, HTTPException, Query
+from database import db
+
+leaderboard_router = APIRouter()
+users_collection = db["users"]
+
+# How long the in-memory ranking is trusted before it is reloaded from MongoDB.
+# Writes made through this process are applied immediately; the reload picks up
+# changes made by other workers or by the maintenance scripts.
+RESYNC_SECONDS = float(os.getenv("LEADERBOARD_RESYNC_SECONDS", "60"))
+
+
+class Leaderboard:
+    """
+    Mentor groups ranked by points.
+
+    Entries are kept in a list sorted by (-points, mentor_name, mentor_id), so
+    rank lookups are a binary search instead of a full collection scan and
+    sort. Updating one mentor's points is a binary search plus a list
+    insert/delete, which shifts the entries after it (O(n), but a memmove of
+    pointers, cheap at the few thousand mentors a cohort has).
+
+    Mentors are keyed by _id: two mentors may share a fullName.
+    """
+
+    def __init__(self):
+        self._entries = []     # sorted (-points, mentor_name, mentor_id)
+        self._mentors = {}     # mentor_id -> (points, mentor_name)
+        self._ids_by_name = defaultdict(set)  # mentor_name -> mentor_ids
+        self._loaded_at = None
+        self._loads = 0     # how many full reloads have been applied
+        self._lock = asyncio.Lock()
+        # one per mentor name: a sync's read and apply happen under it, so an
+        # older read of the same mentor can never be applied after a newer one
+        self._sync_locks = defaultdict(asyncio.Lock)
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < RESYNC_SECONDS
+
+    async def ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            mentors = {}
+            ids_by_name = defaultdict(set)
+            cursor = users_collection.find({"accountType": "Mentor"}, {"fullName": 1, "points": 1})
+            async for doc in cursor:
+                mentor_id = str(doc["_id"])
+                mentors[mentor_id] = (doc.get("points", 0), doc["fullName"])
+                ids_by_name[doc["fullName"]].add(mentor_id)
+            self._mentors = mentors
+            self._ids_by_name = ids_by_name
+            self._entries = sorted((-points, name, mentor_id) for mentor_id, (points, name) in mentors.items())
+            self._loaded_at = time.monotonic()
+            self._loads += 1
+
+    def _remove(self, mentor_id):
+        old = self._mentors.pop(mentor_id, None)
+        if old is not None:
+            points, name = old
+            index = bisect.bisect_left(self._entries, (-points, name, mentor_id))
+            del self._entries[index]
+            self._ids_by_name[name].discard(mentor_id)
+            if not self._ids_by_name[name]:
+                del self._ids_by_name[name]
+
+    def _set(self, mentor_id, mentor_name, points):
+        self._remove(mentor_id)
+        self._mentors[mentor_id] = (points, mentor_name)
+        self._ids_by_name[mentor_name].add(mentor_id)
+        bisect.insort(self._entries, (-points, mentor_name, mentor_id))
+
+    async def sync(self, mentor_name):
+        """
+        Re-read the points of the mentor(s) with this name after a write changed
+        them. Returns the points if cached and the name is unambiguous.
+        """
+        if self._loaded_at is None:
+            return None  # nothing cached yet, the first read will load everything
+        async with self._sync_locks[mentor_name]:
+            while True:
+                loads = self._loads
+                docs = await users_collection.find(
+                    {"fullName": mentor_name, "accountType": "Mentor"},
+                    {"fullName": 1, "points": 1}
+                ).to_list(length=None)
+                async with self._lock:
+                    # a reload that finished meanwhile may have read a newer value: read again
+                    if self._loads != loads:
+                        continue
+                    current = {str(doc["_id"]): doc.get("points", 0) for doc in docs}
+                    for mentor_id in self._ids_by_name.get(mentor_name, set()) - current.keys():
+                        self._remove(mentor_id)  # renamed, deleted or no longer a mentor
+                    for mentor_id, points in current.items():
+                        self._set(mentor_id, mentor_name, points)
+                    if len(current) != 1:
+                        return None
+                    return next(iter(current.values()))
+
+    def _rank_of(self, points):
+        # competition ranking: groups with equal points share a rank
+        return bisect.bisect_left(self._entries, (-points,)) + 1
+
+    async def page(self, offset, limit):
+        await self.ensure_loaded()
+        return [
+            {"rank": self._rank_of(-neg_points), "mentor_name": name, "mentor_id": mentor_id, "points": -neg_points}
+            for neg_points, name, mentor_id in self._entries[offset:offset + limit]
+        ]
+
+    async def rank(self, mentor_name):
+        """The best-placed mentor with this name"""
+        await self.ensure_loaded()
+        ids = self._ids_by_name.get(mentor_name)
+        if not ids:
+            return None
+        points, mentor_id = max((self._mentors[mentor_id][0], mentor_id) for mentor_id in ids)
+        return {"rank": self._rank_of(points), "mentor_name": mentor_name, "mentor_id": mentor_id, "points": points}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+leaderboard = Leaderboard()
+
+
+# TOP N / PAGINATED LEADERBOARD
+@leaderboard_router.get("")
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    entries = await leaderboard.page(offset, limit)
+    return {"total": len(leaderboard), "offset": offset, "limit": limit, "entries": entries}
+
+
+# RANK OF A SINGLE GROUP (pass your own mentor_name to get "my rank")
+@leaderboard_router.get("/rank/{mentor_name}")
+async def get_rank(mentor_name: str):
+    entry = await leaderboard.rank(mentor_name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Mentor not found on leaderboard")
+    entry["total"] = len(leaderboard)
+    return entry
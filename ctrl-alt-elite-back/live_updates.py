@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+live_router = APIRouter()
+
+# Messages buffered per connection before it counts as too slow to keep up
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_UPDATES_QUEUE_SIZE", "64"))
+# Comment line sent on idle connections so proxies don't close them
+HEARTBEAT_SECONDS = float(os.getenv("LIVE_UPDATES_HEARTBEAT_SECONDS", "15"))
+
+# Sent instead of the backlog to a subscriber that fell behind: refetch everything
+RESYNC_MESSAGE = b"event: resync\ndata: {}\n\n"
+
+class Subscriber:
+    def __init__(self, mentor_names: Optional[set]):
+        self.mentor_names = mentor_names  # None = every group
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.resyncs = 0
+
+    def wants(self, mentor_name: Optional[str]):
+        return self.mentor_names is None or mentor_name is None or mentor_name in self.mentor_names
+
+class EventBroker:
+    """
+    In-process pub/sub feeding the /events/stream SSE endpoint.
+
+    Publishing never waits on subscribers: each connection has a small bounded
+    queue, and one that fills up (slow client) has its backlog replaced by a
+    single "resync" event. An idle connection is just a parked coroutine, so a
+    worker can hold thousands of them.
+
+    Only clients connected to the same worker process see its events.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self.published = 0
+
+    def subscribe(self, mentor_names: Optional[set] = None):
+        subscriber = Subscriber(mentor_names)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: dict, mentor_name: Optional[str] = None):
+        if not self._subscribers:
+            return
+        # encode once, shared by every subscriber
+        message = f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode()
+        self.published += 1
+        for subscriber in self._subscribers:
+            if not subscriber.wants(mentor_name):
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(RESYNC_MESSAGE)
+                subscriber.resyncs += 1
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "resyncs": sum(subscriber.resyncs for subscriber in self._subscribers),
+        }
+
+broker = EventBroker()
+
+# LIVE BUCKET-LIST AND POINTS UPDATES (Server-Sent Events)
+# events: task_added, task_toggled, task_deleted, points_changed, resync
+@live_router.get("/stream")
+async def stream_events(mentor_name: Optional[List[str]] = Query(None)):
+    subscriber = broker.subscribe(set(mentor_name) if mentor_name else None)
+
+    async def event_stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    message = b": keep-alive\n\n"
+                yield message
+        finally:
+            # runs when the client disconnects
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
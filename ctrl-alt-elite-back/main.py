@@ -1,3 +1,13 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from logging_config import configure_logging, shutdown_logging, RequestContextMiddleware
+
+# before the other imports, so anything they log at import time is structured too
+configure_logging()
+logger = logging.getLogger("main")
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from auth import auth_router
@@ -5,9 +15,63 @@ from user_profile import profile_router
 from group import group_router
 from bucket_list import bucketlist_router
 from images import router as images_router
-from database import db, check_storage_metrics
+from leaderboard import leaderboard_router
+from live_updates import live_router, broker
+from pymongo.errors import PyMongoError
+from database import check_storage_metrics, ping_database, close_database, db_metrics
+from indexes import ensure_indexes, find_collection_scans
+from image_cache import image_cache
+from cache import response_cache
+from ingestion import ingestion_queue
+from server_timing import PROFILING_ENABLED
+from profiling import ProfilingMiddleware, profiling_router, install_timing_hooks
+
+# Set once ensure_indexes has run; /health/ready reports 503 until then
+database_prepared = asyncio.Event()
+PREPARE_RETRY_MAX_SECONDS = 60
+
+async def prepare_database(timeout=10):
+    """Create indexes once MongoDB answers. True if that happened."""
+    if not await ping_database(timeout=timeout):
+        return False
+    try:
+        await ensure_indexes()
+    except PyMongoError as e:
+        logger.warning("Could not create indexes: %r", e)  # lost the connection halfway: try again
+        return False
+    database_prepared.set()
 
-app = FastAPI()
+    # Optional query-plan self-check (set CHECK_QUERY_PLANS=1), same report as `python indexes.py`
+    if os.getenv("CHECK_QUERY_PLANS"):
+        for problem in await find_collection_scans():
+            logger.warning("COLLSCAN: %s %s (%s)", problem["collection"], problem["filter"], problem["used_by"])
+    return True
+
+async def keep_preparing_database():
+    # back off up to PREPARE_RETRY_MAX_SECONDS between attempts
+    delay = 1
+    while not await prepare_database(timeout=5):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, PREPARE_RETRY_MAX_SECONDS)
+    logger.info("MongoDB is back, indexes are in place")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: make sure MongoDB is reachable before preparing it
+    retry_task = None
+    if not await prepare_database():
+        logger.error("MongoDB is unreachable, starting anyway; /health/ready reports 503 until indexes are created")
+        retry_task = asyncio.create_task(keep_preparing_database())
+    ingestion_queue.start()
+    yield
+    # Shutdown
+    if retry_task is not None:
+        retry_task.cancel()
+    await ingestion_queue.stop()
+    close_database()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,6 +82,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Server-Timing and cProfile captures, only when PROFILING_ENABLED is set
+# (otherwise nothing is added to the request path)
+if PROFILING_ENABLED:
+    install_timing_hooks()
+    app.add_middleware(ProfilingMiddleware)
+
+# Request ids + access log; added last so it wraps everything else
+app.add_middleware(RequestContextMiddleware)
+
+# Liveness: the process is up
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+# Readiness: the process can reach MongoDB and has created its indexes (point load balancers here)
+@app.get("/health/ready")
+async def readiness():
+    if not database_prepared.is_set():
+        raise HTTPException(status_code=503, detail="Database not prepared yet")
+    if not await ping_database():
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
 @app.get("/metrics/storage")
 async def get_storage_metrics():
     metrics = await check_storage_metrics()
@@ -25,9 +112,32 @@ async def get_storage_metrics():
         raise HTTPException(status_code=500, detail="Failed to fetch storage metrics")
     return metrics
 
+@app.get("/metrics/db")
+async def get_db_metrics():
+    return db_metrics()
+
+@app.get("/metrics/image-cache")
+async def get_image_cache_metrics():
+    return image_cache.stats()
+
+@app.get("/metrics/cache")
+async def get_cache_metrics():
+    return response_cache.stats()
+
+@app.get("/metrics/image-ingestion")
+async def get_image_ingestion_metrics():
+    return ingestion_queue.stats()
+
+@app.get("/metrics/live-updates")
+async def get_live_update_metrics():
+    return broker.stats()
+
 # routers for authentication (login/sign up), profile updates/viewing
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(profile_router, prefix="/profile", tags=["profile"])
 app.include_router(group_router, prefix="/group", tags=["group"])
 app.include_router(bucketlist_router, prefix="/bucketlist", tags=["bucketlist"])
+app.include_router(leaderboard_router, prefix="/leaderboard", tags=["leaderboard"])
+app.include_router(live_router, prefix="/events", tags=["events"])
+app.include_router(profiling_router, prefix="/admin/profiles", tags=["admin"])
 app.include_router(images_router) # Image handling routes
\ No newline at end of file
@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import inspect
+import time
+from database import db
+
+checkpoints_collection = db["migration_checkpoints"]
+
+class MigrationRunner:
+    """
+    Streams a collection in _id order, turns each document into write operations
+    (UpdateOne, DeleteOne, ...) and applies them with bulk_write.
+
+    - memory stays flat: the cursor is read in batches and at most `concurrency`
+      batches of writes are in flight at once
+    - progress is checkpointed by _id in migration_checkpoints, so an interrupted
+      run picks up where it stopped; the checkpoint is removed once a run finishes
+    - throughput (docs/sec) is printed as it goes
+
+    Writes go to the scanned collection unless another `target` is given.
+    """
+
+    def __init__(self, name, collection, query=None, projection=None,
+                 batch_size=500, concurrency=4, dry_run=False, target=None):
+        self.name = name
+        self.collection = collection
+        self.target = target if target is not None else collection
+        self.query = query or {}
+        self.projection = projection
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+
+        self.scanned = 0
+        self.written = 0
+        self.missed = 0  # conditional writes whose filter no longer matched
+        self._slots = asyncio.Semaphore(concurrency)
+        self._in_flight = set()
+        self._batches = []      # [sequence, last_id, done] for batches not yet checkpointed
+        self._next_sequence = 0
+        self._checkpoint_lock = asyncio.Lock()
+        self._checkpointed_sequence = -1
+        self._started = None
+        self._error = None
+
+    async def _load_checkpoint(self):
+        checkpoint = await checkpoints_collection.find_one({"_id": self.name})
+        return checkpoint["last_id"] if checkpoint else None
+
+    async def _save_checkpoint(self):
+        # advance over the contiguous run of finished batches only, since
+        # batches can finish out of order
+        async with self._checkpoint_lock:
+            last = None
+            while self._batches and self._batches[0][2]:
+                last = self._batches.pop(0)
+            if last is None or last[0] <= self._checkpointed_sequence:
+                return
+            await checkpoints_collection.update_one(
+                {"_id": self.name},
+                {"$set": {"last_id": last[1], "scanned": self.scanned, "written": self.written}},
+                upsert=True
+            )
+            self._checkpointed_sequence = last[0]
+
+    async def _write(self, batch, operations):
+        try:
+            missed = 0
+            if operations and not self.dry_run:
+                result = await self.target.bulk_write(operations, ordered=False)
+                # the document changed after it was read, so the write was skipped
+                applied = result.matched_count + result.deleted_count + result.inserted_count + result.upserted_count
+                missed = len(operations) - applied
+            self.written += len(operations) - missed
+            self.missed += missed
+            batch[2] = True
+            if not self.dry_run:
+                await self._save_checkpoint()
+        except Exception as e:
+            self._error = e
+            raise
+        finally:
+            self._slots.release()
+
+    async def _flush(self, operations, last_id):
+        await self._slots.acquire()  # backpressure: wait while too many batches are in flight
+        if self._error is not None:
+            self._slots.release()
+            raise self._error  # stop at the first failed batch; the checkpoint is before it
+        batch = [self._next_sequence, last_id, False]
+        self._next_sequence += 1
+        self._batches.append(batch)
+        task = asyncio.create_task(self._write(batch, operations))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        self._report()
+
+    def _report(self, final=False):
+        elapsed = time.perf_counter() - self._started
+        rate = self.scanned / elapsed if elapsed else 0.0
+        if final or self._next_sequence % 10 == 0:
+            print(f"[{self.name}] {self.scanned} docs scanned, {self.written} writes, {rate:.0f} docs/sec")
+
+    async def run(self, transform, resume=True):
+        """
+        Apply transform(doc) -> list of write operations (or a coroutine returning
+        one) to every matching document.
+        """
+        self._started = time.perf_counter()
+        cursor = self.collection.find(self.query, self.projection).sort("_id", 1)
+
+        last_id = await self._load_checkpoint() if resume else None
+        if last_id is not None:
+            print(f"[{self.name}] Resuming after _id {last_id}")
+            # min() works on the _id index bounds, so it also handles collections
+            # mixing _id types (e.g. uuid strings and ObjectIds)
+            cursor = cursor.hint([("_id", 1)]).min([("_id", last_id)])
+
+        operations = []
+        docs_in_batch = 0
+        async for doc in cursor.batch_size(self.batch_size):
+            if doc["_id"] == last_id:
+                continue  # min() is inclusive
+            self.scanned += 1
+            docs_in_batch += 1
+            result = transform(doc)
+            if inspect.isawaitable(result):
+                result = await result
+            operations.extend(result or [])
+
+            if docs_in_batch >= self.batch_size:
+                await self._flush(operations, doc["_id"])
+                operations = []
+                docs_in_batch = 0
+
+        if docs_in_batch:
+            await self._flush(operations, doc["_id"])
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._error is not None:
+            raise self._error  # keep the checkpoint so the next run resumes
+
+        if not self.dry_run:
+            await checkpoints_collection.delete_one({"_id": self.name})
+        self._report(final=True)
+        return {"scanned": self.scanned, "written": self.written, "missed": self.missed}
+
+def runner_arguments(description):
+    """Command-line options shared by the migration scripts"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--dry-run", action="store_true", help="report the changes instead of writing them")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4, help="bulk writes allowed in flight at once")
+    parser.add_argument("--restart", action="store_true", help="ignore any saved checkpoint and start from the beginning")
+    return parser
@@ -39,6 +39,14 @@ class ProfilePicUpdate(BaseModel):
 class ProfileOut(Profile):
     id: str = Field(alias="_id")
 
+class ProfileUpdateOut(ProfileOut):
+    token: Optional[str] = None  # a new access token when the old one's claims went stale
+
+# Group Models
+class GroupOut(BaseModel):
+    mentor: ProfileOut
+    students: List[ProfileOut]
+
 # Bucket List Models
 class Task(BaseModel):
     id: str = None
@@ -0,0 +1,254 @@
+# Append-only ledger of point awards and reversals. Every points change is written
+# to points_events (with the users it went to) before the $inc on users, so
+#     balance = last compacted snapshot + sum of the user's events after it
+# `python points_ledger.py compact` folds the tail into a new snapshot (e.g. from cron),
+# `python points_ledger.py rebuild` repairs users.points from snapshot + tail.
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from database import db
+from migrations import MigrationRunner
+
+events_collection = db["points_events"]
+snapshots_collection = db["points_snapshots"]  # one doc per (generation, user)
+snapshot_state_collection = db["points_snapshot_state"]
+
+# Who an event's points went to. New events list their recipients; these scopes
+# are only used for events recorded before that, resolved by current membership:
+#   "group"   - the mentor (by fullName) and everyone whose mentor_name is the mentor
+#   "members" - only users whose mentor_name is the mentor (group.py update_points)
+SCOPE_GROUP = "group"
+SCOPE_MEMBERS = "members"
+
+# Events younger than this are left in the tail when compacting, so an insert
+# that is still in flight (with a slightly older _id) can't be skipped
+COMPACTION_LAG = timedelta(minutes=1)
+
+def group_recipients_query(mentor_name: str, scope: str = SCOPE_GROUP):
+    members = {"mentor_name": mentor_name}
+    if scope == SCOPE_MEMBERS:
+        return members
+    return {"$or": [{"fullName": mentor_name}, members]}
+
+async def record_points_event(mentor_name: str, delta: int, reason: str, recipients, scope: str = SCOPE_GROUP,
+                              task_id: str = None, key: str = None):
+    """
+    Append one award (positive delta) or reversal (negative delta) to the ledger.
+    recipients are the _ids of the users the $inc goes to, fixed at award time so
+    a rebuild credits the same users even after people join or change groups.
+    key makes the event unique (e.g. one per task toggle); returns False if an
+    event with that key was already recorded.
+    """
+    event = {
+        "mentor_name": mentor_name,
+        "delta": delta,
+        "scope": scope,
+        "recipients": list(recipients),
+        "reason": reason,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if task_id is not None:
+        event["task_id"] = task_id
+    if key is not None:
+        event["key"] = key
+    try:
+        await events_collection.insert_one(event)
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def current_generation():
+    state = await snapshot_state_collection.find_one({"_id": "latest"})
+    return state["as_of"] if state else None
+
+async def tail_totals(after_id, until_id=None):
+    """
+    Sum of event deltas after the snapshot (and before until_id):
+    {"users": {user_id: delta}, "groups": {(mentor_name, scope): delta}}, the
+    latter for events recorded before recipients were.
+    """
+    id_range = {}
+    if after_id is not None:
+        id_range["$gt"] = after_id
+    if until_id is not None:
+        id_range["$lt"] = until_id
+    match = {"_id": id_range} if id_range else {}
+
+    totals = {"users": {}, "groups": {}}
+    async for doc in events_collection.aggregate([
+        {"$match": {**match, "recipients": {"$exists": True}}},
+        {"$unwind": "$recipients"},
+        {"$group": {"_id": "$recipients", "delta": {"$sum": "$delta"}}},
+    ]):
+        totals["users"][doc["_id"]] = doc["delta"]
+    async for doc in events_collection.aggregate([
+        {"$match": {**match, "recipients": {"$exists": False}}},
+        {"$group": {"_id": {"mentor_name": "$mentor_name", "scope": "$scope"}, "delta": {"$sum": "$delta"}}},
+    ]):
+        totals["groups"][(doc["_id"]["mentor_name"], doc["_id"]["scope"])] = doc["delta"]
+    return totals
+
+def user_delta(user, totals):
+    delta = totals["users"].get(user["_id"], 0)
+    groups = totals["groups"]
+    if groups:
+        mentor_name = user.get("mentor_name")
+        delta += groups.get((user.get("fullName"), SCOPE_GROUP), 0)
+        delta += groups.get((mentor_name, SCOPE_GROUP), 0) + groups.get((mentor_name, SCOPE_MEMBERS), 0)
+    return delta
+
+async def snapshot_balances(generation):
+    balances = {}
+    if generation is None:
+        return balances
+    async for doc in snapshots_collection.find({"as_of": generation}, {"user_id": 1, "points": 1}):
+        balances[doc["user_id"]] = doc["points"]
+    return balances
+
+async def acquire_compaction_lock():
+    """Lease so only one init/compact writes snapshot generations at a time"""
+    now = datetime.now(timezone.utc)
+    await snapshot_state_collection.delete_one({"_id": "lock", "expires_at": {"$lt": now}})
+    try:
+        await snapshot_state_collection.insert_one({"_id": "lock", "expires_at": now + timedelta(minutes=30)})
+        return True
+    except DuplicateKeyError:
+        print("Another compaction is running, try again later")
+        return False
+
+async def release_compaction_lock():
+    await snapshot_state_collection.delete_one({"_id": "lock"})
+
+async def write_generation(new_generation, balances_for):
+    """Write a full snapshot generation, then make it the current one"""
+    # drop leftovers from a compaction that died before switching generations
+    # (safe: callers hold the compaction lock)
+    current = await current_generation()
+    await snapshots_collection.delete_many({"as_of": {"$nin": [current]}})
+
+    batch = []
+    async for user in db.users.find({}, {"fullName": 1, "mentor_name": 1, "points": 1}).batch_size(1000):
+        batch.append({"as_of": new_generation, "user_id": user["_id"], "points": balances_for(user)})
+        if len(batch) >= 1000:
+            await snapshots_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await snapshots_collection.insert_many(batch, ordered=False)
+
+    # only switch if the snapshot we started from is still the current one
+    result = await snapshot_state_collection.update_one(
+        {"_id": "latest", "as_of": current},
+        {"$set": {"as_of": new_generation, "compacted_at": datetime.now(timezone.utc)}},
+        upsert=current is None
+    )
+    if current is not None and result.matched_count == 0:
+        await snapshots_collection.delete_many({"as_of": new_generation})
+        return False
+    await snapshots_collection.delete_many({"as_of": current})
+    return True
+
+async def initialize_snapshot():
+    """
+    Seed the first snapshot from users.points as they are now. Events recorded
+    before this moment are assumed to be reflected in those points already.
+    """
+    if not await acquire_compaction_lock():
+        return
+    try:
+        generation = ObjectId.from_datetime(datetime.now(timezone.utc))
+        await write_generation(generation, lambda user: user.get("points", 0))
+    finally:
+        await release_compaction_lock()
+    print(f"Snapshot initialized from current points (as of {generation.generation_time})")
+
+async def compact(prune=False):
+    """Fold the event tail into a new snapshot generation"""
+    started = time.perf_counter()
+    if not await acquire_compaction_lock():
+        return
+    try:
+        generation = await current_generation()
+        if generation is None:
+            print("No snapshot yet, run `python points_ledger.py init` first")
+            return
+
+        new_generation = ObjectId.from_datetime(datetime.now(timezone.utc) - COMPACTION_LAG)
+        if new_generation <= generation:
+            print("Nothing to compact")
+            return
+
+        balances = await snapshot_balances(generation)
+        totals = await tail_totals(generation, new_generation)
+        switched = await write_generation(
+            new_generation,
+            lambda user: balances.get(user["_id"], 0) + user_delta(user, totals)
+        )
+    finally:
+        await release_compaction_lock()
+    if not switched:
+        print("The snapshot changed while compacting, discarded this generation")
+        return
+
+    if prune:
+        result = await events_collection.delete_many({"_id": {"$lt": new_generation}})
+        print(f"Pruned {result.deleted_count} compacted events")
+    print(f"Compacted tail totals for {len(totals['users'])} users into a snapshot in {time.perf_counter() - started:.2f}s")
+
+async def rebuild(dry_run=False, batch_size=500, concurrency=4):
+    """Repair users.points from the latest snapshot plus the event tail"""
+    started = time.perf_counter()
+    generation = await current_generation()
+    if generation is None:
+        print("No snapshot yet, run `python points_ledger.py init` first")
+        return
+
+    # events after this aren't in the totals below
+    tail_end = ObjectId.from_datetime(datetime.now(timezone.utc))
+    balances = await snapshot_balances(generation)
+    totals = await tail_totals(generation)
+    print(f"Snapshot has {len(balances)} users, tail touches {len(totals['users'])} users")
+
+    def fix_points(user):
+        current = user.get("points", 0)
+        expected = balances.get(user["_id"], 0) + user_delta(user, totals)
+        if current == expected:
+            return []
+        if dry_run:
+            print(f"{user.get('fullName', 'Unknown')}: {current} -> {expected} ({expected - current:+d})")
+        # conditional on the points we read, so a live $inc landing meanwhile isn't lost
+        return [UpdateOne({"_id": user["_id"], "points": user.get("points")}, {"$set": {"points": expected}})]
+
+    runner = MigrationRunner(
+        "points_ledger_rebuild",
+        db.users,
+        projection={"fullName": 1, "mentor_name": 1, "points": 1},
+        batch_size=batch_size,
+        concurrency=concurrency,
+        dry_run=dry_run,
+    )
+    result = await runner.run(fix_points)
+    print(f"Rebuilt points in {time.perf_counter() - started:.2f}s, {result['written']} users {'would change' if dry_run else 'updated'}")
+    if result["missed"]:
+        print(f"{result['missed']} users' points changed during the rebuild and were left alone")
+    late = await events_collection.count_documents({"_id": {"$gte": tail_end}})
+    if late:
+        print(f"{late} events were recorded while rebuilding; run it again (or with --dry-run) to check their users")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Points ledger maintenance")
+    parser.add_argument("command", choices=["init", "compact", "rebuild"])
+    parser.add_argument("--dry-run", action="store_true", help="rebuild: print the changes instead of writing them")
+    parser.add_argument("--prune", action="store_true", help="compact: delete events folded into the snapshot")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        asyncio.run(initialize_snapshot())
+    elif args.command == "compact":
+        asyncio.run(compact(prune=args.prune))
+    else:
+        asyncio.run(rebuild(dry_run=args.dry_run))
@@ -0,0 +1,244 @@
+# Opt-in request profiling (PROFILING_ENABLED=1): a Server-Timing header on every
+# response (db / hash / validate / serialize / total), plus cProfile captures of
+# sampled requests and of Admin requests sent with `X-Profile: 1`, stored in
+# profile_reports and listed under /admin/profiles.
+# cProfile sees the whole event loop thread, so only one capture runs at a time.
+
+import asyncio
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import os
+import pstats
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from database import db
+from logging_config import request_id_var
+from responses import NDJSON_MEDIA_TYPE
+from server_timing import PROFILING_ENABLED, RequestTimings, timed, timings_var
+from tokens import TokenError, decode_token, get_current_user, revocation_list
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+REPORT_TTL_SECONDS = int(os.getenv("PROFILING_REPORT_TTL_SECONDS", str(7 * 24 * 3600)))
+# Functions kept in each stored report
+TOP_FUNCTIONS = int(os.getenv("PROFILING_TOP_FUNCTIONS", "40"))
+
+REPORTS_PATH = "/admin/profiles"
+# Long-lived responses: a capture would run for as long as the client stays connected
+STREAMING_PATHS = ("/events/stream",)
+
+reports_collection = db["profile_reports"]  # expired reports are dropped by a TTL index
+
+profiling_router = APIRouter()
+
+# --- timing hooks ---
+
+def _timed_wrapper(phase, fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with timed(phase):
+                return await fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return fn(*args, **kwargs)
+    wrapper.timed_phase = phase
+    return wrapper
+
+def install_timing_hooks():
+    """Time FastAPI's request validation and response serialization (safe to call twice)"""
+    import fastapi.routing
+    from fastapi.responses import JSONResponse
+    from responses import FastJSONResponse
+
+    for name, phase in [("solve_dependencies", "validate"), ("serialize_response", "serialize")]:
+        original = getattr(fastapi.routing, name, None)
+        if original is None:
+            logger.warning("fastapi.routing.%s not found, the %s phase won't be timed", name, phase)
+        elif not hasattr(original, "timed_phase"):
+            setattr(fastapi.routing, name, _timed_wrapper(phase, original))
+
+    # JSON rendering happens when the response object is built
+    for response_class in (JSONResponse, FastJSONResponse):
+        render = response_class.__dict__.get("render")
+        if render is not None and not hasattr(render, "timed_phase"):
+            response_class.render = _timed_wrapper("serialize", render)
+
+# --- cProfile captures ---
+
+_capture_running = False
+_report_tasks = set()  # reports being stored in the background
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+async def _admin_asked(scope):
+    """X-Profile: 1 from a caller holding a valid Admin token"""
+    if _header(scope, b"x-profile") not in ("1", "true"):
+        return False
+    authorization = _header(scope, b"authorization") or ""
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        claims = decode_token(authorization[7:])
+    except TokenError:
+        return False
+    return claims.get("role") == "Admin" and not await revocation_list.is_revoked(claims)
+
+def _is_streaming(scope):
+    if scope["path"].startswith(STREAMING_PATHS):
+        return True
+    query = scope.get("query_string", b"").decode("latin-1")
+    accept = _header(scope, b"accept") or ""
+    return "format=ndjson" in query or NDJSON_MEDIA_TYPE in accept or "application/ndjson" in accept
+
+async def _capture_trigger(scope):
+    """Claims the capture slot (sets _capture_running) when it returns a trigger"""
+    global _capture_running
+    if _capture_running or scope["path"].startswith(REPORTS_PATH) or _is_streaming(scope):
+        return None
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        _capture_running = True
+        return "sample"
+    if _header(scope, b"x-profile") is None:
+        return None
+    # claimed before awaiting the token check, so two requests can't both start a capture
+    _capture_running = True
+    try:
+        if await _admin_asked(scope):
+            return "header"
+    except BaseException:
+        _capture_running = False
+        raise
+    _capture_running = False
+    return None
+
+def render_profile(profiler):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).strip_dirs().sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    return stream.getvalue()
+
+async def store_report(scope, profiler, trigger, status, duration, timings, request_id):
+    # formatting the stats is CPU work, keep it off the event loop
+    report = await asyncio.get_running_loop().run_in_executor(None, render_profile, profiler)
+    now = datetime.now(timezone.utc)
+    await reports_collection.insert_one({
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=REPORT_TTL_SECONDS),
+        "request_id": request_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "query": scope.get("query_string", b"").decode("latin-1"),
+        "status": status,
+        "duration_ms": round(duration * 1000, 2),
+        "trigger": trigger,
+        "timings": timings.snapshot(),
+        "report": report,
+    })
+
+async def _store_report_quietly(*args):
+    try:
+        await store_report(*args)
+    except Exception:
+        logger.exception("Could not store profile report", extra={"path": args[0]["path"]})
+
+def store_report_in_background(*args):
+    # the response is already sent; don't hold the request open while the report is written
+    task = asyncio.create_task(_store_report_quietly(*args))
+    _report_tasks.add(task)
+    task.add_done_callback(_report_tasks.discard)
+
+class ProfilingMiddleware:
+    """ASGI middleware adding Server-Timing to every response and running cProfile captures"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _capture_running
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = timings_var.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        profiler = None
+        trigger = await _capture_trigger(scope)
+        if trigger is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                profiler = None  # another profiler (a debugger, say) owns this thread
+                _capture_running = False
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = timings.header(time.perf_counter() - started).encode("latin-1")
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timings_var.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                _capture_running = False
+                store_report_in_background(
+                    scope, profiler, trigger, status, time.perf_counter() - started, timings, request_id_var.get()
+                )
+
+# --- admin endpoints ---
+
+def require_admin(user):
+    if user["role"] != "Admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view profiles")
+
+# Newest reports first, without the report text
+@profiling_router.get("")
+async def list_profile_reports(limit: int = Query(20, ge=1, le=100), user: dict = Depends(get_current_user)):
+    require_admin(user)
+    cursor = reports_collection.find({}, {"report": 0, "expires_at": 0}).sort("created_at", -1).limit(limit)
+    reports = []
+    async for doc in cursor:
+        doc["_id"] = str(doc["_id"])
+        reports.append(doc)
+    return {"enabled": PROFILING_ENABLED, "sample_rate": SAMPLE_RATE, "reports": reports}
+
+# One report; ?format=text returns just the cProfile output
+@profiling_router.get("/{report_id}")
+async def get_profile_report(
+    report_id: str,
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(json|text)$"),
+    user: dict = Depends(get_current_user),
+):
+    require_admin(user)
+    if not ObjectId.is_valid(report_id):
+        raise HTTPException(status_code=404, detail="Report not found")
+    doc = await reports_collection.find_one({"_id": ObjectId(report_id)}, {"expires_at": 0})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if response_format == "text":
+        return PlainTextResponse(doc["report"])
+    doc["_id"] = str(doc["_id"])
+    return doc
@@ -1,69 +1,88 @@
 import asyncio
+import time
+from pymongo import UpdateOne
 from database import db
-from motor.motor_asyncio import AsyncIOMotorClient
+from migrations import MigrationRunner, runner_arguments
 
-async def recalculate_all_points():
-    """Recalculate points for all users based on task completion status."""
-    
-    print("Starting points recalculation...")
-    
-    # Reset all users' points to zero first
-    reset_result = await db.users.update_many(
-        {},  # All users
-        {"$set": {"points": 0}}
+# Points awarded to a group for each completed bucket-list task
+POINTS_PER_TASK = 10
+
+# How many users go into each bulk_write
+BATCH_SIZE = 1000
+
+async def points_by_mentor():
+    """Completed-task points for every group, counted server-side in one aggregation."""
+    pipeline = [
+        {"$project": {
+            "mentor_name": 1,
+            "completed": {"$size": {"$filter": {
+                "input": {"$ifNull": ["$tasks", []]},
+                "as": "task",
+                "cond": {"$eq": ["$$task.completed", True]},
+            }}},
+        }},
+        {"$group": {"_id": "$mentor_name", "completed": {"$sum": "$completed"}}},
+    ]
+    totals = {}
+    async for doc in db.bucket_lists.aggregate(pipeline):
+        totals[doc["_id"]] = doc["completed"] * POINTS_PER_TASK
+    return totals
+
+def expected_points(user, totals):
+    # Same rule as the live handlers: a task's points go to the mentor (by fullName)
+    # and to everyone whose mentor_name is that mentor
+    return totals.get(user.get("fullName"), 0) + totals.get(user.get("mentor_name"), 0)
+
+async def recalculate_all_points(batch_size=BATCH_SIZE, concurrency=4, dry_run=False, resume=True):
+    """
+    Recalculate points for all users based on task completion status.
+
+    Non-destructive: final totals are computed first and only users whose points
+    are actually wrong get a $set, so nobody is ever shown zero points mid-run.
+    Progress is checkpointed, so an interrupted run resumes where it stopped.
+    """
+    started = time.perf_counter()
+    print(f"Starting points recalculation{' (dry run)' if dry_run else ''}...")
+
+    totals = await points_by_mentor()
+    print(f"Computed points for {len(totals)} bucket lists")
+
+    def fix_points(user):
+        current = user.get("points", 0)
+        expected = expected_points(user, totals)
+        if current == expected:
+            return []
+        if dry_run:
+            print(f"{user.get('fullName', 'Unknown')}: {current} -> {expected} ({expected - current:+d})")
+        # only if nothing changed the points since they were read (a toggle
+        # landing mid-run must not be overwritten with the older total)
+        return [UpdateOne({"_id": user["_id"], "points": user.get("points")}, {"$set": {"points": expected}})]
+
+    runner = MigrationRunner(
+        "recalculate_points",
+        db.users,
+        projection={"fullName": 1, "mentor_name": 1, "points": 1},
+        batch_size=batch_size,
+        concurrency=concurrency,
+        dry_run=dry_run,
     )
-    print(f"Reset points for {reset_result.modified_count} users")
-    
-    # Get all bucket lists
-    bucket_lists = await db.bucket_lists.find().to_list(length=None)
-    print(f"Found {len(bucket_lists)} bucket lists")
-    
-    for bucket in bucket_lists:
-        mentor_name = bucket.get("mentor_name", "Unknown")
-        tasks = bucket.get("tasks", [])
-        
-        # Count completed tasks
-        completed_tasks = 0
-        for task in tasks:
-            if task.get("completed", False):
-                completed_tasks += 1
-        
-        if completed_tasks > 0:
-            print(f"Found {completed_tasks} completed tasks for {mentor_name}")
-            points_to_add = completed_tasks * 10
-            
-            # Update mentor's points
-            mentor_result = await db.users.update_one(
-                {"fullName": mentor_name},
-                {"$inc": {"points": points_to_add}}
-            )
-            
-            if mentor_result.modified_count > 0:
-                print(f"Updated mentor {mentor_name} with {points_to_add} points")
-            
-            # Update points for all mentees in the group
-            mentee_result = await db.users.update_many(
-                {"mentor_name": mentor_name},
-                {"$inc": {"points": points_to_add}}
-            )
-            
-            if mentee_result.modified_count > 0:
-                print(f"Updated {mentee_result.modified_count} mentees of {mentor_name} with {points_to_add} points")
-    
-    # Print final results
-    user_count = await db.users.count_documents({})
-    users_with_points = await db.users.count_documents({"points": {"$gt": 0}})
-    
-    print(f"\nRecalculation complete!")
-    print(f"Total users: {user_count}")
-    print(f"Users with points: {users_with_points}")
-    
+    result = await runner.run(fix_points, resume=resume)
+
+    elapsed = time.perf_counter() - started
+    print(f"\nRecalculation complete in {elapsed:.2f}s!")
+    print(f"Total users: {result['scanned']}")
+    print(f"Users {'needing' if dry_run else 'with'} updated points: {result['written']}")
+    if result["missed"]:
+        print(f"{result['missed']} users' points changed during the run and were left alone, run it again to check them")
+
     # Show top 5 users by points
-    top_users = await db.users.find().sort("points", -1).limit(5).to_list(length=5)
+    top_users = await db.users.find({}, {"fullName": 1, "points": 1}).sort("points", -1).limit(5).to_list(length=5)
     print("\nTop 5 users by points:")
     for i, user in enumerate(top_users, 1):
         print(f"{i}. {user.get('fullName', 'Unknown')}: {user.get('points', 0)} points")
 
 if __name__ == "__main__":
+    args = runner_arguments("Recalculate every user's points from completed bucket-list tasks").parse_args()
+
     # Run the async function
-    asyncio.run(recalculate_all_points()) 
\ No newline at end of file
+    asyncio.run(recalculate_all_points(args.batch_size, args.concurrency, args.dry_run, resume=not args.restart))
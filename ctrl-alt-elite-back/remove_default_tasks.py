@@ -1,41 +1,54 @@
 import asyncio
+from pymongo import UpdateOne
 from database import db
-from motor.motor_asyncio import AsyncIOMotorClient
+from migrations import MigrationRunner, runner_arguments
 
-async def remove_default_tasks():
+def remove_default_task(bucket):
+    mentor_name = bucket.get("mentor_name", "Unknown")
+    tasks = bucket.get("tasks", [])
+
+    # Filter out tasks with description "Get boba" or that use task_id instead of id
+    new_tasks = [task for task in tasks if
+                ("description" not in task or task["description"] != "Get boba") and
+                ("task_id" not in task)]
+
+    # If we removed any tasks, update the bucket list
+    if len(new_tasks) == len(tasks):
+        return []
+    print(f"Removing {len(tasks) - len(new_tasks)} default task(s) from {mentor_name}'s bucket list")
+    # the summary counters change in the same update as the tasks (like the task writes in bucket_list.py);
+    # only applied if the tasks weren't changed since they were read, otherwise it counts as missed
+    completed_count = sum(1 for task in new_tasks if task.get("completed") is True)
+    return [UpdateOne({"_id": bucket["_id"], "tasks": tasks}, {"$set": {
+        "tasks": new_tasks,
+        "task_count": len(new_tasks),
+        "completed_count": completed_count,
+        "completion_ratio": completed_count / len(new_tasks) if new_tasks else 0,
+    }})]
+
+async def remove_default_tasks(batch_size=500, concurrency=4, dry_run=False, resume=True):
     """Remove the default 'Get boba' task from all bucket lists"""
-    
+
     print("Starting removal of default tasks...")
-    
-    # Get all bucket lists
-    bucket_lists = await db.bucket_lists.find().to_list(length=None)
-    print(f"Found {len(bucket_lists)} bucket lists")
-    
-    for bucket in bucket_lists:
-        mentor_name = bucket.get("mentor_name", "Unknown")
-        tasks = bucket.get("tasks", [])
-        
-        # Count tasks before filtering
-        original_count = len(tasks)
-        
-        # Filter out tasks with description "Get boba" or that use task_id instead of id
-        new_tasks = [task for task in tasks if 
-                    ("description" not in task or task["description"] != "Get boba") and
-                    ("task_id" not in task)]
-        
-        # If we removed any tasks, update the bucket list
-        if len(new_tasks) != original_count:
-            print(f"Removing default task from {mentor_name}'s bucket list")
-            result = await db.bucket_lists.update_one(
-                {"_id": bucket["_id"]},
-                {"$set": {"tasks": new_tasks}}
-            )
-            print(f"Updated: {result.modified_count}")
-        else:
-            print(f"No default tasks found for {mentor_name}")
-    
-    print("Task removal complete!")
+
+    runner = MigrationRunner(
+        "remove_default_tasks",
+        db.bucket_lists,
+        # only bucket lists that actually contain a default task
+        query={"$or": [{"tasks.description": "Get boba"}, {"tasks.task_id": {"$exists": True}}]},
+        projection={"mentor_name": 1, "tasks": 1},
+        batch_size=batch_size,
+        concurrency=concurrency,
+        dry_run=dry_run,
+    )
+    result = await runner.run(remove_default_task, resume=resume)
+
+    print(f"Task removal complete! Updated {result['written']} bucket lists")
+    if result["missed"]:
+        print(f"{result['missed']} bucket lists changed while running, run again to pick them up")
 
 if __name__ == "__main__":
+    args = runner_arguments("Remove the default 'Get boba' task from all bucket lists").parse_args()
+
     # Run the async function
-    asyncio.run(remove_default_tasks()) 
\ No newline at end of file
+    asyncio.run(remove_default_tasks(args.batch_size, args.concurrency, args.dry_run, resume=not args.restart))
@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+import orjson
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Documents fetched per cursor batch and written per chunk when streaming;
+# this (not the result size) bounds memory for an NDJSON export
+NDJSON_BATCH_SIZE = int(os.getenv("NDJSON_BATCH_SIZE", "500"))
+
+# Only the fields ProfileOut returns, so password hashes (and anything else
+# stored on users) never leave MongoDB for the list endpoints
+PROFILE_PROJECTION = {
+    "fullName": 1,
+    "email": 1,
+    "accountType": 1,
+    "mentor_name": 1,
+    "fun_facts": 1,
+    "points": 1,
+    "profile_pic": 1,
+}
+
+def bson_default(obj):
+    # orjson handles datetimes itself; this covers what motor hands back besides that
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return obj.decode(errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class FastJSONResponse(Response):
+    """
+    Serializes raw Mongo documents straight to JSON with orjson.
+
+    Returning one of these from an endpoint skips FastAPI's response_model
+    validation and jsonable_encoder pass, and ObjectIds are encoded in place
+    instead of copying every document to stringify _id. Keep response_model
+    on the route for the docs, and use a projection so the documents already
+    have the right shape.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=bson_default)
+
+def wants_ndjson(request: Request, response_format: str = None):
+    """?format=ndjson, or an Accept header asking for NDJSON"""
+    if response_format is not None:
+        return response_format == "ndjson"
+    accept = request.headers.get("accept", "")
+    return NDJSON_MEDIA_TYPE in accept or "application/ndjson" in accept
+
+def ndjson_response(cursor, batch_size=NDJSON_BATCH_SIZE):
+    """
+    Stream a Motor cursor as newline-delimited JSON, one document per line,
+    written as the cursor yields them instead of after the whole list is built.
+    """
+    async def lines():
+        chunk = []
+        try:
+            async for doc in cursor.batch_size(batch_size):
+                chunk.append(orjson.dumps(doc, default=bson_default, option=orjson.OPT_APPEND_NEWLINE))
+                if len(chunk) >= batch_size:
+                    yield b"".join(chunk)
+                    chunk = []
+            if chunk:
+                yield b"".join(chunk)
+        finally:
+            # client went away mid-export: free the server-side cursor now
+            await cursor.close()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,88 @@
+# Per-request time spent in each phase (db, hash, validate, serialize), for the
+# Server-Timing header profiling.py adds. Motor copies the context into the
+# threads it runs pymongo on, so the command listener sees the request's timings.
+# No app imports here: database.py needs the listener.
+
+import contextvars
+import os
+import threading
+import time
+from pymongo import monitoring
+
+# Off by default; when off, main.py adds no middleware and no listener
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+
+PHASES = ("db", "hash", "validate", "serialize")
+
+timings_var = contextvars.ContextVar("request_timings", default=None)
+
+class RequestTimings:
+    def __init__(self):
+        self._lock = threading.Lock()  # db time is added from Motor's threads
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def total(self):
+        with self._lock:
+            return sum(self.seconds.values())
+
+    def header(self, total_seconds):
+        """Server-Timing header value, durations in ms"""
+        parts = [
+            f'{phase};dur={self.seconds[phase] * 1000:.2f};desc="calls={self.counts[phase]}"'
+            for phase in self.seconds
+        ]
+        parts.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(parts)
+
+    def snapshot(self):
+        with self._lock:
+            return {phase: {"ms": round(seconds * 1000, 3), "count": self.counts[phase]} for phase, seconds in self.seconds.items()}
+
+class PhaseTimer:
+    """`with timed("hash"): ...` adds the block's time, minus nested phases, to the current request"""
+
+    __slots__ = ("phase", "timings", "started", "nested_before")
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.timings = timings_var.get()
+        if self.timings is not None:
+            self.nested_before = self.timings.total()
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            elapsed = time.perf_counter() - self.started
+            nested = self.timings.total() - self.nested_before
+            self.timings.add(self.phase, max(0.0, elapsed - nested))
+        return False
+
+def timed(phase):
+    return PhaseTimer(phase)
+
+class ServerTimingListener(monitoring.CommandListener):
+    """Adds each MongoDB command's server round trip to the request that sent it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        timings = timings_var.get()
+        if timings is not None:
+            timings.add("db", event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+def timing_listeners():
+    """Extra pymongo listeners for database.py (none unless profiling is on)"""
+    return [ServerTimingListener()] if PROFILING_ENABLED else []
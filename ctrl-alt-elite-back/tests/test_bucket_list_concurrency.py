@@ -0,0 +1,153 @@
+# Parallel task toggles against a real MongoDB: no lost updates, and points
+# that match the final task states. Needs MONGODB_URI pointing at a local,
+# throwaway database; skipped otherwise.
+#
+#     MONGODB_URI=mongodb://localhost:27017 python -m pytest tests
+
+import asyncio
+import os
+from urllib.parse import urlparse
+from uuid import uuid4
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("fastapi")
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "mongo", "mongodb"}
+TEST_DOMAIN = "concurrency-test.invalid"
+STUDENTS = 3
+TASKS = 20
+PARALLEL = 20
+
+def local_mongodb_uri():
+    uri = os.getenv("MONGODB_URI") or ""
+    hosts = [urlparse(f"mongodb://{host}").hostname for host in urlparse(uri).netloc.split("@")[-1].split(",")]
+    return bool(uri) and all(host in LOCAL_HOSTS for host in hosts)
+
+@pytest.fixture(scope="module")
+def loop():
+    # one loop for the whole module: Motor's client sticks to the loop it first ran on
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture(scope="module")
+def mongodb(loop):
+    if not local_mongodb_uri():
+        pytest.skip("needs MONGODB_URI pointing at a local MongoDB")
+    from database import db, ping_database
+    if not loop.run_until_complete(ping_database(timeout=2)):
+        pytest.skip("MongoDB is not reachable")
+    return db
+
+@pytest.fixture
+def group(loop, mongodb):
+    """A mentor, their students and a bucket list of open tasks, removed afterwards"""
+    name = f"Concurrency Test {uuid4().hex[:8]}"
+    task_ids = [str(uuid4()) for _ in range(TASKS)]
+    users = [{"accountType": "Mentor", "fullName": name, "email": f"mentor-{uuid4().hex}@{TEST_DOMAIN}", "mentor_name": None, "points": 0}]
+    users += [
+        {"accountType": "Student", "fullName": f"{name} Student {n}", "email": f"student-{uuid4().hex}@{TEST_DOMAIN}", "mentor_name": name, "points": 0}
+        for n in range(STUDENTS)
+    ]
+
+    async def create():
+        await mongodb.users.insert_many(users)
+        await mongodb.bucket_lists.insert_one({
+            "_id": str(uuid4()),
+            "mentor_name": name,
+            "tasks": [{"id": task_id, "description": f"Task {n}", "completed": False} for n, task_id in enumerate(task_ids)],
+            "task_count": TASKS,
+            "completed_count": 0,
+            "member_count": STUDENTS,
+            "completion_ratio": 0,
+        })
+
+    async def remove():
+        await mongodb.users.delete_many({"email": {"$regex": f"@{TEST_DOMAIN.replace('.', '[.]')}$"}})
+        await mongodb.bucket_lists.delete_many({"mentor_name": name})
+        await mongodb.points_events.delete_many({"mentor_name": name})
+
+    loop.run_until_complete(create())
+    yield name, task_ids
+    loop.run_until_complete(remove())
+
+# admins may change any group's list, so the claims need no group
+ADMIN = {"role": "Admin", "email": f"admin@{TEST_DOMAIN}"}
+
+async def toggle(mentor_name, task_id, completed):
+    from bucket_list import toggle_task_completion
+    return await toggle_task_completion(mentor_name, task_id, completed=completed, user=ADMIN)
+
+async def group_state(db, mentor_name):
+    bucket = await db.bucket_lists.find_one({"mentor_name": mentor_name})
+    points = [user.get("points", 0) async for user in db.users.find({"$or": [{"fullName": mentor_name}, {"mentor_name": mentor_name}]})]
+    return bucket, points
+
+def test_parallel_toggles_of_one_task_award_points_once(loop, mongodb, group):
+    mentor_name, task_ids = group
+
+    async def scenario():
+        await asyncio.gather(*(toggle(mentor_name, task_ids[0], True) for _ in range(PARALLEL)))
+        return await group_state(mongodb, mentor_name)
+
+    bucket, points = loop.run_until_complete(scenario())
+    assert [task["completed"] for task in bucket["tasks"]].count(True) == 1
+    assert bucket["completed_count"] == 1
+    assert points == [10] * (STUDENTS + 1)
+
+def test_parallel_toggles_of_different_tasks_are_not_lost(loop, mongodb, group):
+    mentor_name, task_ids = group
+
+    async def scenario():
+        await asyncio.gather(*(toggle(mentor_name, task_id, True) for task_id in task_ids))
+        return await group_state(mongodb, mentor_name)
+
+    bucket, points = loop.run_until_complete(scenario())
+    assert all(task["completed"] for task in bucket["tasks"])
+    assert bucket["task_count"] == TASKS
+    assert bucket["completed_count"] == TASKS
+    assert bucket["completion_ratio"] == 1
+    assert points == [10 * TASKS] * (STUDENTS + 1)
+
+def test_points_match_final_states_after_mixed_toggles(loop, mongodb, group):
+    mentor_name, task_ids = group
+
+    async def scenario():
+        # every task flipped on and off by concurrent requests, in no particular order
+        requests = [toggle(mentor_name, task_id, completed) for task_id in task_ids[:5] for completed in (True, False) * 5]
+        await asyncio.gather(*requests)
+        return await group_state(mongodb, mentor_name)
+
+    bucket, points = loop.run_until_complete(scenario())
+    completed = sum(1 for task in bucket["tasks"] if task["completed"])
+    assert bucket["completed_count"] == completed
+    assert points == [10 * completed] * (STUDENTS + 1)
+
+def test_retried_toggle_finishes_an_award_that_never_landed(loop, mongodb, group):
+    mentor_name, task_ids = group
+
+    async def scenario():
+        from bucket_list import set_task_completed
+        # the toggle went through, then the request died before awarding points
+        await set_task_completed(mentor_name, task_ids[0], True)
+        await asyncio.gather(*(toggle(mentor_name, task_ids[0], True) for _ in range(PARALLEL)))
+        return await group_state(mongodb, mentor_name)
+
+    bucket, points = loop.run_until_complete(scenario())
+    assert bucket["completed_count"] == 1
+    assert points == [10] * (STUDENTS + 1)
+
+def test_deleting_tasks_keeps_counters(loop, mongodb, group):
+    mentor_name, task_ids = group
+
+    async def scenario():
+        from bucket_list import delete_task
+        await asyncio.gather(*(toggle(mentor_name, task_id, True) for task_id in task_ids[:4]))
+        await asyncio.gather(*(delete_task(mentor_name, task_id, user=ADMIN) for task_id in task_ids[2:6]))
+        return await group_state(mongodb, mentor_name)
+
+    bucket, _ = loop.run_until_complete(scenario())
+    assert bucket["task_count"] == TASKS - 4 == len(bucket["tasks"])
+    assert bucket["completed_count"] == 2
+    assert bucket["completion_ratio"] == 2 / (TASKS - 4)
@@ -0,0 +1,104 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+from pymongo.errors import DuplicateKeyError
+from database import db
+from image_cache import CachedImage
+from image_storage import save_bytes, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+# Avatar sizes we generate (longest side, in px). Requests for other sizes are
+# rounded up to the next one so each image has at most a handful of variants.
+VARIANT_SIZES = (64, 128, 256)
+VARIANT_FORMATS = ("webp", "jpeg")
+
+# Resizing is CPU work, so it runs on its own pool instead of the event loop
+# (Pillow releases the GIL while decoding, resizing and encoding)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+
+# Originals bigger than this are never read into memory to be resized
+MAX_SOURCE_BYTES = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))
+
+def pick_size(requested: int):
+    for size in VARIANT_SIZES:
+        if requested <= size:
+            return size
+    return VARIANT_SIZES[-1]
+
+def pick_format(accept_header: str):
+    return "webp" if "image/webp" in (accept_header or "") else "jpeg"
+
+def variant_key(image_id: str, size: int, fmt: str):
+    return f"{image_id}?w={size}&fmt={fmt}"
+
+def resize_image(data: bytes, size: int, fmt: str):
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)  # respect phone camera rotation
+    image.thumbnail((size, size))
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")  # JPEG has no alpha channel
+    output = io.BytesIO()
+    image.save(output, format=fmt.upper(), quality=85)
+    return output.getvalue()
+
+async def load_variant(original_id: ObjectId, size: int, fmt: str):
+    """
+    Cache loader for a resized variant: reuse the stored one if it exists,
+    otherwise generate it from the original and store it once.
+    Returns None if the original image doesn't exist.
+    """
+    query = {"metadata.variant_of": original_id, "metadata.size": size, "metadata.format": fmt}
+    file_data = await db.fs.files.find_one(query)
+    if file_data:
+        data = b"".join([chunk async for chunk in iter_chunks(file_data)])
+        return CachedImage(file_data, data)
+
+    original = await db.fs.files.find_one({"_id": original_id})
+    if not original:
+        return None
+    if original.get("length", 0) > MAX_SOURCE_BYTES:
+        raise HTTPException(status_code=422, detail="Image is too large to resize")
+    original_data = b"".join([chunk async for chunk in iter_chunks(original)])
+
+    loop = asyncio.get_running_loop()
+    try:
+        data = await loop.run_in_executor(thumbnail_executor, resize_image, original_data, size, fmt)
+    except Image.DecompressionBombError as e:
+        # small file, huge canvas: decoding it would take gigabytes
+        logger.warning("Refusing to resize image %s: %s", original_id, e)
+        raise HTTPException(status_code=422, detail="Image has too many pixels to resize")
+    except (OSError, ValueError) as e:
+        # not something Pillow can read (e.g. SVG): serve the original as is
+        logger.warning("Could not resize image %s: %s", original_id, e)
+        return CachedImage(original, original_data)
+
+    metadata = {
+        "content_type": f"image/{fmt}",
+        "variant_of": original_id,
+        "size": size,
+        "format": fmt,
+    }
+    file_id = ObjectId()
+    try:
+        await save_bytes(data, f"{original.get('filename', original_id)}.{size}.{fmt}", metadata, file_id=file_id)
+    except DuplicateKeyError:
+        # another worker stored the same variant first (unique index): use theirs
+        return await load_variant(original_id, size, fmt)
+
+    file_data = await db.fs.files.find_one({"_id": file_id})
+    return CachedImage(file_data, data)
+
+async def delete_variants(original_id: ObjectId):
+    """Remove every stored variant of an image. Returns the cache keys to invalidate."""
+    variant_ids = [doc["_id"] async for doc in db.fs.files.find({"metadata.variant_of": original_id}, {"_id": 1})]
+    if variant_ids:
+        await db.fs.chunks.delete_many({"files_id": {"$in": variant_ids}})
+        await db.fs.files.delete_many({"_id": {"$in": variant_ids}})
+    return [variant_key(str(original_id), size, fmt) for size in VARIANT_SIZES for fmt in VARIANT_FORMATS]
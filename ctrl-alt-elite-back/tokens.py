@@ -0,0 +1,152 @@
+# Signed access tokens (HS256 JWTs) issued at login/signup. They carry the user's
+# id, role and mentor group, so endpoints can check the caller without a user lookup.
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from database import db
+
+TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET")
+if not TOKEN_SECRET:
+    TOKEN_SECRET = secrets.token_urlsafe(32)
+    logging.getLogger(__name__).warning(
+        "AUTH_TOKEN_SECRET is not set, using a random secret: tokens won't survive a restart or work across workers"
+    )
+TOKEN_SECRET = TOKEN_SECRET.encode()
+
+TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", "3600"))
+# How stale the in-process revocation list may get before it's re-read
+REVOCATION_REFRESH_SECONDS = float(os.getenv("AUTH_REVOCATION_REFRESH_SECONDS", "30"))
+
+revoked_tokens_collection = db["revoked_tokens"]  # expired entries are dropped by a TTL index
+
+class TokenError(ValueError):
+    pass
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(signing_input: str) -> str:
+    return _b64encode(hmac.new(TOKEN_SECRET, signing_input.encode(), hashlib.sha256).digest())
+
+HEADER = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+def issue_token(user: dict) -> str:
+    now = int(time.time())
+    claims = {
+        "sub": str(user["_id"]),
+        "email": user.get("email"),
+        "name": user.get("fullName"),
+        "role": user.get("accountType"),
+        "mentor_name": user.get("mentor_name"),
+        "ver": user.get("token_version", 0),
+        "iat": now,
+        "exp": now + TOKEN_TTL_SECONDS,
+        "jti": secrets.token_hex(16),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    signing_input = f"{HEADER}.{payload}"
+    return f"{signing_input}.{_sign(signing_input)}"
+
+def decode_token(token: str) -> dict:
+    """Verify the signature and expiry and return the claims"""
+    try:
+        header, payload, signature = token.split(".")
+    except ValueError:
+        raise TokenError("Malformed token")
+    # only our own header is accepted, which also rules out alg=none tricks
+    if not hmac.compare_digest(header, HEADER):
+        raise TokenError("Unsupported token")
+    if not hmac.compare_digest(signature, _sign(f"{header}.{payload}")):
+        raise TokenError("Invalid token signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise TokenError("Malformed token")
+    if claims.get("exp", 0) < time.time():
+        raise TokenError("Token has expired")
+    return claims
+
+class RevocationList:
+    """Tokens revoked before they expire, re-read from revoked_tokens every REVOCATION_REFRESH_SECONDS"""
+
+    def __init__(self):
+        self._expiry = {}  # jti -> exp (unix time)
+        self._min_version = {}  # sub -> oldest token_version still valid
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < REVOCATION_REFRESH_SECONDS
+
+    async def ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return  # another request reloaded it while we waited
+            now = datetime.now(timezone.utc)
+            expiry = {}
+            min_version = {}
+            async for doc in revoked_tokens_collection.find({"expires_at": {"$gt": now}}):
+                if "min_version" in doc:
+                    min_version[doc["sub"]] = doc["min_version"]
+                else:
+                    expiry[doc["_id"]] = doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+            self._expiry = expiry
+            self._min_version = min_version
+            self._loaded_at = time.monotonic()
+
+    async def is_revoked(self, claims):
+        await self.ensure_loaded()
+        if claims["jti"] in self._expiry:
+            return True
+        return claims.get("ver", 0) < self._min_version.get(claims["sub"], 0)
+
+    async def revoke(self, claims):
+        expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+        await revoked_tokens_collection.update_one(
+            {"_id": claims["jti"]},
+            {"$set": {"expires_at": expires_at, "sub": claims.get("sub")}},
+            upsert=True
+        )
+        self._expiry[claims["jti"]] = claims["exp"]
+
+    async def revoke_user(self, sub, min_version):
+        """Revoke every token of a user issued before their token_version reached min_version"""
+        # kept until the last token it could apply to has expired
+        expires_at = datetime.fromtimestamp(time.time() + TOKEN_TTL_SECONDS, timezone.utc)
+        await revoked_tokens_collection.update_one(
+            {"_id": f"user:{sub}"},
+            {"$set": {"expires_at": expires_at, "sub": sub, "min_version": min_version}},
+            upsert=True
+        )
+        self._min_version[sub] = min_version
+
+revocation_list = RevocationList()
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# FastAPI dependency: the verified claims of the caller's "Authorization: Bearer" token
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = decode_token(credentials.credentials)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    if await revocation_list.is_revoked(claims):
+        raise HTTPException(status_code=401, detail="Token has been revoked", headers={"WWW-Authenticate": "Bearer"})
+    return claims
@@ -1,47 +1,72 @@
-from fastapi import File, UploadFile, APIRouter, HTTPException, Query
+import base64
+import binascii
+import logging
+from fastapi import File, UploadFile, APIRouter, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from database import db
-from models import Profile, ProfileOut, UpdateProfile, ProfilePicUpdate
+from image_storage import save_bytes
+from ingestion import ingestion_queue, job_status
+from bucket_list import change_member_count
+from cache import response_cache, user_tags
+from responses import FastJSONResponse, PROFILE_PROJECTION, wants_ndjson, ndjson_response
+from tokens import issue_token, revocation_list
+from models import Profile, ProfileOut, ProfileUpdateOut, UpdateProfile, ProfilePicUpdate
 from pymongo import ReturnDocument
 from typing import List, Optional
-from cloudinary_config import cloudinary
-import cloudinary.uploader
 
 profile_router = APIRouter()
+logger = logging.getLogger(__name__)
 users_collection = db["users"]
 
-@profile_router.get("/role/{account_type}", response_model=List[ProfileOut])
-async def get_by_role(account_type: str):
-    cursor = users_collection.find({"accountType": account_type})
-    
-    if not cursor:
-        raise HTTPException(status_code=404, detail=f"No users found for role {account_type}")
-    
-    users = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        users.append(doc)
-    return users
+# Profile fields that access tokens carry (as "name" and "mentor_name")
+TOKEN_FIELDS = {"fullName", "mentor_name"}
+
+# ?format=ndjson (or Accept: application/x-ndjson) streams the users one per line,
+# straight from the cursor and bypassing the cache
+@profile_router.get("/role/{account_type}", response_model=List[ProfileOut], response_class=FastJSONResponse)
+async def get_by_role(
+    account_type: str,
+    request: Request,
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$"),
+):
+    if wants_ndjson(request, response_format):
+        return ndjson_response(users_collection.find({"accountType": account_type}, PROFILE_PROJECTION))
+
+    async def load():
+        # projected to ProfileOut's fields, so the documents can be returned as they are
+        cursor = users_collection.find({"accountType": account_type}, PROFILE_PROJECTION)
+
+        if not cursor:
+            raise HTTPException(status_code=404, detail=f"No users found for role {account_type}")
+
+        return await cursor.to_list(length=None)
+
+    # role lists show everyone's points, so point changes drop them via "roles"
+    users = await response_cache.get_or_load(f"role:{account_type}", [f"role:{account_type}", "roles"], load)
+    return FastJSONResponse(users)
 
 # GET PROFILE INFO OF USER
 @profile_router.get("", response_model=ProfileOut)
 async def get_profile(email: str):
-    print(f"Received email: {email}")  # debugging (remember to remove later)
-    try:
-        user = await users_collection.find_one({"email": email.strip()}) # strip whitespace from email
-        print("Finished search")
-    except Exception as e:
-        print(f"Exception during database query: {e}")
-        raise HTTPException(status_code=500, detail="Database query failed >:0")
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    email = email.strip() # strip whitespace from email
+
+    async def load():
+        try:
+            user = await users_collection.find_one({"email": email}, PROFILE_PROJECTION)
+        except Exception:
+            logger.exception("Profile lookup failed", extra={"email": email})
+            raise HTTPException(status_code=500, detail="Database query failed >:0")
+
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-    user["_id"] = str(user["_id"]) # convert ObjectID to str
-    return user
+        user["_id"] = str(user["_id"]) # convert ObjectID to str
+        return user
+
+    return await response_cache.get_or_load(f"profile:{email}", user_tags, load)
 
 # UPDATE USER INFORMATION
-@profile_router.put("", response_model=ProfileOut)
+@profile_router.put("", response_model=ProfileUpdateOut)
 async def update_profile(
     email: str, 
     update: Optional[UpdateProfile] = None,
@@ -61,14 +86,30 @@ async def update_profile(
     
     # If there's at least one field to update:
     if len(update_data) > 0:
-        update_result = await users_collection.find_one_and_update(
+        changes = {"$set": update_data}    # set fields in the 'update_data' dict
+        reissue = bool(TOKEN_FIELDS & update_data.keys())
+        if reissue:
+            # tokens issued before this carry the old name/group
+            changes["$inc"] = {"token_version": 1}
+        previous = await users_collection.find_one_and_update(
            {"email": email.strip()},    # get user with email
-           {"$set": update_data},       # set fields in the 'update_data' dict
-           return_document=ReturnDocument.AFTER     # makes mongo return updated version of document
+           changes,
+           return_document=ReturnDocument.BEFORE     # old mentor_name is needed for the group counters
         )
 
         # if user was found and updated, return string version of id
-        if update_result is not None:
+        if previous is not None:
+            # moving to another group changes both groups' member counts
+            if "mentor_name" in update_data and previous.get("mentor_name") != update_data["mentor_name"]:
+                await change_member_count(previous.get("mentor_name"), -1)
+                await change_member_count(update_data["mentor_name"], 1)
+
+            update_result = {**previous, **update_data}
+            await response_cache.invalidate(*user_tags(previous), *user_tags(update_result))
+            if reissue:
+                update_result["token_version"] = previous.get("token_version", 0) + 1
+                await revocation_list.revoke_user(str(previous["_id"]), update_result["token_version"])
+                update_result["token"] = issue_token(update_result)
             update_result["_id"] = str(update_result["_id"])
             return update_result
         else:
@@ -76,96 +117,53 @@ async def update_profile(
     
     raise HTTPException(status_code=400, detail="No fields to update")
 
-@profile_router.put("/image", response_model=ProfileOut)
+# QUEUE A NEW PROFILE PICTURE
+# The image is staged in GridFS and handed to the ingestion queue (ingestion.py),
+# which uploads it to Cloudinary in the background. Poll status_url for the result.
+@profile_router.put("/image", status_code=202)
 async def upload_image(data: ProfilePicUpdate, email: str = Query(...)):
+    email = email.strip()
+    if not await users_collection.find_one({"email": email}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    profile_pic_base64 = data.profile_pic
+
+    # Strip the base64 prefix if it exists
+    if "," in profile_pic_base64:
+        _, data_string = profile_pic_base64.split(",", 1)
+    else:
+        data_string = profile_pic_base64
+
+    # Convert to binary
     try:
-        profile_pic_base64 = data.profile_pic
-        image_url = None
-        
-        # Try using Cloudinary if configured properly
-        try:
-            if (cloudinary.config().cloud_name and 
-                cloudinary.config().api_key and 
-                cloudinary.config().api_secret and
-                cloudinary.config().cloud_name != "your_cloud_name"):
-                
-                upload_result = cloudinary.uploader.upload(
-                    profile_pic_base64,
-                    resource_type="auto"
-                )
-                image_url = upload_result.get("secure_url")
-            else:
-                # Fallback to local storage if Cloudinary isn't configured
-                print("Cloudinary not configured. Using local storage.")
-                
-                # Convert base64 to binary data
-                import base64
-                import io
-                from bson import ObjectId
-                
-                # Strip the base64 prefix if it exists
-                if "," in profile_pic_base64:
-                    _, data_string = profile_pic_base64.split(",", 1)
-                else:
-                    data_string = profile_pic_base64
-                
-                # Convert to binary
-                file_data = base64.b64decode(data_string)
-                
-                # Get content type (defaults to png if not detectable)
-                content_type = "image/png"
-                if profile_pic_base64.startswith("data:"):
-                    content_type = profile_pic_base64.split(";")[0].replace("data:", "")
-                
-                # Metadata
-                metadata = {
-                    "filename": f"{email}_profile.{content_type.split('/')[1]}",
-                    "content_type": content_type,
-                    "user_id": email,
-                    "is_profile_picture": True
-                }
-                
-                # Store in GridFS
-                # First, create a file entry
-                file_doc = {
-                    "filename": metadata["filename"],
-                    "metadata": metadata,
-                    "length": len(file_data)
-                }
-                
-                # Insert file info
-                result = await db.fs.files.insert_one(file_doc)
-                file_id = result.inserted_id
-                
-                # Insert file data
-                chunk_doc = {
-                    "files_id": file_id,
-                    "n": 0,  # Chunk number
-                    "data": file_data
-                }
-                await db.fs.chunks.insert_one(chunk_doc)
-                
-                # Set URL to the images endpoint
-                image_url = f"/images/{str(file_id)}"
-        except Exception as e:
-            print(f"Image storage error: {e}")
-            # Use a fallback URL if all else fails
-            image_url = "/profile/local-image-fallback"
-        
-        # Update user profile with the image URL
-        update_data = {"profile_pic": image_url}
-
-        update_result = await users_collection.find_one_and_update(
-            {"email": email.strip()},
-            {"$set": update_data},
-            return_document=ReturnDocument.AFTER
-        )
+        file_data = base64.b64decode(data_string)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Profile picture is not valid base64")
 
-        if update_result is not None:
-            update_result["_id"] = str(update_result["_id"])
-            return update_result
+    # Get content type (defaults to png if not detectable)
+    content_type = "image/png"
+    if profile_pic_base64.startswith("data:"):
+        content_type = profile_pic_base64.split(";")[0].replace("data:", "")
 
-        raise HTTPException(status_code=404, detail="User not found")
+    # Metadata
+    metadata = {
+        "filename": f"{email}_profile.{content_type.split('/')[1]}",
+        "content_type": content_type,
+        "user_id": email,
+        "is_profile_picture": True
+    }
+
+    # Store in GridFS (split into fs.chunks documents);
+    # identical bytes already stored are reused instead of stored again
+    file_id = await save_bytes(file_data, metadata["filename"], metadata, dedupe=True)
+    job_id = await ingestion_queue.enqueue(email, file_id, content_type, metadata["filename"])
+
+    return {"job_id": str(job_id), "status": "queued", "status_url": f"/profile/image/jobs/{job_id}"}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
+# STATUS OF A QUEUED PROFILE PICTURE
+@profile_router.get("/image/jobs/{job_id}")
+async def get_image_job(job_id: str):
+    status = await job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Image job not found")
+    return status
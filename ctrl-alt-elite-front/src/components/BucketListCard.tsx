@@ -65,6 +65,7 @@ const BucketListCard: React.FC<BucketListCardProps> = ({ bucketList }) => {
             alt={`${bucketList.mentor_name} profile`}
             className="w-full h-full object-cover"
             defaultSrc="/default_profile.png"
+            size={128}
           />
         ) : (
           <div className="flex items-center justify-center w-full h-full">
@@ -5,23 +5,27 @@ interface FixedImageProps {
   alt?: string;
   className?: string;
   defaultSrc?: string;
+  size?: number; // ask the backend for a resized copy (longest side, px)
 }
 
 // Helper function to fix image URL if needed
-const fixImageUrl = (src: string | null | undefined): string | null => {
+const fixImageUrl = (src: string | null | undefined, size?: number): string | null => {
   if (!src) return null;
   
+  // Images served by our backend can be resized there (?w=) instead of downloading the original
+  const sizeParam = size ? `?w=${size}` : '';
+  
   // Handle the specific case where we have a data URL prefix followed by a file path
   if (src.startsWith('data:image') && src.includes('/images/')) {
     // Extract the file path and convert it to a proper URL
     const path = src.substring(src.indexOf('/images/'));
     // Return the absolute URL to the backend server
-    return `http://localhost:8000${path}`;
+    return `http://localhost:8000${path}${sizeParam}`;
   }
   
   // Handle direct image paths
   if (src.startsWith('/images/')) {
-    return `http://localhost:8000${src}`;
+    return `http://localhost:8000${src}${sizeParam}`;
   }
   
   return src;
@@ -31,10 +35,11 @@ const FixedImage = ({
   src, 
   alt = "Image", 
   className = "", 
-  defaultSrc = "/default_profile.png" 
+  defaultSrc = "/default_profile.png",
+  size
 }: FixedImageProps) => {
   // Apply URL fixing on the incoming src
-  const fixedSrc = fixImageUrl(src);
+  const fixedSrc = fixImageUrl(src, size);
   const [imgSrc, setImgSrc] = useState<string>(fixedSrc || defaultSrc);
   const [imgError, setImgError] = useState<boolean>(false);
 
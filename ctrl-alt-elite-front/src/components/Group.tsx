@@ -64,6 +64,7 @@ const Group = ({ mentor, students }: GroupProps) => {
               src={mentor.profile_pic}
               alt={`${mentor.fullName} profile`}
               className="w-full h-full object-cover"
+              size={128}
             />
           ) : (
             <div className="flex items-center justify-center w-full h-full text-white font-bold">
@@ -145,6 +146,7 @@ const Group = ({ mentor, students }: GroupProps) => {
                         src={student.profile_pic}
                         alt={`${student.fullName} profile`}
                         className="w-full h-full object-cover"
+                        size={64}
                       />
                     ) : (
                       <div className="flex items-center justify-center w-full h-full text-white font-bold text-xs">
@@ -7,6 +7,21 @@ export const axiosInstance = axios.create({
     maxContentLength: 10 * 1024 * 1024, // 10MB max content length
 });
 
+// Send the access token from login/signup with every request
+export const setAuthToken = (token: string | null) => {
+    if (token) {
+        axiosInstance.defaults.headers.common["Authorization"] = `Bearer ${token}`;
+    } else {
+        delete axiosInstance.defaults.headers.common["Authorization"];
+    }
+};
+
+// Called when the API rejects our token (expired or revoked), set by the auth store
+let onUnauthorized: (() => void) | null = null;
+export const setUnauthorizedHandler = (handler: (() => void) | null) => {
+    onUnauthorized = handler;
+};
+
 // Add response interceptor to handle common errors
 axiosInstance.interceptors.response.use(
     response => response,
@@ -15,6 +30,10 @@ axiosInstance.interceptors.response.use(
         if (error.code === 'ECONNABORTED') {
             console.error('Request timeout');
         }
+        // only when we sent a token: a failed login is a 401-free 400 anyway
+        if (error.response?.status === 401 && error.config?.headers?.Authorization) {
+            onUnauthorized?.();
+        }
         return Promise.reject(error);
     }
 );
\ No newline at end of file
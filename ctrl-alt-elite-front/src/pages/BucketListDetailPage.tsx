@@ -55,7 +55,7 @@ const BucketListDetailPage = () => {
     setAdding(true);
     try {
       await axiosInstance.post(
-        `/bucketlist/${encodeURIComponent(mentor_name)}/bucket_lists?user_email=${authUser.email}`,
+        `/bucketlist/${encodeURIComponent(mentor_name)}/bucket_lists`,
         { description: newTask, completed: false }
       );
       toast.success("New task added to bucket list!");
@@ -82,7 +82,7 @@ const BucketListDetailPage = () => {
       });
       
       const response = await axiosInstance.put(
-        `/bucketlist/${encodeURIComponent(mentor_name)}/bucket_lists/toggle/${taskId}?user_email=${authUser.email}`,
+        `/bucketlist/${encodeURIComponent(mentor_name)}/bucket_lists/toggle/${taskId}`,
         { completed: !currentStatus }
       );
       
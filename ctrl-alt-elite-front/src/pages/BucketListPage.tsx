@@ -8,6 +8,7 @@ import "../styles/HomePage.css";
 
 type Task = {
   id: string;
+  task_id?: string; // older tasks store their identifier here instead
   description: string;
   completed: boolean;
 };
@@ -40,35 +41,20 @@ const BucketListPage = () => {
     setLoading(true);
     setError(null);
     try {
-      // First get all mentors with their profile data
-      const mentorsRes = await axiosInstance.get("/profile/role/Mentor");
-      const mentors = mentorsRes.data;
-      
-      // Create a map of mentor names to their profile data for quick lookup
-      const mentorProfiles: Record<string, MentorProfile> = {};
-      mentors.forEach((mentor: MentorProfile) => {
-        mentorProfiles[mentor.fullName] = mentor;
-      });
-
-      // Then get bucket list for each mentor
-      const bucketListsPromises = mentors.map(async (mentor: any) => {
-        try {
-          const res = await axiosInstance.get(
-            `/bucketlist/${encodeURIComponent(mentor.fullName)}/bucket_lists`
-          );
-          // Attach the mentor's profile data to the bucket list
-          const bucketList = res.data;
-          bucketList.mentor_profile = mentor;
-          return bucketList;
-        } catch (err) {
-          console.error(`Error fetching bucket list for ${mentor.fullName}:`, err);
-          return null;
-        }
-      });
+      // One batch request per page of groups, with each mentor's profile joined in
+      const bucketLists: BucketList[] = [];
+      let cursor: string | null = null;
+      do {
+        const res: any = await axiosInstance.get("/bucketlist/batch", {
+          params: { view: "full", limit: 200, after: cursor ?? undefined },
+        });
+        // only lists that belong to an existing mentor, as before
+        bucketLists.push(
+          ...res.data.items.filter((list: BucketList) => list.mentor_profile?.accountType === "Mentor")
+        );
+        cursor = res.data.next_cursor;
+      } while (cursor);
 
-      const bucketLists = (await Promise.all(bucketListsPromises)).filter(
-        (list): list is BucketList => list !== null
-      );
       console.log("Bucket lists with profiles:", bucketLists);
       setBucketLists(bucketLists);
     } catch (err: any) {
@@ -86,11 +72,44 @@ const BucketListPage = () => {
     // eslint-disable-next-line
   }, [authUser]);
 
+  // Apply task changes pushed by the server instead of refetching every list
+  useEffect(() => {
+    if (!authUser) return;
+    const events = new EventSource(`${axiosInstance.defaults.baseURL}/events/stream`);
+    const updateTasks = (mentorName: string, update: (tasks: Task[]) => Task[]) =>
+      setBucketLists((lists) =>
+        lists.map((list) =>
+          list.mentor_name === mentorName ? { ...list, tasks: update(list.tasks) } : list
+        )
+      );
+
+    events.addEventListener("task_added", (e) => {
+      const { mentor_name, task } = JSON.parse((e as MessageEvent).data);
+      updateTasks(mentor_name, (tasks) =>
+        tasks.some((t) => t.id === task.id) ? tasks : [...tasks, task]
+      );
+    });
+    events.addEventListener("task_toggled", (e) => {
+      const { mentor_name, task_id, completed } = JSON.parse((e as MessageEvent).data);
+      updateTasks(mentor_name, (tasks) =>
+        tasks.map((t) => ((t.id ?? t.task_id) === task_id ? { ...t, completed } : t))
+      );
+    });
+    events.addEventListener("task_deleted", (e) => {
+      const { mentor_name, task_id } = JSON.parse((e as MessageEvent).data);
+      updateTasks(mentor_name, (tasks) => tasks.filter((t) => (t.id ?? t.task_id) !== task_id));
+    });
+    // we fell behind and missed events: reload everything once
+    events.addEventListener("resync", () => fetchBucketLists());
+    return () => events.close();
+    // eslint-disable-next-line
+  }, [authUser]);
+
   // Add a new task
   const handleAddTask = async (mentorName: string, description: string) => {
     try {
       await axiosInstance.post(
-        `/bucketlist/${encodeURIComponent(mentorName)}/bucket_lists?user_email=${authUser.email}`,
+        `/bucketlist/${encodeURIComponent(mentorName)}/bucket_lists`,
         { description, completed: false }
       );
       toast.success("New task added to bucket list!");
@@ -115,7 +134,7 @@ const BucketListPage = () => {
       });
       
       const response = await axiosInstance.put(
-        `/bucketlist/${encodeURIComponent(mentorName)}/bucket_lists/toggle/${taskId}?user_email=${authUser.email}`,
+        `/bucketlist/${encodeURIComponent(mentorName)}/bucket_lists/toggle/${taskId}`,
         { completed: !currentStatus }
       );
       
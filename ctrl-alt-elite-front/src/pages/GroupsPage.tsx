@@ -14,23 +14,9 @@ const GroupsPage = () => {
   const getAllGroups = async () => {
     setLoading(true);
     try {
-      const res = await axiosInstance.get("/profile/role/Mentor"); //get information of all mentors
-      const mentorsData = res.data;
-
-      // array to hold mentor + their students
-      const groupsData = [];
-
-      for (let i = 0; i < mentorsData.length; i++) {
-        const mentor = mentorsData[i];
-        const groupRes = await axiosInstance.get(`/group/${mentor.fullName}`);
-        const studentsForMentor = groupRes.data;
-
-        // Add this mentor and their students as a single group
-        groupsData.push({
-          mentor: mentor,
-          students: studentsForMentor,
-        });
-      }
+      // every mentor together with their students, in a single request
+      const res = await axiosInstance.get("/group");
+      const groupsData = res.data;
 
       setGroups(groupsData);
     } catch (error: any) {
@@ -6,11 +6,9 @@ import { toast } from "react-hot-toast";
 import { Crown, Star, RefreshCw } from "lucide-react";
 import "../styles/HomePage.css";
 
-interface Mentor {
-  _id: string;
-  fullName: string;
-  email: string;
-  fun_facts: string;
+interface LeaderboardEntry {
+  rank: number;
+  mentor_name: string;
   points: number;
 }
 
@@ -21,6 +19,8 @@ interface MentorGroup {
 }
 
 const podiumColors = ["#FFD700", "#E8E8E8", "#CD7F32"];
+// Coalesces refetches triggered by live events
+const REFETCH_DELAY_MS = 2000;
 const podiumLabels = ["1st", "2nd", "3rd"];
 
 const LeaderboardPage: React.FC = () => {
@@ -30,23 +30,56 @@ const LeaderboardPage: React.FC = () => {
 
   useEffect(() => {
     getAllMentorGroups();
+
+    // Points changes pushed by the server carry the group's new score, which is
+    // patched in place. Only when it's missing (or we missed events) do we
+    // refetch, at most once per REFETCH_DELAY_MS however many events arrive.
+    let refetchTimer: ReturnType<typeof setTimeout> | null = null;
+    const scheduleRefetch = () => {
+      if (refetchTimer) return;
+      refetchTimer = setTimeout(() => {
+        refetchTimer = null;
+        getAllMentorGroups();
+      }, REFETCH_DELAY_MS);
+    };
+
+    const events = new EventSource(`${axiosInstance.defaults.baseURL}/events/stream`);
+    events.addEventListener("points_changed", (e) => {
+      const { mentor_name, points } = JSON.parse((e as MessageEvent).data);
+      if (typeof points !== "number") {
+        scheduleRefetch();
+        return;
+      }
+      setGroups((current) => {
+        if (!current.some((group) => group.name === mentor_name)) {
+          return current; // not on this page; a later refetch will show it if it climbs
+        }
+        return current
+          .map((group) => (group.name === mentor_name ? { ...group, points } : group))
+          .sort((a, b) => b.points - a.points || a.name.localeCompare(b.name))
+          .map((group, idx) => ({ ...group, spaceshipImage: spaceshipImages[idx % spaceshipImages.length] }));
+      });
+    });
+    events.addEventListener("resync", scheduleRefetch);
+    return () => {
+      events.close();
+      if (refetchTimer) clearTimeout(refetchTimer);
+    };
   }, []);
 
   const getAllMentorGroups = async () => {
     setLoading(true);
     try {
-      const res = await axiosInstance.get("/profile/role/Mentor");
-      const mentors: Mentor[] = res.data;
+      // entries come back already ranked by points
+      const res = await axiosInstance.get("/leaderboard", { params: { limit: 100 } });
+      const entries: LeaderboardEntry[] = res.data.entries;
 
-      const mentorGroups: MentorGroup[] = mentors.map((mentor, idx) => ({
-        name: mentor.fullName,
-        points: mentor.points,
+      const mentorGroups: MentorGroup[] = entries.map((entry, idx) => ({
+        name: entry.mentor_name,
+        points: entry.points,
         spaceshipImage: spaceshipImages[idx % spaceshipImages.length],
       }));
 
-      // Sort mentors by points descending
-      mentorGroups.sort((a, b) => b.points - a.points);
-
       setGroups(mentorGroups);
     } catch (error: any) {
       console.error(error);
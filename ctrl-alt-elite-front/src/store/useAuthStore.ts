@@ -1,6 +1,6 @@
 import { create } from "zustand";
 import { persist } from "zustand/middleware";
-import { axiosInstance } from "../lib/axios.ts";
+import { axiosInstance, setAuthToken, setUnauthorizedHandler } from "../lib/axios.ts";
 import { toast } from "react-hot-toast";
 
 // Helper function to ensure profile pic is in proper format
@@ -36,6 +36,17 @@ const ensureProperImageFormat = (imageData: string): string => {
   return imageData;
 };
 
+// Whether an access token (a JWT) is past its "exp" claim
+const isTokenExpired = (token: string): boolean => {
+  try {
+    const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+    const { exp } = JSON.parse(atob(payload));
+    return typeof exp !== 'number' || exp * 1000 <= Date.now();
+  } catch (e) {
+    return true;
+  }
+};
+
 // Define a type for the store's state
 interface AuthStoreState {
   authUser: any | null;
@@ -81,7 +92,8 @@ export const useAuthStore = create<AuthStoreState>()(
     set({ isSigningUp: true});
     try {
       const res = await axiosInstance.post("/auth/signup", data);
-      set({authUser: res.data.user});
+      setAuthToken(res.data.token);
+      set({authUser: { ...res.data.user, token: res.data.token }});
       toast.success("Account created successfully");
     } catch (error: any) {
       toast.error(error.response.data.message);
@@ -94,7 +106,8 @@ export const useAuthStore = create<AuthStoreState>()(
     set({ isLoggingIn: true });
     try {
       const res = await axiosInstance.post("/auth/login", data);
-      set({ authUser: res.data.user });
+      setAuthToken(res.data.token);
+      set({ authUser: { ...res.data.user, token: res.data.token } });
       toast.success("Logged in successfully");
     } catch (error: any) {
       toast.error(error.response.data.message);
@@ -104,7 +117,15 @@ export const useAuthStore = create<AuthStoreState>()(
   },
 
   logout: async () => {
+    // cleared first, so a 401 for an expired token isn't reported as a lost session
     set({ authUser: null });
+    try {
+      // revoke the token server-side; an already expired one is fine to drop
+      await axiosInstance.post("/auth/logout");
+    } catch (error) {
+      console.error("Logout error:", error);
+    }
+    setAuthToken(null);
   },
 
   //IMPORTANT: HAVE TO FIX THE PATHS AND DATA
@@ -118,6 +139,11 @@ export const useAuthStore = create<AuthStoreState>()(
       const res = await axiosInstance.put(`/profile?email=${currentUser.email}`, data);
       console.log('Profile update response:', res.data);
       
+      // Changing name or group revokes the old token; the response carries a new one
+      if (res.data.token) {
+        setAuthToken(res.data.token);
+      }
+
       // Make sure we're preserving all existing user data and updating with new data
       // Use consistent naming for profile picture (profile_pic)
       const updatedUser = {
@@ -148,14 +174,20 @@ export const useAuthStore = create<AuthStoreState>()(
     });
     try {
       const encodedEmail = encodeURIComponent(email);
-      const res = await axiosInstance.put(`/profile/image?email=${encodedEmail}`, data);
-      console.log('Profile pic update response:', {
-        responseType: typeof res.data,
-        responseIsObject: typeof res.data === 'object',
-        responseHasProfilePic: typeof res.data === 'object' && !!res.data?.profile_pic,
-        responseKeys: typeof res.data === 'object' ? Object.keys(res.data) : 'not an object',
-        responseStringLength: typeof res.data === 'string' ? res.data.length : 'not a string',
-        responseStringPrefix: typeof res.data === 'string' ? res.data.substring(0, 30) + '...' : 'not a string'
+      // The upload is queued on the server (202); poll the job until it's done
+      const queued = await axiosInstance.put(`/profile/image?email=${encodedEmail}`, data);
+      let job = queued.data;
+      for (let polls = 0; job.status === "queued" || job.status === "processing"; polls++) {
+        if (polls >= 120) throw new Error("Profile picture upload is taking too long");
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await axiosInstance.get(queued.data.status_url)).data;
+      }
+      if (job.status === "failed") throw new Error(job.error || "Profile picture upload failed");
+      const res = { data: { profile_pic: job.profile_pic } };
+      console.log('Profile pic job finished:', {
+        status: job.status,
+        attempts: job.attempts,
+        fallback: job.fallback
       });
       
       // Preserve existing user data while updating the profile picture
@@ -197,7 +229,7 @@ export const useAuthStore = create<AuthStoreState>()(
       toast.success("Changed profile picture successfully");
     } catch (error: any) {
       console.error('Profile pic update error:', error);
-      toast.error(error.response?.data?.message || "Failed to update profile picture");
+      toast.error(error.response?.data?.detail || error.message || "Failed to update profile picture");
     } finally {
       set({ isUpdatingProfile: false });
     }
@@ -239,6 +271,12 @@ export const useAuthStore = create<AuthStoreState>()(
       return { authUser: state.authUser };
     },
     onRehydrateStorage: () => (state) => {
+      // a session whose token has expired is logged out, not shown as logged in
+      if (state?.authUser && (!state.authUser.token || isTokenExpired(state.authUser.token))) {
+        state.authUser = null;
+      }
+      setAuthToken(state?.authUser?.token ?? null);
+
       // When rehydrating, check if profile pic is a reference and resolve it
       if (state?.authUser?.profile_pic && 
           typeof state.authUser.profile_pic === 'string' &&
@@ -264,4 +302,12 @@ export const useAuthStore = create<AuthStoreState>()(
     }
   }
 )
-);
\ No newline at end of file
+);
+
+// The API no longer accepts our token: drop the session, App then redirects to /login
+setUnauthorizedHandler(() => {
+  if (!useAuthStore.getState().authUser) return;
+  setAuthToken(null);
+  useAuthStore.setState({ authUser: null });
+  toast.error("Your session has expired, please log in again");
+});
\ No newline at end of file